@@ -0,0 +1,402 @@
+# Standard library imports
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Third-party imports
+import numpy as np
+from flask import Flask
+
+# Local imports
+from cutting import run_ffmpeg, stream_ffmpeg
+from transcoding import transcoder
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_FILENAME = 'analysis.json'
+
+# Mono PCM rate of the loudness pass; speech and music levels do not need more
+ANALYSIS_SAMPLE_RATE = 8000
+
+# Audio windows per second of the silence detector
+WINDOWS_PER_SECOND = 20
+
+# Floor of the dBFS scale, the level of digital silence
+SILENCE_FLOOR_DB = -100.0
+
+# Seconds decoded before a range so its first frame has one to be compared with
+SCENE_LEAD_IN = 1.0
+
+Range = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class AnalysisParams:
+    """Detector settings of the analysis."""
+
+    scene_threshold: float = 0.3  # Scene score (0-1) above which a frame starts a new shot
+    scene_height: int = 144  # Height frames are downscaled to before scoring
+    silence_db: float = -40.0  # RMS level in dBFS below which audio counts as silence
+    silence_min: float = 0.5  # Shortest silence kept, in seconds
+
+
+def detect_scenes(input_path: str, start: float, end: float, params: AnalysisParams, threads: int = 0) -> List[float]:
+    """Find shot boundaries in a time range from FFmpeg's scene score.
+
+    Frames are downscaled before scoring and only the frames above the
+    threshold are written out, so the cost is one decode of the range. A
+    short lead-in before start lets a cut on the range's first frame be seen;
+    cuts inside the lead-in belong to the previous range and are dropped.
+    threads limits FFmpeg's threads; 0 leaves the choice to FFmpeg.
+
+    Returns:
+        Source times of the first frame of each new shot.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    lead_in = min(start, SCENE_LEAD_IN)
+    work_dir = tempfile.mkdtemp(prefix='.scenes_')
+    try:
+        metadata_path = os.path.join(work_dir, 'scenes.txt')
+        run_ffmpeg([
+            'ffmpeg', '-y', '-threads', str(threads), '-ss', str(start - lead_in), '-t', str(end - start + lead_in),
+            '-i', input_path,
+            '-map', '0:v:0', '-an', '-sn',
+            '-vf', f"scale=-2:{params.scene_height},select='gt(scene,{params.scene_threshold})',"
+                   f"metadata=mode=print:file={metadata_path}",
+            '-threads', str(threads), '-f', 'null', '-'
+        ])
+        scenes: List[float] = []
+        if not os.path.exists(metadata_path):
+            return scenes
+        with open(metadata_path) as f:
+            for line in f:
+                # Linhas "frame:N pts:P pts_time:T", com o tempo relativo ao início da faixa
+                if line.startswith('frame:') and 'pts_time:' in line:
+                    scene = start - lead_in + float(line.rsplit('pts_time:', 1)[1].split()[0])
+                    if scene >= start:
+                        scenes.append(round(scene, 3))
+        return scenes
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _pcm_chunks(input_path: str, start: float, end: float, threads: int = 0,
+                chunk_seconds: float = 10.0) -> Iterator[np.ndarray]:
+    """Stream the first audio track of a range as mono 16-bit PCM, a chunk at a time."""
+    window = ANALYSIS_SAMPLE_RATE // WINDOWS_PER_SECOND
+    chunk_bytes = int(chunk_seconds * WINDOWS_PER_SECOND) * window * 2
+    for data in stream_ffmpeg(
+        ['ffmpeg', '-v', 'error', '-threads', str(threads), '-ss', str(start), '-t', str(end - start), '-i', input_path,
+         '-map', '0:a:0', '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE), '-f', 's16le', 'pipe:1'],
+        chunk_bytes, whole_chunks=True
+    ):
+        yield np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+
+
+def window_levels(input_path: str, start: float, end: float, threads: int = 0) -> np.ndarray:
+    """RMS level in dBFS of each 1/WINDOWS_PER_SECOND window of a range.
+
+    PCM is decoded in chunks and reduced to one value per window as it
+    arrives, so memory holds a chunk of samples plus the small level array.
+    """
+    window = ANALYSIS_SAMPLE_RATE // WINDOWS_PER_SECOND
+    levels: List[np.ndarray] = []
+    carry = np.zeros(0, dtype=np.float32)
+    for chunk in _pcm_chunks(input_path, start, end, threads):
+        samples = np.concatenate([carry, chunk.astype(np.float32) / 32768.0])
+        whole = samples.size - samples.size % window
+        carry = samples[whole:]
+        if whole:
+            rms = np.sqrt(np.mean(np.square(samples[:whole].reshape(-1, window)), axis=1))
+            levels.append(rms)
+    if carry.size:
+        levels.append(np.sqrt(np.mean(np.square(carry)))[np.newaxis])
+    if not levels:
+        return np.zeros(0, dtype=np.float32)
+    rms = np.concatenate(levels)
+    return np.maximum(20.0 * np.log10(np.maximum(rms, 1e-10)), SILENCE_FLOOR_DB).astype(np.float32)
+
+
+def find_silences(levels: np.ndarray, start: float, params: AnalysisParams, keep_edges: bool = True) -> List[Range]:
+    """Runs of windows below the silence level.
+
+    Args:
+        levels: Window levels from window_levels().
+        start: Source time of the first window.
+        params: Detector settings.
+        keep_edges: Keep runs touching either end of the range whatever their
+            length, so they can be joined with the neighbouring range.
+
+    Returns:
+        (start, end) source times of each silence.
+    """
+    silent = levels < params.silence_db
+    if not silent.any():
+        return []
+    # Bordas das sequências silenciosas: +1 onde começam, -1 onde terminam
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    min_windows = params.silence_min * WINDOWS_PER_SECOND
+    silences = []
+    for first, last in zip(starts, ends):
+        touches_edge = first == 0 or last == levels.size
+        if last - first >= min_windows or (keep_edges and touches_edge):
+            silences.append((round(start + float(first) / WINDOWS_PER_SECOND, 3),
+                             round(start + float(last) / WINDOWS_PER_SECOND, 3)))
+    return silences
+
+
+def loudness_per_second(levels: np.ndarray) -> List[float]:
+    """Mean level of each second, averaged in the power domain."""
+    if levels.size == 0:
+        return []
+    padded = np.pad(levels, (0, -levels.size % WINDOWS_PER_SECOND), constant_values=SILENCE_FLOOR_DB)
+    power = np.power(10.0, padded.reshape(-1, WINDOWS_PER_SECOND) / 10.0).mean(axis=1)
+    return [round(float(value), 1) for value in 10.0 * np.log10(np.maximum(power, 1e-10))]
+
+
+def analyze_range(input_path: str, start: float, end: float, has_audio: bool,
+                  params: AnalysisParams, threads: int = 0) -> Dict[str, Any]:
+    """Analyze one time range; the unit of work of the worker pool.
+
+    threads limits the threads of each FFmpeg decode; 0 leaves the choice to FFmpeg.
+
+    Returns:
+        Scene cuts, silences (edge runs included) and loudness per second of the range.
+    """
+    result: Dict[str, Any] = {
+        'start': start,
+        'end': end,
+        'scenes': detect_scenes(input_path, start, end, params, threads),
+        'silences': [],
+        'loudness': []
+    }
+    if has_audio:
+        levels = window_levels(input_path, start, end, threads)
+        result['silences'] = find_silences(levels, start, params)
+        result['loudness'] = loudness_per_second(levels)
+    return result
+
+
+def merge_ranges(parts: List[Dict[str, Any]], duration: float, params: AnalysisParams) -> Dict[str, Any]:
+    """Join the per-range results in time order into one analysis."""
+    parts = sorted(parts, key=lambda part: part['start'])
+    scenes: List[float] = []
+    silences: List[List[float]] = []
+    loudness: List[float] = []
+    tolerance = 1.5 / WINDOWS_PER_SECOND
+    for part in parts:
+        scenes.extend(part['scenes'])
+        loudness.extend(part['loudness'])
+        for silence_start, silence_end in part['silences']:
+            # Silêncio cortado na fronteira entre duas faixas
+            if silences and silence_start - silences[-1][1] <= tolerance:
+                silences[-1][1] = silence_end
+            else:
+                silences.append([silence_start, silence_end])
+    return {
+        'duration': duration,
+        'params': asdict(params),
+        'scenes': sorted(scenes),
+        'silences': [[start, end] for start, end in silences if end - start >= params.silence_min],
+        'loudness': loudness
+    }
+
+
+def _active_regions(analysis: Dict[str, Any]) -> List[Range]:
+    """The parts of the video between silences."""
+    regions = []
+    position = 0.0
+    for silence_start, silence_end in analysis['silences']:
+        if silence_start > position:
+            regions.append((position, silence_start))
+        position = max(position, silence_end)
+    if analysis['duration'] > position:
+        regions.append((position, analysis['duration']))
+    return regions
+
+
+def _mean_loudness(loudness: List[float], start: float, end: float) -> Optional[float]:
+    """Power-average loudness of the whole seconds of a range."""
+    values = loudness[int(start):max(int(start) + 1, int(math.ceil(end)))]
+    if not values:
+        return None
+    power = sum(10.0 ** (value / 10.0) for value in values) / len(values)
+    return 10.0 * math.log10(max(power, 1e-10))
+
+
+def suggest_clips(analysis: Dict[str, Any], count: int = 5, min_length: float = 5.0,
+                  max_length: float = 60.0) -> List[Dict[str, Any]]:
+    """Suggest clip ranges snapped to shot boundaries and silences.
+
+    Each stretch of sound between silences is cut at its shot boundaries;
+    runs of consecutive shots between min_length and max_length long become
+    candidates, scored by loudness, and the best that do not overlap are kept.
+
+    Args:
+        analysis: The cached analysis of a source.
+        count: Maximum number of suggestions.
+        min_length: Shortest clip in seconds.
+        max_length: Longest clip in seconds.
+
+    Returns:
+        Suggestions in time order, each with start, end, score and the
+        boundaries its ends were snapped to.
+    """
+    scenes = analysis['scenes']
+    candidates = []
+    for region_start, region_end in _active_regions(analysis):
+        inside = [scene for scene in scenes if region_start < scene < region_end]
+        bounds = [region_start] + inside + [region_end]
+        kinds = ['silence' if region_start > 0 else 'start'] + ['scene'] * len(inside) + \
+                ['silence' if region_end < analysis['duration'] else 'end']
+        for i, start in enumerate(bounds[:-1]):
+            best = None
+            for j in range(i + 1, len(bounds)):
+                if bounds[j] - start > max_length:
+                    break
+                if bounds[j] - start >= min_length:
+                    best = j
+            if best is not None:
+                end, end_kind = bounds[best], kinds[best]
+            elif bounds[i + 1] - start > max_length:
+                # Plano único mais longo que o máximo: cortar no comprimento máximo
+                end, end_kind = start + max_length, 'length'
+            else:
+                continue
+            candidates.append((start, end, kinds[i], end_kind))
+
+    scored = []
+    for start, end, start_kind, end_kind in candidates:
+        level = _mean_loudness(analysis['loudness'], start, end)
+        scored.append({
+            'start': round(start, 3),
+            'end': round(end, 3),
+            'score': round(level, 1) if level is not None else None,
+            'snappedTo': [start_kind, end_kind]
+        })
+    # Mais alto primeiro; sem áudio, os planos mais longos
+    scored.sort(key=lambda clip: (clip['score'] if clip['score'] is not None else SILENCE_FLOOR_DB,
+                                  clip['end'] - clip['start']), reverse=True)
+
+    chosen: List[Dict[str, Any]] = []
+    for clip in scored:
+        if len(chosen) >= count:
+            break
+        if all(clip['end'] <= other['start'] or clip['start'] >= other['end'] for other in chosen):
+            chosen.append(clip)
+    return sorted(chosen, key=lambda clip: clip['start'])
+
+
+class SourceAnalyzer:
+    """Runs the scene and silence analysis of a source split by time range.
+
+    The source is cut into ANALYSIS_CHUNK_SECONDS ranges and up to
+    ANALYSIS_WORKERS of them are analyzed at once. Decoding, the bulk of the
+    work, happens in each range's own FFmpeg processes, which hold an encode
+    slot of the transcoder and use its share of threads, so analysis and
+    encodes together stay within the core budget. Every range streams its
+    decode, so memory stays flat however long the source is.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize analyzer."""
+        self.params = AnalysisParams()
+        self.workers = 1
+        self.chunk_seconds = 300.0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Read the detector settings and pool size of an application."""
+        config = app.config
+        self.params = AnalysisParams(
+            scene_threshold=float(config.get('ANALYSIS_SCENE_THRESHOLD', 0.3)),
+            scene_height=int(config.get('ANALYSIS_SCENE_HEIGHT', 144)),
+            silence_db=float(config.get('ANALYSIS_SILENCE_DB', -40.0)),
+            silence_min=float(config.get('ANALYSIS_SILENCE_MIN', 0.5))
+        )
+        # Mais workers que slots só ficariam esperando por um slot
+        self.workers = int(config.get('ANALYSIS_WORKERS', 0)) or transcoder.slots
+        # Faixas de segundos inteiros: a sonoridade por segundo continua alinhada
+        self.chunk_seconds = float(max(10, int(config.get('ANALYSIS_CHUNK_SECONDS', 300))))
+        app.extensions['analyzer'] = self
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """The worker pool, started on first use."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis-worker')
+            return self._pool
+
+    def ranges(self, duration: float) -> List[Range]:
+        """Split a duration into the ranges analyzed in parallel."""
+        count = max(1, math.ceil(duration / self.chunk_seconds))
+        return [(i * self.chunk_seconds, min((i + 1) * self.chunk_seconds, duration)) for i in range(count)]
+
+    def analyze(self, input_path: str, output_path: str, duration: float, has_audio: bool) -> Dict[str, Any]:
+        """Analyze a video and write the result as JSON.
+
+        Args:
+            input_path: Video to analyze; the preview proxy is the cheapest to decode.
+            output_path: Path of the analysis file.
+            duration: Duration of the video in seconds.
+            has_audio: Whether to run the silence and loudness pass.
+
+        Returns:
+            The analysis: scene cuts, silences and loudness per second.
+
+        Raises:
+            RuntimeError: If FFmpeg fails.
+        """
+        ranges = self.ranges(duration)
+        if len(ranges) > 1 and self.workers > 1:
+            futures = [
+                self._executor().submit(self._analyze_range, input_path, start, end, has_audio)
+                for start, end in ranges
+            ]
+            parts = [future.result() for future in futures]
+        else:
+            parts = [self._analyze_range(input_path, start, end, has_audio) for start, end in ranges]
+
+        analysis = merge_ranges(parts, duration, self.params)
+        temp_path = f'{output_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(analysis, f)
+        os.replace(temp_path, output_path)
+        logger.debug("Analyzed %s in %d ranges: %d scene cuts, %d silences",
+                     input_path, len(ranges), len(analysis['scenes']), len(analysis['silences']))
+        return analysis
+
+    def _analyze_range(self, input_path: str, start: float, end: float, has_audio: bool) -> Dict[str, Any]:
+        """Analyze one range holding an encode slot, with the slot's share of threads."""
+        with transcoder.slot():
+            return analyze_range(input_path, start, end, has_audio, self.params, transcoder.threads_per_slot)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def load_analysis(path: str) -> Dict[str, Any]:
+    """Load an analysis written by SourceAnalyzer.analyze()."""
+    with open(path) as f:
+        return json.load(f)
+
+
+analyzer = SourceAnalyzer()
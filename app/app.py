@@ -1,26 +1,48 @@
 # Standard library imports
-import io
+import hmac
+import json
 import logging
 import os
-import subprocess
-import zipfile
-from typing import Optional, Any, cast, Dict
+import time
+from contextlib import ExitStack
+from typing import Optional, Any, cast, Dict, List
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
-import shutil
+from datetime import timedelta
 
 # Third-party imports
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, send_from_directory
+from flask import Flask, Response, g, make_response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from dotenv import load_dotenv
-import yt_dlp
 
 # Local imports
-from models import db, User
+from models import configure_sqlite, db, User, ClipJob, ClipJobItem, DownloadSection, DownloadTask, SourceVideo
 from forms import LoginForm, RegistrationForm
+from catalog import catalog
+from analysis import analyzer, load_analysis, suggest_clips
+from clips import SNAP_MODES, format_clip_time, parse_clip_time, validate_clips
+from concat import ReelRange, plan_reel, write_reel
+from cutting import (CUT_MODE_AUTO, CUT_MODES, STRATEGY_COPY, STRATEGY_ENCODE, CutPlan, encode_range,
+                     ffmpeg_watchdog, plan_cut, stream_command, stream_ffmpeg, streamable_plan)
+from dispatcher import dispatcher, runs_workers
+from engine import media_engine
+from ingest import ingest_queue
+from janitor import janitor
+from jobs import clip_jobs
+from locks import locks
+from media import send_media
+from media_info import check_range, media_info_cache
+from metrics import HTTP_REQUEST_SECONDS, registry, server_timing, span, timed_iter
+from progress import progress_hub
+from previews import ASSET_ANALYSIS, ASSET_HLS, ASSET_PROXY, ASSET_TIMELINE, TIMELINE_DIRNAME, previews
+from render_cache import render_cache
+from scheduling import Overloaded, admission
+from source_cache import source_cache
+from streaming_zip import StreamingZip
+from timeline import load_manifest
+from transcoding import PROFILE_EXPORT, transcoder
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; DEBUG formata registros em todo caminho quente, então só sob demanda
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .flaskenv
@@ -36,14 +58,112 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_EXTENSIONS'] = ['.mp4', '.avi', '.mov']
 app.config['FILE_CLEANUP_AGE'] = timedelta(hours=24)
+app.config['JANITOR_ENABLED'] = os.environ.get('JANITOR_ENABLED', '1') == '1'
+app.config['JANITOR_INTERVAL'] = float(os.environ.get('JANITOR_INTERVAL', 60))
+app.config['JANITOR_MAX_FILES'] = int(os.environ.get('JANITOR_MAX_FILES', 200))
+app.config['JANITOR_MAX_SECONDS'] = float(os.environ.get('JANITOR_MAX_SECONDS', 2.0))
+app.config['JANITOR_MAX_SOURCES'] = int(os.environ.get('JANITOR_MAX_SOURCES', 10))
+# Usuários cuja cota de disco é verificada por passada; a verificação continua na passada seguinte
+app.config['JANITOR_QUOTA_USERS'] = int(os.environ.get('JANITOR_QUOTA_USERS', 100))
+app.config['USER_DISK_QUOTA'] = int(os.environ.get('USER_DISK_QUOTA', 0))  # 0 desativa a cota
+app.config['YTDLP_FORMAT'] = os.environ.get('YTDLP_FORMAT', 'best')
+app.config['INGEST_WORKERS'] = int(os.environ.get('INGEST_WORKERS', 2))
+app.config['INGEST_PROGRESS_INTERVAL'] = float(os.environ.get('INGEST_PROGRESS_INTERVAL', 0.5))
+app.config['CLIP_FIRST_MARGIN'] = float(os.environ.get('CLIP_FIRST_MARGIN', 5))  # segundos em cada lado
+app.config['ZIP_CHUNK_SIZE'] = int(os.environ.get('ZIP_CHUNK_SIZE', 1024 * 1024))
+app.config['CLIP_WORKERS'] = int(os.environ.get('CLIP_WORKERS', min(4, os.cpu_count() or 1)))
+app.config['CLIP_BATCH_MAX_OUTPUTS'] = int(os.environ.get('CLIP_BATCH_MAX_OUTPUTS', 16))
+app.config['CLIP_BATCH_MAX_GAP'] = float(os.environ.get('CLIP_BATCH_MAX_GAP', 60))
+app.config['CUT_SNAP_TOLERANCE'] = float(os.environ.get('CUT_SNAP_TOLERANCE', 0.5))
+app.config['CLIP_DEFAULT_SNAP'] = os.environ.get('CLIP_DEFAULT_SNAP', 'frame')  # none, frame ou keyframe
+app.config['CONCAT_MAX_RANGES'] = int(os.environ.get('CONCAT_MAX_RANGES', 50))
+app.config['RENDER_CACHE_MAX_BYTES'] = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+app.config['RENDER_STREAM_TEE'] = os.environ.get('RENDER_STREAM_TEE', '1') == '1'  # guardar renderizações transmitidas no cache
+app.config['MEDIA_CHUNK_SIZE'] = int(os.environ.get('MEDIA_CHUNK_SIZE', 256 * 1024))
+app.config['MEDIA_CACHE_MAX_AGE'] = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 365 * 24 * 3600))
+app.config['MEDIA_SENDFILE'] = os.environ.get('MEDIA_SENDFILE', '')  # '', 'x-sendfile' ou 'x-accel-redirect'
+app.config['MEDIA_ACCEL_PREFIX'] = os.environ.get('MEDIA_ACCEL_PREFIX', '/_media')
+app.config['PREVIEW_WORKERS'] = int(os.environ.get('PREVIEW_WORKERS', 1))
+app.config['PREVIEW_HEIGHT'] = int(os.environ.get('PREVIEW_HEIGHT', 360))
+app.config['PREVIEW_CRF'] = int(os.environ.get('PREVIEW_CRF', 28))
+app.config['PREVIEW_KEYFRAME_INTERVAL'] = float(os.environ.get('PREVIEW_KEYFRAME_INTERVAL', 1.0))
+app.config['PREVIEW_HLS'] = os.environ.get('PREVIEW_HLS', '0') == '1'
+app.config['PREVIEW_HLS_SEGMENT'] = int(os.environ.get('PREVIEW_HLS_SEGMENT', 4))
+app.config['TIMELINE_INTERVAL'] = float(os.environ.get('TIMELINE_INTERVAL', 2.0))
+app.config['TIMELINE_THUMB_WIDTH'] = int(os.environ.get('TIMELINE_THUMB_WIDTH', 160))
+app.config['TIMELINE_COLUMNS'] = int(os.environ.get('TIMELINE_COLUMNS', 10))
+app.config['TIMELINE_ROWS'] = int(os.environ.get('TIMELINE_ROWS', 10))
+app.config['TIMELINE_PEAKS_PER_SECOND'] = int(os.environ.get('TIMELINE_PEAKS_PER_SECOND', 50))
+app.config['ANALYSIS_ENABLED'] = os.environ.get('ANALYSIS_ENABLED', '1') == '1'
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('ANALYSIS_WORKERS', 0))  # 0: um por slot de codificação
+app.config['ANALYSIS_CHUNK_SECONDS'] = int(os.environ.get('ANALYSIS_CHUNK_SECONDS', 300))
+app.config['ANALYSIS_SCENE_THRESHOLD'] = float(os.environ.get('ANALYSIS_SCENE_THRESHOLD', 0.3))
+app.config['ANALYSIS_SCENE_HEIGHT'] = int(os.environ.get('ANALYSIS_SCENE_HEIGHT', 144))
+app.config['ANALYSIS_SILENCE_DB'] = float(os.environ.get('ANALYSIS_SILENCE_DB', -40))
+app.config['ANALYSIS_SILENCE_MIN'] = float(os.environ.get('ANALYSIS_SILENCE_MIN', 0.5))
+app.config['TRANSCODE_SLOTS'] = int(os.environ.get('TRANSCODE_SLOTS', 0))  # 0: metade dos núcleos
+app.config['TRANSCODE_PREVIEW_PRESET'] = os.environ.get('TRANSCODE_PREVIEW_PRESET', 'veryfast')
+app.config['TRANSCODE_EXPORT_PRESET'] = os.environ.get('TRANSCODE_EXPORT_PRESET', 'medium')
+app.config['TRANSCODE_DEFAULT_CRF'] = int(os.environ.get('TRANSCODE_DEFAULT_CRF', 23))
+app.config['TRANSCODE_CRF'] = os.environ.get('TRANSCODE_CRF', '480:24,720:23,1080:22,2160:24')  # altura:crf
+app.config['LOG_SAMPLE_EVERY'] = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')  # vazio: /metrics aberto
+app.config['ENGINE_ENABLED'] = os.environ.get('ENGINE_ENABLED', '1') == '1'
+app.config['ENGINE_POOL_SIZE'] = int(os.environ.get('ENGINE_POOL_SIZE', 8))
+app.config['ENGINE_IDLE_SECONDS'] = float(os.environ.get('ENGINE_IDLE_SECONDS', 300))
+app.config['FFMPEG_TIMEOUT'] = float(os.environ.get('FFMPEG_TIMEOUT', 3600))  # 0 desativa o prazo
+app.config['FFMPEG_STALL_TIMEOUT'] = float(os.environ.get('FFMPEG_STALL_TIMEOUT', 120))  # 0 desativa
+app.config['JOB_EVENTS_POLL'] = float(os.environ.get('JOB_EVENTS_POLL', 2.0))
+app.config['SQLITE_BUSY_TIMEOUT'] = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+app.config['WORKER_MODE'] = os.environ.get('WORKER_MODE', 'embedded')  # embedded, web ou worker
+app.config['WORKER_POLL_INTERVAL'] = float(os.environ.get('WORKER_POLL_INTERVAL', 2.0))
+app.config['LOCK_DIR'] = os.environ.get('LOCK_DIR', '')  # vazio: instance/locks; compartilhado entre processos
+app.config['LOCK_TIMEOUT'] = float(os.environ.get('LOCK_TIMEOUT', 3600))
+app.config['SCHEDULER_ROLE_WEIGHTS'] = os.environ.get('SCHEDULER_ROLE_WEIGHTS', 'admin:4,user:1')  # papel:peso
+app.config['SCHEDULER_USER_WORKERS'] = int(os.environ.get('SCHEDULER_USER_WORKERS', 0))  # 0: metade de cada pool
+app.config['ADMISSION_MAX_CLIPS'] = int(os.environ.get('ADMISSION_MAX_CLIPS', 1000))
+app.config['ADMISSION_USER_MAX_CLIPS'] = int(os.environ.get('ADMISSION_USER_MAX_CLIPS', 100))
+app.config['ADMISSION_MAX_DOWNLOADS'] = int(os.environ.get('ADMISSION_MAX_DOWNLOADS', 20))
+app.config['ADMISSION_USER_MAX_DOWNLOADS'] = int(os.environ.get('ADMISSION_USER_MAX_DOWNLOADS', 3))
+app.config['ADMISSION_MAX_RENDERS'] = int(os.environ.get('ADMISSION_MAX_RENDERS', 0))  # 0: dobro dos slots de encode
+app.config['ADMISSION_USER_MAX_RENDERS'] = int(os.environ.get('ADMISSION_USER_MAX_RENDERS', 2))
+app.config['ADMISSION_RETRY_AFTER'] = int(os.environ.get('ADMISSION_RETRY_AFTER', 10))
+# Espera máxima de uma requisição pela mesma renderização em andamento, em segundos
+app.config['ADMISSION_LOCK_WAIT'] = float(os.environ.get('ADMISSION_LOCK_WAIT', 20))
 
 # Initialize extensions
 db.init_app(app)
+registry.init_app(app)
+locks.init_app(app)
+dispatcher.init_app(app)
+admission.init_app(app)
+catalog.init_app(app)
+clip_jobs.init_app(app)
+render_cache.init_app(app)
+source_cache.init_app(app)
+media_info_cache.init_app(app)
+transcoder.init_app(app)
+ffmpeg_watchdog.init_app(app)
+progress_hub.init_app(app)
+media_engine.init_app(app)
+analyzer.init_app(app)
+previews.init_app(app)
+ingest_queue.init_app(app)
+janitor.init_app(app)
 
 # Create database tables
 with app.app_context():
+    configure_sqlite(db.engine, app.config['SQLITE_BUSY_TIMEOUT'])
     db.create_all()
 
+# Processos web só enfileiram; os workers reivindicam o trabalho pendente no banco
+dispatcher.register(clip_jobs.resume_pending)
+dispatcher.register(ingest_queue.resume_pending)
+dispatcher.register(previews.resume_pending)
+dispatcher.start()
+if runs_workers(app):
+    janitor.start()
+
 # Configure login manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -54,6 +174,39 @@ def load_user(user_id: str) -> Optional[UserMixin]:
     """Load user by ID."""
     return User.query.get(int(user_id))
 
+@app.before_request
+def start_request_timer() -> None:
+    """Remember when the request started, for the request histogram."""
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_timing(response: Response) -> Response:
+    """Observe the request duration and expose its stage spans as Server-Timing."""
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    timing = server_timing()
+    if timing:
+        response.headers['Server-Timing'] = timing
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose stage timings, request latency, queue depths and running FFmpeg processes.
+    
+    Returns:
+        The Prometheus text exposition, 403 when METRICS_TOKEN is set and not presented.
+    """
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Handle user login."""
@@ -96,33 +249,27 @@ def register():
 @app.route('/')
 def index():
     """Home page."""
-    return render_template('index.html')
+    return render_template('index.html', task_id=request.args.get('task'))
 
-def cleanup_old_files():
-    """Remove files older than FILE_CLEANUP_AGE"""
-    try:
-        cutoff = datetime.now() - app.config['FILE_CLEANUP_AGE']
-        
-        # Cleanup downloads
-        downloads_dir = os.path.join(app.root_path, 'downloads')
-        processed_dir = os.path.join(app.root_path, 'static', 'processed')
-        
-        for directory in [downloads_dir, processed_dir]:
-            if os.path.exists(directory):
-                for user_dir in os.listdir(directory):
-                    user_path = os.path.join(directory, user_dir)
-                    if os.path.isdir(user_path):
-                        for filename in os.listdir(user_path):
-                            filepath = os.path.join(user_path, filename)
-                            file_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-                            if file_time < cutoff:
-                                if os.path.isfile(filepath):
-                                    os.remove(filepath)
-                                elif os.path.isdir(filepath):
-                                    shutil.rmtree(filepath)
-        
-    except Exception as e:
-        logger.error(f"Error cleaning up files: {e}")
+def overloaded_response(error: Overloaded) -> Response:
+    """429 response telling the client when to retry refused work."""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'retryAfter': error.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def render_response(cache_key: str, render_info: Dict[str, Any], cached: bool) -> Response:
+    """JSON response pointing at a render stored in the render cache."""
+    return jsonify({
+        'success': True,
+        'videoUrl': url_for('serve_render', filename=render_cache.filename(cache_key)),
+        'cached': cached,
+        **render_info
+    })
 
 def cleanup_user_files(user_id: int, video_path: Optional[str] = None):
     """Clean up user's processed files.
@@ -132,27 +279,8 @@ def cleanup_user_files(user_id: int, video_path: Optional[str] = None):
         video_path: Optional specific video path to clean up related files
     """
     try:
-        processed_dir = os.path.join(app.root_path, 'static', 'processed', str(user_id))
-        if not os.path.exists(processed_dir):
-            return
-            
-        video_basename = os.path.basename(video_path) if video_path else None
-        
-        for filename in os.listdir(processed_dir):
-            file_path = os.path.join(processed_dir, filename)
-            # Se video_basename for fornecido, remover apenas arquivos relacionados a este vídeo
-            if video_basename:
-                # Remover timestamp do nome do arquivo para comparação
-                cleaned_filename = '_'.join(filename.split('_')[2:]) if filename.count('_') >= 2 else filename
-                if video_basename not in cleaned_filename:
-                    continue
-                    
-            if os.path.isfile(file_path):
-                try:
-                    os.remove(file_path)
-                    logger.debug(f"Removed file: {file_path}")
-                except Exception as e:
-                    logger.warning(f"Could not remove file {file_path}: {e}")
+        # Se video_path for fornecido, remover apenas os clips gerados a partir deste vídeo
+        catalog.remove_clips(catalog.clips_for(user_id, video_path))
     except Exception as e:
         logger.error(f"Error in cleanup_user_files: {e}")
 
@@ -173,89 +301,330 @@ def process_video():
         flash('Please provide a YouTube URL')
         return redirect(url_for('index'))
     
+    # Modo clip-first: com início e fim informados, baixa-se só esse trecho
+    clip_start = request.form.get('clip_start', '').strip()
+    clip_end = request.form.get('clip_end', '').strip()
+    section = None
+    if clip_start or clip_end:
+        try:
+            section = DownloadSection(parse_clip_time(clip_start), parse_clip_time(clip_end))
+        except ValueError:
+            flash('Invalid clip range. Expected [HH:]MM:SS[.mmm] or seconds for start and end times')
+            return redirect(url_for('index'))
+        if section.end_time <= section.start_time:
+            flash('End time must be greater than start time')
+            return redirect(url_for('index'))
+    
+    try:
+        admission.check_download(current_user)
+    except Overloaded as e:
+        flash(str(e))
+        response = make_response(index(), 429)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    
     try:
-        # Setup directories
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        user_download_dir = os.path.join(base_dir, 'downloads', str(current_user.id))
-        os.makedirs(user_download_dir, exist_ok=True)
-        
         logger.debug("Processing video from URL: %s", youtube_url)
-        logger.debug("Download directory: %s", user_download_dir)
         
-        # Configure yt-dlp with error checking
-        try:
-            ydl_opts = {
-                'format': 'best',
-                'outtmpl': os.path.join(user_download_dir, '%(title)s.%(ext)s'),
-                'verbose': True,
-                'merge_output_format': 'mp4'
-            }
-            
-            # Download video
-            ydl = yt_dlp.YoutubeDL(ydl_opts)
-            logger.debug("Starting video download...")
-            info = ydl.extract_info(youtube_url, download=True)
-            if not info:
-                raise ValueError("Failed to extract video information")
-                
-            video_title = str(info.get('title', ''))
-            if not video_title:
-                raise ValueError("Failed to get video title")
-            
-            # Ensure path uses correct separator and has extension
-            video_path = f"{current_user.id}/{video_title}.mp4"
-            video_path = video_path.replace('\\', '/')
-            
-            full_path = os.path.join(base_dir, 'downloads', str(current_user.id), f'{video_title}.mp4')
-            logger.debug("Video downloaded to: %s", full_path)
-            
-            # Verify file exists and has content
-            if not os.path.exists(full_path):
-                raise FileNotFoundError(f"Downloaded file not found: {full_path}")
-                
-            file_size = os.path.getsize(full_path)
-            if file_size == 0:
-                raise ValueError(f"Downloaded file is empty: {full_path}")
-                
-            logger.debug("File exists and size is: %s bytes", file_size)
-            
-            flash(f'Video "{video_title}" downloaded successfully!')
-            return redirect(url_for('edit_video', video_path=video_path))
-                
-        except yt_dlp.DownloadError as e:
-            raise ValueError(f"Failed to download video: {str(e)}")
-            
-    except ValueError as e:
-        logger.error("Value error in video processing: %s", str(e))
-        flash(f'Error processing video: {str(e)}')
-        return redirect(url_for('index'))
-    except FileNotFoundError as e:
-        logger.error("File error in video processing: %s", str(e))
-        flash(f'Error with video file: {str(e)}')
-        return redirect(url_for('index'))
+        # O download roda em segundo plano; a página inicial acompanha o progresso
+        task = DownloadTask(user_id=current_user.id, url=youtube_url)
+        task.section = section
+        db.session.add(task)
+        db.session.commit()
+        ingest_queue.submit(task)
+        
+        return redirect(url_for('index', task=task.id))
+        
     except Exception as e:
         logger.error("Unexpected error in video processing: %s", str(e), exc_info=True)
         flash('An unexpected error occurred while processing the video')
         return redirect(url_for('index'))
 
+def get_user_download(task_id: str) -> Optional[DownloadTask]:
+    """Return the download task if it belongs to the current user."""
+    task: Optional[DownloadTask] = db.session.get(DownloadTask, task_id)
+    if task is None or task.user_id != current_user.id:
+        return None
+    return task
+
+def download_status_payload(task: DownloadTask) -> Dict[str, Any]:
+    """Serialize a download task with the editor URL once it is ready."""
+    payload = task.to_dict()
+    payload['editUrl'] = None
+    if task.status == DownloadTask.DONE:
+        # Downloads clip-first abrem o editor com a janela pedida preenchida
+        window: Dict[str, Any] = {}
+        if task.section is not None:
+            window = {'start': format_clip_time(task.section.start_time), 'end': format_clip_time(task.section.end_time)}
+        payload['editUrl'] = url_for('edit_video', video_path=task.video_path, **window)
+    return payload
+
+@app.route('/api/downloads/<task_id>', methods=['GET'])
+@login_required
+def download_status(task_id: str):
+    """Report the progress of a background download.
+    
+    Args:
+        task_id: The ID of the download task.
+        
+    Returns:
+        JSON response with bytes downloaded, ETA and the editor URL when done.
+    """
+    task = get_user_download(task_id)
+    if task is None:
+        return jsonify({
+            'success': False,
+            'error': 'Download not found'
+        }), 404
+        
+    return jsonify({
+        'success': True,
+        'download': download_status_payload(task)
+    })
+
+@app.route('/api/downloads/<task_id>/events', methods=['GET'])
+@login_required
+def download_events(task_id: str):
+    """Stream the progress of a background download as Server-Sent Events.
+    
+    Args:
+        task_id: The ID of the download task.
+        
+    Returns:
+        A text/event-stream response that ends once the download finishes.
+    """
+    task = get_user_download(task_id)
+    if task is None:
+        return jsonify({
+            'success': False,
+            'error': 'Download not found'
+        }), 404
+        
+    interval = app.config['INGEST_PROGRESS_INTERVAL']
+    
+    def generate():
+        last_payload = None
+        while True:
+            current = db.session.get(DownloadTask, task_id, populate_existing=True)
+            if current is None:
+                return
+            payload = json.dumps(download_status_payload(current))
+            if payload != last_payload:
+                yield f'data: {payload}\n\n'
+                last_payload = payload
+            if current.is_finished:
+                return
+            # Encerrar a transação para enxergar as atualizações do worker
+            db.session.rollback()
+            time.sleep(interval)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/edit/<path:video_path>')
 @login_required
 def edit_video(video_path):
-    """Video editing page."""
+    """Video editing page.
+
+    The optional 'start' and 'end' query arguments fill in the first clip.
+    """
     # Limpar apenas os arquivos relacionados ao vídeo atual
     cleanup_user_files(current_user.id, video_path)
-    return render_template('edit_video.html', video_path=video_path)
+    # Downloads clip-first começam em time_offset; o editor mostra os tempos do vídeo original
+    time_offset = source_cache.time_offset(current_user.id, video_path)
+    return render_template('edit_video.html', video_path=video_path, preview=preview_payload(video_path),
+                           time_offset=time_offset, time_offset_label=format_clip_time(time_offset),
+                           clip_start=request.args.get('start', ''), clip_end=request.args.get('end', ''))
+
+def preview_payload(video_path: str) -> Dict[str, Any]:
+    """Preview renditions available to the editor for one of the user's videos.
+    
+    Args:
+        video_path: The video path relative to downloads/.
+        
+    Returns:
+        The preview status and URLs; originalUrl is used until the proxy is ready.
+    """
+    source = source_cache.source_for_user(current_user.id, video_path)
+    payload: Dict[str, Any] = {
+        'status': None,
+        'originalUrl': url_for('serve_video', filename=video_path),
+        'proxyUrl': None,
+        'hlsUrl': None
+    }
+    if source is None:
+        return payload
+    status = previews.status(source)
+    payload['status'] = status['status']
+    if status[ASSET_PROXY]:
+        payload['proxyUrl'] = url_for('serve_preview', source_id=source.id, filename=status[ASSET_PROXY])
+    if status[ASSET_HLS]:
+        payload['hlsUrl'] = url_for('serve_preview', source_id=source.id, filename=status[ASSET_HLS])
+    return payload
+
+@app.route('/api/previews/<path:video_path>')
+@login_required
+def preview_status(video_path: str):
+    """Get the preview renditions of a video."""
+    return jsonify({'success': True, 'preview': preview_payload(video_path)})
+
+@app.route('/api/timeline/<path:video_path>')
+@login_required
+def timeline_index(video_path: str):
+    """Get the scrubbing index of a video: sprite sheets, WebVTT map and audio peaks.
+    
+    Args:
+        video_path: The video path relative to downloads/.
+        
+    Returns:
+        JSON response with the timeline manifest and the URLs of its files.
+    """
+    source = source_cache.source_for_user(current_user.id, video_path)
+    if source is None:
+        return jsonify({
+            'success': False,
+            'error': 'Timeline not available for this video'
+        }), 404
+        
+    if previews.status(source)[ASSET_TIMELINE] is None:
+        return jsonify({'success': True, 'ready': False}), 202
+        
+    try:
+        manifest = load_manifest(os.path.join(source_cache.asset_dir(source), TIMELINE_DIRNAME))
+    except (OSError, ValueError) as e:
+        logger.error("Error loading timeline of %s: %s", video_path, str(e))
+        return jsonify({'success': True, 'ready': False}), 202
+        
+    def file_url(filename: str) -> str:
+        return url_for('serve_preview', source_id=source.id, filename=f'{TIMELINE_DIRNAME}/{filename}')
+        
+    manifest['sprites']['sheetUrls'] = [file_url(sheet) for sheet in manifest['sprites']['sheets']]
+    manifest['vttUrl'] = file_url(manifest['vtt'])
+    manifest['peaksUrl'] = file_url(manifest['peaks'])
+    response = jsonify({'success': True, 'ready': True, 'timeline': manifest})
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/suggestions/<path:video_path>')
+@login_required
+def clip_suggestions(video_path: str):
+    """Suggest clip ranges snapped to the shot boundaries and silences of a video.
+    
+    Args:
+        video_path: The video path relative to downloads/.
+        
+    Query parameters:
+        count: Maximum number of suggestions (default 5).
+        minLength: Shortest clip in seconds (default 5).
+        maxLength: Longest clip in seconds (default 60).
+        
+    Returns:
+        JSON response with the suggestions, or 202 while the analysis runs.
+    """
+    source = source_cache.source_for_user(current_user.id, video_path)
+    if source is None:
+        return jsonify({
+            'success': False,
+            'error': 'Suggestions not available for this video'
+        }), 404
+        
+    try:
+        count = int(request.args.get('count', 5))
+        min_length = float(request.args.get('minLength', 5))
+        max_length = float(request.args.get('maxLength', 60))
+        if count < 1 or min_length <= 0 or max_length < min_length:
+            raise ValueError("Expected count >= 1 and 0 < minLength <= maxLength")
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid suggestion parameters: {str(e)}"
+        }), 400
+        
+    if previews.status(source)[ASSET_ANALYSIS] is None:
+        # Fontes baixadas antes da análise existir entram na fila aqui
+        previews.submit(source)
+        return jsonify({'success': True, 'ready': False}), 202
+        
+    try:
+        analysis = load_analysis(previews.asset_path(source, ASSET_ANALYSIS))
+    except (OSError, ValueError) as e:
+        logger.error("Error loading analysis of %s: %s", video_path, str(e))
+        return jsonify({'success': True, 'ready': False}), 202
+        
+    suggestions = suggest_clips(analysis, count, min_length, max_length)
+    time_offset = source.section_start
+    for suggestion in suggestions:
+        # Tempos do vídeo original, no formato aceito por /api/generate-clips
+        suggestion['start'] += time_offset
+        suggestion['end'] += time_offset
+        suggestion['startTime'] = format_clip_time(suggestion['start'])
+        suggestion['endTime'] = format_clip_time(suggestion['end'])
+    return jsonify({
+        'success': True,
+        'ready': True,
+        'sceneCount': len(analysis['scenes']),
+        'silenceCount': len(analysis['silences']),
+        'suggestions': suggestions
+    })
+
+def stream_render(cache_key: str, input_path: str, plan: CutPlan, video_filter: Optional[str],
+                  encoder_options: List[str], time_offset: float = 0.0) -> Response:
+    """Stream a render to the client as fragmented MP4 while FFmpeg writes it.
+
+    The render is admitted and holds its encode slot until the response is
+    closed. With RENDER_STREAM_TEE the stream is also written into the
+    render cache, unless another request is already rendering the same key.
+    time_offset is added to the plan's times in the cached render info.
+
+    Raises:
+        Overloaded: If the render cannot start now.
+    """
+    resources = ExitStack()
+    resources.enter_context(admission.render(current_user))
+    try:
+        resources.enter_context(transcoder.slot(plan.strategy != STRATEGY_COPY))
+        render_info = {
+            'strategy': plan.strategy,
+            'startTime': plan.start_time + time_offset,
+            'endTime': plan.end_time + time_offset
+        }
+        chunks = stream_ffmpeg(stream_command(input_path, plan, video_filter, encoder_options),
+                               app.config['MEDIA_CHUNK_SIZE'])
+        if app.config['RENDER_STREAM_TEE']:
+            claim = locks.try_claim(f'render:{cache_key}')
+            if claim is not None:
+                resources.callback(claim.release)
+                chunks = render_cache.tee(cache_key, chunks, render_info)
+        
+        response = Response(timed_iter('stream_render', chunks), mimetype='video/mp4')
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Render-Strategy'] = plan.strategy
+        # O corpo fecha antes dos callbacks: o FFmpeg é encerrado antes de liberar o slot e o lock
+        response.call_on_close(resources.close)
+        return response
+    except BaseException:
+        resources.close()
+        raise
 
 @app.route('/api/edit-video', methods=['POST'])
 @login_required
 def edit_video_api():
     """Handle video editing API requests.
     
+    With 'stream' set in the request the video itself is the response: a
+    fragmented MP4 streamed while FFmpeg writes it, or the cached render.
+    Smart cuts are re-encoded in this mode, since they take two passes.
+    
     Returns:
-        JSON response with success status and video URL or error message.
+        JSON response with success status and video URL or error message,
+        or the video when streaming.
     
     Raises:
         400: If request data is invalid
+        429: If too many renders are in progress
         500: If video processing fails
     """
     try:
@@ -285,104 +654,359 @@ def edit_video_api():
             if resolution != 'original' and not resolution.endswith('p'):
                 raise ValueError("Invalid resolution format")
                 
+            cut_mode = str(data.get('cutMode', CUT_MODE_AUTO))
+            if cut_mode not in CUT_MODES:
+                raise ValueError(f"Invalid cut mode. Expected one of {CUT_MODES}")
+            
+            stream = bool(data.get('stream', False))
+                
         except (KeyError, ValueError, TypeError) as e:
             return jsonify({
                 'success': False,
                 'error': f'Invalid data: {str(e)}'
             }), 400
         
-        # Create output directory
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        output_dir = os.path.join('static', 'processed', str(current_user.id))
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Gerar nome único para o arquivo de saída
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'edited_{timestamp}_{os.path.basename(video_path)}'
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # Remover versões anteriores do mesmo vídeo
-        for old_file in os.listdir(output_dir):
-            if old_file.startswith('edited_') and old_file.endswith(os.path.basename(video_path)):
-                old_path = os.path.join(output_dir, old_file)
-                try:
-                    os.remove(old_path)
-                except Exception as e:
-                    logger.warning(f"Could not remove old file {old_path}: {e}")
-        
         # Validate input video exists
-        input_path = os.path.join(base_dir, 'downloads', video_path)
+        input_path = os.path.join(app.root_path, 'downloads', video_path)
         if not os.path.exists(input_path):
             return jsonify({
                 'success': False,
                 'error': 'Input video file not found'
             }), 404
         
-        try:
-            # Build FFmpeg command
-            command = ['ffmpeg', '-i', input_path, '-ss', str(start_time), '-to', str(end_time)]
-            
-            # Add resolution parameters if not original
+        with span('validate'):
+            try:
+                index = media_info_cache.get_for_user(current_user.id, video_path)
+                # Tempos do vídeo original; downloads clip-first começam em time_offset
+                time_offset = source_cache.time_offset(current_user.id, video_path)
+                start_time -= time_offset
+                end_time -= time_offset
+                check_range(index, start_time, end_time, label='Edit', offset=time_offset)
+            except RuntimeError as e:
+                logger.error("Could not probe %s: %s", video_path, str(e))
+                return jsonify({
+                    'success': False,
+                    'error': 'Input video could not be read'
+                }), 400
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid data: {str(e)}'
+                }), 400
+        
+        # Mudança de resolução exige reencodar o trecho inteiro, então o modo de corte não importa
+        if resolution != 'original':
+            try:
+                height = int(resolution.replace('p', ''))
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid resolution value'
+                }), 400
+            if height == index.height:
+                # A fonte já está nessa resolução: cortar sem filtro de escala
+                resolution = 'original'
+            else:
+                cut_mode = STRATEGY_ENCODE
+        
+        # Requisições repetidas reutilizam a renderização anterior
+        cache_key = render_cache.make_key(input_path, {
+            'startTime': round(start_time, 3),
+            'endTime': round(end_time, 3),
+            'resolution': resolution.lower(),
+            'cutMode': cut_mode
+        })
+        if stream:
+            if render_cache.lookup(cache_key) is not None:
+                assert render_cache.cache_dir is not None
+                return send_media(render_cache.cache_dir, render_cache.filename(cache_key), immutable=True)
             if resolution != 'original':
-                try:
-                    height = int(resolution.replace('p', ''))
-                    command.extend(['-vf', f'scale=-2:{height}'])
-                except ValueError:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Invalid resolution value'
-                    }), 400
+                return stream_render(cache_key, input_path, CutPlan(STRATEGY_ENCODE, start_time, end_time),
+                                     f'scale=-2:{height}', transcoder.options(PROFILE_EXPORT, height), time_offset)
+            plan = streamable_plan(plan_cut(index, start_time, end_time, cut_mode, app.config['CUT_SNAP_TOLERANCE']))
+            return stream_render(cache_key, input_path, plan, None, transcoder.options(PROFILE_EXPORT, index.height),
+                                 time_offset)
+        
+        # Renderizações já em cache não passam pela admissão nem pelo lock
+        cached = render_cache.lookup(cache_key)
+        if cached is not None:
+            return render_response(cache_key, cached, cached=True)
+        
+        # A admissão vem antes de esperar pela mesma renderização, e a espera é curta:
+        # requisições iguais recebem 429 em vez de prender workers web até a renderização terminar
+        with admission.render(current_user), admission.exclusive(f'render:{cache_key}'):
+            # Outra requisição ou processo pode ter terminado a mesma renderização durante a espera
+            cached = render_cache.lookup(cache_key)
+            if cached is not None:
+                return render_response(cache_key, cached, cached=True)
             
-            # Add output path and overwrite flag
-            command.extend(['-y', output_path])
+            output_path = render_cache.temp_path(cache_key)
+            try:
+                if resolution != 'original':
+                    plan = CutPlan(STRATEGY_ENCODE, start_time, end_time)
+                    with transcoder.slot(), span('encode'):
+                        encode_range(input_path, output_path, start_time, end_time, video_filter=f'scale=-2:{height}',
+                                     encoder_options=transcoder.options(PROFILE_EXPORT, height))
+                else:
+                    plan = plan_cut(index, start_time, end_time, cut_mode, app.config['CUT_SNAP_TOLERANCE'])
+                    # Cópias de stream não disputam os núcleos com as reencodagens
+                    with transcoder.slot(plan.strategy != STRATEGY_COPY):
+                        media_engine.cut(input_path, output_path, plan, index, transcoder.options(PROFILE_EXPORT, index.height))
             
-            # Execute FFmpeg command
-            logger.debug("Running FFmpeg command: %s", ' '.join(command))
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                check=True
-            )
+                # Verify output file was created
+                if not os.path.exists(output_path):
+                    raise FileNotFoundError("FFmpeg failed to create output file")
             
-            # Verify output file was created
-            if not os.path.exists(output_path):
-                raise FileNotFoundError("FFmpeg failed to create output file")
-                
-            if os.path.getsize(output_path) == 0:
-                raise ValueError("FFmpeg created an empty output file")
+                if os.path.getsize(output_path) == 0:
+                    raise ValueError("FFmpeg created an empty output file")
             
-            # Return success response
-            video_url = url_for('static', filename=f'processed/{current_user.id}/{output_filename}')
-            return jsonify({
-                'success': True,
-                'videoUrl': video_url
-            })
+                render_info = {
+                    'strategy': plan.strategy,
+                    'startTime': plan.start_time + time_offset,
+                    'endTime': plan.end_time + time_offset
+                }
+                render_cache.store(cache_key, output_path, render_info)
+            
+                # Return success response
+                return render_response(cache_key, render_info, cached=False)
+            
+            except RuntimeError as e:
+                logger.error("FFmpeg error: %s", str(e))
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 500
+            
+            except (FileNotFoundError, ValueError) as e:
+                logger.error("File processing error: %s", str(e))
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 500
+            
+            finally:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
             
-        except subprocess.CalledProcessError as e:
-            logger.error("FFmpeg error: %s", e.stderr)
+    except Overloaded as e:
+        return overloaded_response(e)
+        
+    except Exception as e:
+        logger.error("Unexpected error in edit_video_api: %s", str(e), exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred'
+        }), 500
+
+@app.route('/api/concat-video', methods=['POST'])
+@login_required
+def concat_video_api():
+    """Join ranges of one or more downloaded videos into a single highlight reel.
+    
+    Expected JSON payload:
+        {
+            "ranges": [
+                {"videoPath": "path/to/video.mp4", "startTime": 10.0, "endTime": 15.5},
+                ...
+            ]
+        }
+    
+    Returns:
+        JSON response with the reel URL and the strategy used.
+    
+    Raises:
+        400: If request data is invalid
+        404: If a video does not exist
+        429: If too many renders are in progress
+        500: If the reel could not be built
+    """
+    try:
+        data = cast(Dict[str, Any], request.get_json())
+        if not data or not isinstance(data.get('ranges'), list) or not data['ranges']:
             return jsonify({
                 'success': False,
-                'error': f'FFmpeg error: {e.stderr}'
-            }), 500
-            
-        except (FileNotFoundError, ValueError) as e:
-            logger.error("File processing error: %s", str(e))
+                'error': 'No ranges provided'
+            }), 400
+        if len(data['ranges']) > app.config['CONCAT_MAX_RANGES']:
             return jsonify({
                 'success': False,
-                'error': str(e)
-            }), 500
+                'error': f"A reel can join at most {app.config['CONCAT_MAX_RANGES']} ranges"
+            }), 400
+        
+        downloads_dir = os.path.join(app.root_path, 'downloads')
+        with span('validate'):
+            ranges = []
+            time_offsets: List[float] = []
+            try:
+                for position, entry in enumerate(data['ranges'], start=1):
+                    video_path = str(entry['videoPath']).strip()
+                    start_time = float(entry['startTime'])
+                    end_time = float(entry['endTime'])
+                    if not video_path:
+                        raise ValueError(f"Range {position}: video path cannot be empty")
+                    if start_time < 0 or end_time <= start_time:
+                        raise ValueError(f"Range {position}: end time must be greater than a non-negative start time")
+                    index = media_info_cache.get_for_user(current_user.id, video_path)
+                    time_offset = source_cache.time_offset(current_user.id, video_path)
+                    start_time -= time_offset
+                    end_time -= time_offset
+                    check_range(index, start_time, end_time, label=f'Range {position}', offset=time_offset)
+                    ranges.append(ReelRange(os.path.join(downloads_dir, video_path), index, start_time, end_time))
+                    time_offsets.append(time_offset)
+            except FileNotFoundError:
+                return jsonify({
+                    'success': False,
+                    'error': 'Input video file not found'
+                }), 404
+            except RuntimeError as e:
+                logger.error("Could not probe reel source: %s", str(e))
+                return jsonify({
+                    'success': False,
+                    'error': 'Input video could not be read'
+                }), 400
+            except (KeyError, ValueError, TypeError) as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid data: {str(e)}'
+                }), 400
+        
+        cache_key = render_cache.make_key(ranges[0].input_path, {
+            'reel': [[r.input_path, round(r.start_time, 3), round(r.end_time, 3)] for r in ranges]
+        }, [r.input_path for r in ranges[1:]])
+        # Renderizações já em cache não passam pela admissão nem pelo lock
+        cached = render_cache.lookup(cache_key)
+        if cached is not None:
+            return render_response(cache_key, cached, cached=True)
+        
+        # A admissão vem antes de esperar pela mesma renderização, e a espera é curta:
+        # requisições iguais recebem 429 em vez de prender workers web até a renderização terminar
+        with admission.render(current_user), admission.exclusive(f'render:{cache_key}'):
+            # Outra requisição ou processo pode ter terminado a mesma renderização durante a espera
+            cached = render_cache.lookup(cache_key)
+            if cached is not None:
+                return render_response(cache_key, cached, cached=True)
             
+            output_path = render_cache.temp_path(cache_key)
+            try:
+                strategy, plans = plan_reel(ranges, app.config['CUT_SNAP_TOLERANCE'])
+                with transcoder.slot(strategy != STRATEGY_COPY), span('concat'):
+                    write_reel(ranges, strategy, plans, output_path,
+                               transcoder.options(PROFILE_EXPORT, ranges[0].index.height))
+                if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+                    raise FileNotFoundError("FFmpeg failed to create the reel")
+            
+                render_info = {
+                    'strategy': strategy,
+                    'duration': round(sum(plan.duration for plan in plans), 3),
+                    'ranges': [
+                        {'startTime': plan.start_time + time_offset, 'endTime': plan.end_time + time_offset}
+                        for plan, time_offset in zip(plans, time_offsets)
+                    ]
+                }
+                render_cache.store(cache_key, output_path, render_info)
+                return render_response(cache_key, render_info, cached=False)
+        
+            except RuntimeError as e:
+                logger.error("FFmpeg error: %s", str(e))
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 500
+        
+            except (FileNotFoundError, ValueError) as e:
+                logger.error("File processing error: %s", str(e))
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 500
+        
+            finally:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+    
+    except Overloaded as e:
+        return overloaded_response(e)
+        
     except Exception as e:
-        logger.error("Unexpected error in edit_video_api: %s", str(e), exc_info=True)
+        logger.error("Unexpected error in concat_video_api: %s", str(e), exc_info=True)
         return jsonify({
             'success': False,
             'error': 'An unexpected error occurred'
         }), 500
 
+@app.route('/api/janitor/stats', methods=['GET'])
+@login_required
+def janitor_stats():
+    """Report the files and bytes reclaimed by the background janitor.
+    
+    Returns:
+        JSON response with the janitor counters, 403 for non-admin users.
+    """
+    if current_user.role != 'admin':
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 403
+        
+    return jsonify({
+        'success': True,
+        'janitor': janitor.stats()
+    })
+
+@app.route('/api/transcoder/stats', methods=['GET'])
+@login_required
+def transcoder_stats():
+    """Report encode slot usage of the transcoding scheduler.
+    
+    Returns:
+        JSON response with the scheduler statistics, 403 for non-admin users.
+    """
+    if current_user.role != 'admin':
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 403
+    return jsonify({
+        'success': True,
+        'transcoder': transcoder.stats()
+    })
+
+@app.route('/api/render-cache/stats', methods=['GET'])
+@login_required
+def render_cache_stats():
+    """Report render cache hit/miss counters and disk usage.
+    
+    Returns:
+        JSON response with the cache statistics, 403 for non-admin users.
+    """
+    if current_user.role != 'admin':
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 403
+        
+    return jsonify({
+        'success': True,
+        'cache': render_cache.stats()
+    })
+
 @app.route('/api/generate-clips', methods=['POST'])
 @login_required
 def generate_clips():
+    """Submit a clip generation job.
+
+    Clip times may be seconds, [HH:]MM:SS[.mmm] timecodes or frame numbers
+    such as '120f'. They are snapped to the frame grid by default, or as the
+    optional 'snap' field says: 'none', 'frame' or 'keyframe'.
+
+    Returns:
+        202 with the job ID and the URLs to poll for status and results.
+
+    Raises:
+        400: If request data is invalid
+        404: If the input video does not exist
+        429: If too many clips are queued, for the user or overall
+    """
     try:
         data = cast(Dict[str, Any], request.get_json())
         logger.debug("Received data: %s", data)
@@ -401,112 +1025,51 @@ def generate_clips():
         if not clips:
             raise ValueError("No clips data provided")
         
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        generated_clips: list[str] = []
+        cut_mode = str(data.get('cutMode', CUT_MODE_AUTO))
+        if cut_mode not in CUT_MODES:
+            raise ValueError(f"Invalid cut mode. Expected one of {CUT_MODES}")
         
-        # Usar o video_path específico em vez de procurar por qualquer arquivo MP4
-        input_video_path = os.path.join(base_dir, 'downloads', video_path)
-        if not os.path.exists(input_video_path):
-            raise FileNotFoundError(f"Input video not found: {input_video_path}")
-            
-        logger.debug("Input video path: %s", input_video_path)
+        snap = str(data.get('snap', app.config['CLIP_DEFAULT_SNAP']))
+        if snap not in SNAP_MODES:
+            raise ValueError(f"Invalid snap mode. Expected one of {SNAP_MODES}")
         
-        for clip in clips:
-            logger.debug("Processing clip: %s", clip)
-            
-            # Validate clip data
-            required_keys = ['name', 'startTime', 'endTime']
-            if not all(key in clip for key in required_keys):
-                raise ValueError(f"Missing required clip data. Required: {required_keys}. Received: {clip}")
-            
-            # Convert MM:SS to seconds for FFmpeg
-            try:
-                start_time_str = str(clip.get('startTime', ''))
-                end_time_str = str(clip.get('endTime', ''))
-                
-                if not start_time_str or not end_time_str:
-                    raise ValueError("Start time and end time cannot be empty")
-                
-                start_minutes, start_seconds = map(int, start_time_str.split(':'))
-                end_minutes, end_seconds = map(int, end_time_str.split(':'))
-                
-                start_time = start_minutes * 60 + start_seconds
-                end_time = end_minutes * 60 + end_seconds
-                
-                if start_time < 0:
-                    raise ValueError("Start time cannot be negative")
-                if end_time <= start_time:
-                    raise ValueError("End time must be greater than start time")
-                
-                logger.debug("Converted times - Start: %ss, End: %ss", start_time, end_time)
-            except ValueError as e:
-                logger.error("Error converting time format: %s", e)
-                raise ValueError(f"Invalid time format. Expected MM:SS, got start={clip.get('startTime')}, end={clip.get('endTime')}")
-            
-            # Create output directory if it doesn't exist
-            output_dir = os.path.join(base_dir, 'static', 'processed', str(current_user.id))
-            os.makedirs(output_dir, exist_ok=True)
-            logger.debug("Output directory: %s", output_dir)
-            
-            # Gerar nome único para o clip
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            safe_name = "".join(c for c in clip.get('name', '') if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            if not safe_name:
-                safe_name = "clip"
-                
-            # Incluir o nome do vídeo original no nome do clip
-            video_basename = os.path.splitext(os.path.basename(video_path))[0]
-            output_filename = f"{safe_name}_{timestamp}_{video_basename}_{start_time}-{end_time}.mp4"
-            
-            # Build FFmpeg command for trimming
-            command = [
-                'ffmpeg',
-                '-i', input_video_path,
-                '-ss', str(start_time),
-                '-t', str(end_time - start_time),  # Duration instead of end time
-                '-c', 'copy',  # Use copy codec for faster processing
-                '-y',  # Overwrite output file
-                os.path.join(output_dir, output_filename)
-            ]
-            
-            logger.debug("FFmpeg command: %s", ' '.join(command))
-            
+        with span('validate'):
+            # A taxa de quadros e os keyframes do ffprobe em cache normalizam os tempos
             try:
-                # Execute FFmpeg command
-                result = subprocess.run(
-                    command,
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                logger.debug("FFmpeg stdout: %s", result.stdout)
-                logger.debug("FFmpeg stderr: %s", result.stderr)
-                
-                if not os.path.exists(os.path.join(output_dir, output_filename)):
-                    raise FileNotFoundError(f"Output file was not created: {os.path.join(output_dir, output_filename)}")
-                
-                file_size = os.path.getsize(os.path.join(output_dir, output_filename))
-                if file_size == 0:
-                    raise ValueError(f"Generated clip is empty: {os.path.join(output_dir, output_filename)}")
-                    
-                logger.debug("Clip generated successfully: %s (size: %s bytes)", os.path.join(output_dir, output_filename), file_size)
-                # Generate URL for the clip
-                clip_url = url_for('serve_clip', user_id=current_user.id, filename=output_filename)
-                generated_clips.append(clip_url)
-                    
-            except subprocess.CalledProcessError as e:
-                error_msg = f"FFmpeg error: {e.stderr}"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
-        
-        if not generated_clips:
-            raise ValueError("No clips were generated")
-            
+                index = media_info_cache.get_for_user(current_user.id, video_path)
+            except RuntimeError as e:
+                logger.error("Could not probe %s: %s", video_path, str(e))
+                raise ValueError("Input video could not be read")
+        
+            # Tempos do vídeo original; downloads clip-first começam em time_offset
+            time_offset = source_cache.time_offset(current_user.id, video_path)
+        
+            # Validar todos os clips antes de enfileirar qualquer trabalho
+            validated_clips = validate_clips(clips, index, snap, time_offset)
+        
+            # Rejeitar faixas fora do vídeo antes de enfileirar
+            for name, start_time, end_time in validated_clips:
+                check_range(index, start_time, end_time, label=f'Clip "{name}"', offset=time_offset)
+        
+        admission.check_clips(current_user, len(validated_clips))
+        
+        job = ClipJob(user_id=current_user.id, video_path=video_path, cut_mode=cut_mode, time_offset=time_offset)
+        for position, (name, start_time, end_time) in enumerate(validated_clips):
+            job.items.append(ClipJobItem(position=position, name=name, start_time=start_time + time_offset,
+                                         end_time=end_time + time_offset))
+        db.session.add(job)
+        db.session.commit()
+        
+        clip_jobs.submit(job)
+        logger.debug("Queued clip job %s with %d clips", job.id, len(validated_clips))
+        
         return jsonify({
             'success': True,
-            'message': f'Generated {len(generated_clips)} clips successfully',
-            'clips': generated_clips
-        })
+            'jobId': job.id,
+            'statusUrl': url_for('clip_job_status', job_id=job.id),
+            'eventsUrl': url_for('clip_job_events', job_id=job.id),
+            'resultUrl': url_for('clip_job_result', job_id=job.id)
+        }), 202
         
     except ValueError as e:
         logger.error("Value error in clip generation: %s", str(e))
@@ -520,12 +1083,8 @@ def generate_clips():
             'success': False,
             'error': str(e)
         }), 404
-    except RuntimeError as e:
-        logger.error("Runtime error in clip generation: %s", str(e))
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error("Unexpected error in clip generation: %s", str(e), exc_info=True)
         return jsonify({
@@ -533,83 +1092,181 @@ def generate_clips():
             'error': 'An unexpected error occurred while generating clips'
         }), 500
 
+def get_user_job(job_id: str) -> Optional[ClipJob]:
+    """Return the clip job if it belongs to the current user."""
+    job: Optional[ClipJob] = db.session.get(ClipJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def clip_job_status(job_id: str):
+    """Report the progress of a clip job.
+    
+    Args:
+        job_id: The ID returned by /api/generate-clips.
+        
+    Returns:
+        JSON response with the job status and per-clip progress.
+    """
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+        
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(progress_hub.snapshot(job.id))
+    })
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def clip_job_events(job_id: str):
+    """Stream the progress of a clip job as Server-Sent Events.
+    
+    Running clips carry their fraction done, FFmpeg speed and fps, and an
+    ETA; an event is sent whenever a clip reports progress or changes status.
+    
+    Args:
+        job_id: The ID returned by /api/generate-clips.
+        
+    Returns:
+        A text/event-stream response that ends once the job finishes.
+    """
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+        
+    poll = app.config['JOB_EVENTS_POLL']
+    
+    def generate():
+        last_payload = None
+        while True:
+            # Versão lida antes do banco: nada publicado entre as duas leituras se perde
+            version = progress_hub.version(job_id)
+            current = db.session.get(ClipJob, job_id, populate_existing=True)
+            if current is None:
+                return
+            payload = json.dumps(current.to_dict(progress_hub.snapshot(job_id)))
+            if payload != last_payload:
+                yield f'data: {payload}\n\n'
+                last_payload = payload
+            if current.is_finished:
+                return
+            # Encerrar a transação para enxergar as atualizações dos workers
+            db.session.rollback()
+            # O banco é relido de tempos em tempos para mudanças feitas fora deste processo
+            progress_hub.wait(job_id, version, poll)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+@login_required
+def clip_job_result(job_id: str):
+    """Return the clips generated by a finished clip job.
+    
+    Args:
+        job_id: The ID returned by /api/generate-clips.
+        
+    Returns:
+        JSON response with the clip URLs, 202 while the job is still running.
+    """
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+        
+    if not job.is_finished:
+        return jsonify({
+            'success': False,
+            'status': job.status,
+            'error': 'Job is still running'
+        }), 202
+        
+    done_items = [item for item in job.items if item.status == ClipJob.DONE and item.output_filename]
+    generated_clips = [
+        url_for('serve_clip', user_id=job.user_id, filename=item.output_filename)
+        for item in done_items
+    ]
+    errors = [
+        {'name': item.name, 'error': item.error}
+        for item in job.items
+        if item.status == ClipJob.FAILED
+    ]
+    
+    if not generated_clips:
+        return jsonify({
+            'success': False,
+            'error': 'No clips were generated',
+            'errors': errors
+        }), 500
+        
+    return jsonify({
+        'success': True,
+        'message': f'Generated {len(generated_clips)} clips successfully',
+        'clips': generated_clips,
+        'strategies': [item.strategy for item in done_items],
+        'errors': errors
+    })
+
 @app.route('/api/download-clips', methods=['GET'])
 @login_required
 def download_clips():
     """Download all generated clips.
     
     Returns:
-        A file response with the zip file containing all clips or an error response.
-        
-    Raises:
-        FileNotFoundError: If clips directory or files are not found
-        IOError: If there are issues creating the zip file
+        A streamed zip response containing all clips or an error response.
     """
     try:
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        clips_dir = os.path.join(base_dir, 'static', 'processed', str(current_user.id))
-        
-        # Verify clips directory exists
-        if not os.path.exists(clips_dir):
-            logger.error("Clips directory not found: %s", clips_dir)
-            return jsonify({
-                'success': False,
-                'error': 'No clips directory found'
-            }), 404
-        
-        # Get list of clip files
-        clip_files = [f for f in os.listdir(clips_dir) if f.endswith('.mp4')]
-        if not clip_files:
-            logger.error("No clips found in directory: %s", clips_dir)
+        clips = catalog.clips_for(current_user.id)
+        if not clips:
+            logger.error("No clips found for user %s", current_user.id)
             return jsonify({
                 'success': False,
                 'error': 'No clips found to download'
             }), 404
         
-        # Create a BytesIO object to store the zip file
-        memory_file = io.BytesIO()
-        
-        # Create a zip file
-        try:
-            with zipfile.ZipFile(memory_file, 'w') as zf:
-                for filename in clip_files:
-                    file_path = os.path.join(clips_dir, filename)
-                    if os.path.exists(file_path):
-                        file_size = os.path.getsize(file_path)
-                        if file_size == 0:
-                            logger.warning("Empty clip file found: %s", file_path)
-                            continue
-                            
-                        logger.debug("Adding file to zip: %s (size: %s bytes)", filename, file_size)
-                        zf.write(file_path, filename)
-                    else:
-                        logger.warning("Clip file not found: %s", file_path)
-                        
-            # Check if any files were added to the zip
-            if memory_file.tell() == 0:
-                logger.error("No valid clips were added to the zip file")
-                return jsonify({
-                    'success': False,
-                    'error': 'No valid clips to download'
-                }), 404
-                
-            # Seek to the beginning of the BytesIO object
-            memory_file.seek(0)
-            
-            logger.debug("Zip file created successfully with %d clips", len(clip_files))
-            return send_file(
-                memory_file,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name='video_clips.zip'
-            )
+        # Montar o ZIP sem compressão direto do disco, sem carregar os clips em memória
+        zip_files = []
+        for clip in clips:
+            file_path = catalog.clip_path(clip)
+            if clip.size == 0:
+                logger.warning("Empty clip file found: %s", file_path)
+                continue
+            if not os.path.exists(file_path):
+                logger.warning("Clip file not found: %s", file_path)
+                continue
+            zip_files.append((file_path, clip.filename))
             
-        except (IOError, zipfile.BadZipFile) as e:
-            logger.error("Error creating zip file: %s", str(e))
+        if not zip_files:
+            logger.error("No valid clips were added to the zip file")
             return jsonify({
                 'success': False,
-                'error': 'Error creating zip file'
-            }), 500
+                'error': 'No valid clips to download'
+            }), 404
+            
+        archive = StreamingZip(zip_files, chunk_size=app.config['ZIP_CHUNK_SIZE'])
+        logger.debug("Streaming zip file with %d clips", len(zip_files))
+        return Response(
+            timed_iter('zip', archive.iter_chunks()),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': 'attachment; filename=video_clips.zip',
+                'Content-Length': str(archive.content_length())
+            },
+            direct_passthrough=True
+        )
             
     except Exception as e:
         logger.error("Unexpected error in download_clips: %s", str(e), exc_info=True)
@@ -630,21 +1287,10 @@ def serve_video(filename: str):
         The video file response or an error message.
     """
     try:
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        file_path = os.path.join(base_dir, 'downloads', filename)
-        
-        logger.debug("Request to serve video: %s", filename)
-        logger.debug("Base directory: %s", base_dir)
-        logger.debug("Full video path: %s", file_path)
-        
-        if not os.path.exists(file_path):
-            logger.error("File not found: %s", file_path)
-            return "File not found", 404
-            
-        logger.debug("File exists: %s", file_path)
-        logger.debug("File size: %s bytes", os.path.getsize(file_path))
-        
-        return send_from_directory(os.path.dirname(file_path), os.path.basename(file_path))
+        return send_media(os.path.join(app.root_path, 'downloads'), filename)
+    except FileNotFoundError as e:
+        logger.error("File not found: %s", str(e))
+        return "File not found", 404
     except Exception as e:
         error_msg = str(e)
         logger.error("Error serving video: %s", error_msg)
@@ -655,6 +1301,9 @@ def serve_video(filename: str):
 def serve_clip(user_id: int, filename: str):
     """Serve a processed clip.
     
+    Clip names carry their creation timestamp, so they are served as
+    immutable.
+    
     Args:
         user_id: The ID of the user requesting the clip.
         filename: The name of the clip file to serve.
@@ -666,21 +1315,57 @@ def serve_clip(user_id: int, filename: str):
         return "Unauthorized", 403
         
     try:
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        clips_dir = os.path.join(base_dir, 'static', 'processed', str(user_id))
-        
-        if not os.path.exists(clips_dir):
-            raise FileNotFoundError(f"Clips directory not found: {clips_dir}")
-            
-        file_path = os.path.join(clips_dir, filename)
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Clip file not found: {file_path}")
-            
-        return send_from_directory(clips_dir, filename)
+        clips_dir = os.path.join(app.root_path, 'static', 'processed', str(user_id))
+        return send_media(clips_dir, filename, immutable=True)
+    except FileNotFoundError as e:
+        logger.error("Error serving clip: %s", str(e))
+        return "File not found", 404
     except Exception as e:
         error_msg = str(e)
         logger.error("Error serving clip: %s", error_msg)
         return error_msg, 500
 
+@app.route('/renders/<path:filename>')
+@login_required
+def serve_render(filename: str):
+    """Serve a cached render.
+    
+    Renders are addressed by content key, so they are served as immutable.
+    
+    Args:
+        filename: The name of the render file to serve.
+        
+    Returns:
+        The render file response or an error message.
+    """
+    try:
+        assert render_cache.cache_dir is not None
+        return send_media(render_cache.cache_dir, filename, immutable=True)
+    except FileNotFoundError as e:
+        logger.error("Error serving render: %s", str(e))
+        return "File not found", 404
+
+@app.route('/previews/<int:source_id>/<path:filename>')
+@login_required
+def serve_preview(source_id: int, filename: str):
+    """Serve a preview rendition of a cached source.
+    
+    Args:
+        source_id: The ID of the cached source.
+        filename: The rendition file, relative to the source's asset directory.
+        
+    Returns:
+        The preview file response or an error message.
+    """
+    entry = SourceVideo.query.filter_by(user_id=current_user.id, source_id=source_id).first()
+    if entry is None:
+        return "Unauthorized", 403
+        
+    try:
+        return send_media(source_cache.asset_dir(entry.source), filename)
+    except FileNotFoundError as e:
+        logger.error("Error serving preview: %s", str(e))
+        return "File not found", 404
+
 if __name__ == '__main__':
     app.run(debug=os.environ.get('FLASK_DEBUG', '0') == '1') 
\ No newline at end of file
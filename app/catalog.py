@@ -0,0 +1,127 @@
+# Standard library imports
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from models import db, Clip, SourceVideo
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Index of the files kept per user: downloaded videos and produced clips.
+
+    Every clip written under static/processed/<user_id>/ is recorded as a
+    Clip row and every download under downloads/<user_id>/ as a SourceVideo
+    row, so listing, bundling and expiring files are indexed queries instead
+    of directory scans and filename parsing.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize catalog."""
+        self.processed_dir: Optional[str] = None
+        self.downloads_dir: Optional[str] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the catalog to an application."""
+        self.processed_dir = os.path.join(app.root_path, 'static', 'processed')
+        self.downloads_dir = os.path.join(app.root_path, 'downloads')
+        app.extensions['catalog'] = self
+
+    def clip_path(self, clip: Clip) -> str:
+        """Absolute path of a clip file."""
+        assert self.processed_dir is not None
+        return os.path.join(self.processed_dir, clip.path)
+
+    def video_path(self, entry: SourceVideo) -> str:
+        """Absolute path of a user's downloaded video."""
+        assert self.downloads_dir is not None
+        return os.path.join(self.downloads_dir, entry.video_path)
+
+    def add_clip(self, user_id: int, video_path: str, name: str, start_time: float, end_time: float,
+                 filename: str) -> Clip:
+        """Record a clip written to static/processed/<user_id>/filename.
+
+        The row is added to the session; the caller commits it. A clip that
+        overwrote an earlier file of the same name replaces its row.
+        """
+        assert self.processed_dir is not None
+        path = f'{user_id}/{filename}'
+        size = os.path.getsize(os.path.join(self.processed_dir, path))
+        clip: Optional[Clip] = Clip.query.filter_by(path=path).first()
+        if clip is None:
+            clip = Clip(
+                user_id=user_id, video_path=video_path, name=name, start_time=start_time,
+                end_time=end_time, path=path, size=size
+            )
+            db.session.add(clip)
+        else:
+            clip.video_path = video_path
+            clip.name = name
+            clip.start_time = start_time
+            clip.end_time = end_time
+            clip.size = size
+            clip.created_at = datetime.utcnow()
+        return clip
+
+    def clips_for(self, user_id: int, video_path: Optional[str] = None) -> List[Clip]:
+        """A user's clips, oldest first, optionally only those cut from one video."""
+        query = Clip.query.filter_by(user_id=user_id)
+        if video_path is not None:
+            query = query.filter_by(video_path=video_path)
+        return query.order_by(Clip.created_at).all()
+
+    def remove_clips(self, clips: List[Clip]) -> int:
+        """Delete clips from disk and from the catalog.
+
+        Returns:
+            The number of bytes reclaimed.
+        """
+        reclaimed = 0
+        for clip in clips:
+            path = self.clip_path(clip)
+            try:
+                os.remove(path)
+                reclaimed += clip.size
+                logger.debug("Removed clip: %s", path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not remove clip %s: %s", path, e)
+                continue
+            db.session.delete(clip)
+        db.session.commit()
+        return reclaimed
+
+    def remove_videos(self, entries: List[SourceVideo]) -> int:
+        """Delete users' downloaded videos from disk and from the catalog.
+
+        Only the user's link is removed; the shared copy is left to
+        SourceCache.evict() once no user references it.
+
+        Returns:
+            The number of links removed.
+        """
+        removed = 0
+        for entry in entries:
+            path = self.video_path(entry)
+            try:
+                if os.path.lexists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning("Could not remove video %s: %s", path, e)
+                continue
+            db.session.delete(entry)
+            removed += 1
+        db.session.commit()
+        return removed
+
+
+catalog = Catalog()
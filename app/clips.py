@@ -0,0 +1,258 @@
+# Standard library imports
+import logging
+import math
+import os
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Local imports
+from cutting import SEEK_EPSILON, SourceIndex, run_ffmpeg
+from metrics import SampledLogger
+
+logger = logging.getLogger(__name__)
+hot_logger = SampledLogger(logger)
+
+REQUIRED_CLIP_KEYS = ['name', 'startTime', 'endTime']
+
+SNAP_NONE = 'none'
+SNAP_FRAME = 'frame'
+SNAP_KEYFRAME = 'keyframe'
+SNAP_MODES = (SNAP_NONE, SNAP_FRAME, SNAP_KEYFRAME)
+
+
+def parse_clip_time(value: Any, frame_rate: Optional[float] = None) -> float:
+    """Convert a timecode to seconds.
+
+    Accepted forms are raw seconds (a number or a string such as '12.5'),
+    MM:SS and HH:MM:SS with optional fractional seconds ('01:02:03.250'),
+    and frame numbers with an 'f' suffix ('1500f').
+
+    Args:
+        value: The time as sent by the client.
+        frame_rate: Frames per second of the source, required for frame numbers.
+
+    Returns:
+        The time in seconds.
+
+    Raises:
+        ValueError: If the value is empty, malformed or negative, or is a frame
+            number and the frame rate is unknown.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid time: {value!r}")
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        time_str = str(value or '').strip()
+        if not time_str:
+            raise ValueError("Start time and end time cannot be empty")
+        if time_str.lower().endswith('f'):
+            if not frame_rate:
+                raise ValueError(f"Frame number {time_str} needs the frame rate of the source, which is unknown")
+            seconds = int(time_str[:-1]) / frame_rate
+        else:
+            parts = time_str.split(':')
+            if len(parts) > 3 or not all(part.replace('.', '', 1).isdigit() for part in parts):
+                raise ValueError(f"Invalid time: {time_str}")
+            # Só o último campo aceita fração: HH:MM:SS.mmm
+            if any('.' in part for part in parts[:-1]):
+                raise ValueError(f"Invalid time: {time_str}")
+            seconds = 0.0
+            for part in parts:
+                seconds = seconds * 60 + float(part)
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError("Times cannot be negative")
+    return seconds
+
+
+def format_clip_time(seconds: float) -> str:
+    """Format seconds as an MM:SS.mmm (or HH:MM:SS.mmm) timecode parse_clip_time() accepts."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    fraction = f'.{millis:03d}' if millis else ''
+    if hours:
+        return f'{hours:02d}:{minutes:02d}:{secs:02d}{fraction}'
+    return f'{minutes:02d}:{secs:02d}{fraction}'
+
+
+def snap_clip_time(seconds: float, snap: str, index: Optional[SourceIndex] = None) -> float:
+    """Snap a time to the frame grid or to the nearest keyframe of the source.
+
+    Whatever the mode, the result is normalized to the microsecond, so the
+    same cut typed in different notations yields the same times and hits
+    the same cached renders.
+
+    Args:
+        seconds: The parsed time.
+        snap: SNAP_NONE, SNAP_FRAME or SNAP_KEYFRAME.
+        index: The source index, for its frame rate and keyframes.
+
+    Returns:
+        The snapped time; unchanged when the source lacks the needed data.
+    """
+    if snap == SNAP_FRAME and index is not None and index.frame_rate:
+        seconds = round(seconds * index.frame_rate) / index.frame_rate
+    elif snap == SNAP_KEYFRAME and index is not None and index.keyframes:
+        position = bisect_left(index.keyframes, seconds)
+        neighbours = index.keyframes[max(0, position - 1):position + 1]
+        seconds = float(min(neighbours, key=lambda keyframe: abs(keyframe - seconds)))
+    return round(seconds, 6)
+
+
+def validate_clips(clips: List[Dict[str, Any]], index: Optional[SourceIndex] = None,
+                   snap: str = SNAP_NONE, offset: float = 0.0) -> List[Tuple[str, float, float]]:
+    """Validate clip definitions before any work is queued.
+
+    Args:
+        clips: The clips list from the /api/generate-clips payload.
+        index: The source index, to read frame numbers and snap times.
+        snap: How to snap start and end times, one of SNAP_MODES.
+        offset: Second of the original video at which the file starts, for
+            clip-first downloads; clip times are given in the original video.
+
+    Returns:
+        A list of (name, start_seconds, end_seconds) tuples, in seconds of the file.
+
+    Raises:
+        ValueError: If a clip is missing data or has an invalid time range.
+    """
+    if snap not in SNAP_MODES:
+        raise ValueError(f"Invalid snap mode. Expected one of {SNAP_MODES}")
+    frame_rate = index.frame_rate if index is not None else None
+
+    validated: List[Tuple[str, float, float]] = []
+    for clip in clips:
+        if not all(key in clip for key in REQUIRED_CLIP_KEYS):
+            raise ValueError(f"Missing required clip data. Required: {REQUIRED_CLIP_KEYS}. Received: {clip}")
+
+        try:
+            start_time = parse_clip_time(clip.get('startTime'), frame_rate)
+            end_time = parse_clip_time(clip.get('endTime'), frame_rate)
+        except ValueError as e:
+            raise ValueError(f"Invalid time for start={clip.get('startTime')}, end={clip.get('endTime')}: {str(e)}. "
+                             f"Expected seconds, [HH:]MM:SS[.mmm] or a frame number such as 120f")
+
+        if end_time <= start_time:
+            raise ValueError("End time must be greater than start time")
+        if start_time < offset:
+            raise ValueError(f"Clip starts at {format_clip_time(start_time)}, before the downloaded section, "
+                             f"which starts at {format_clip_time(offset)}")
+        start_time = snap_clip_time(start_time - offset, snap, index)
+        end_time = snap_clip_time(end_time - offset, snap, index)
+
+        validated.append((str(clip.get('name', '')), start_time, end_time))
+    return validated
+
+
+def build_clip_filename(name: str, video_path: str, start_time: float, end_time: float) -> str:
+    """Build a unique output filename for a clip.
+
+    Args:
+        name: The clip name chosen by the user.
+        video_path: The source video path relative to downloads/.
+        start_time: Clip start in seconds.
+        end_time: Clip end in seconds.
+
+    Returns:
+        The output filename.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    if not safe_name:
+        safe_name = "clip"
+
+    # Incluir o nome do vídeo original no nome do clip
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    return f"{safe_name}_{timestamp}_{video_basename}_{start_time:g}-{end_time:g}.mp4"
+
+
+def plan_clip_batches(ranges: List[Tuple[int, float, float]], max_outputs: int,
+                      max_gap: float) -> List[List[int]]:
+    """Group clip ranges into batches that can share a single read of the input.
+
+    Every output of a multi-output FFmpeg run sees every input packet, so
+    overlapping ranges can share a batch. Ranges are sorted by start time and
+    a new batch starts when a batch is full or when the next range starts
+    more than max_gap seconds after the batch ends, since seeking past the
+    gap in a separate run is cheaper than demuxing through it.
+
+    Args:
+        ranges: (key, start_seconds, end_seconds) tuples.
+        max_outputs: Maximum number of outputs per FFmpeg process.
+        max_gap: Maximum gap in seconds read through inside a batch.
+
+    Returns:
+        Lists of keys, one per FFmpeg run.
+    """
+    batches: List[List[int]] = []
+    batch_end = 0.0
+    for key, start_time, end_time in sorted(ranges, key=lambda r: (r[1], r[2])):
+        if not batches or len(batches[-1]) >= max(1, max_outputs) or start_time - batch_end > max_gap:
+            batches.append([])
+            batch_end = end_time
+        batches[-1].append(key)
+        batch_end = max(batch_end, end_time)
+    return batches
+
+
+def cut_clips(input_path: str, outputs: List[Tuple[str, float, float]]) -> List[int]:
+    """Stream-copy one or more keyframe-aligned clips in a single FFmpeg run.
+
+    The input is seeked to the earliest start and each output gets its own
+    -ss/-t relative to it, so the source is opened once and only the span
+    covered by the batch is demuxed. Start times must be keyframes.
+
+    Args:
+        input_path: Absolute path of the source video.
+        outputs: (output_path, start_seconds, end_seconds) tuples.
+
+    Returns:
+        The size in bytes of each generated clip, in the order of outputs.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+        FileNotFoundError: If FFmpeg did not create an output file.
+        ValueError: If an output file is empty.
+    """
+    base_time = min(start_time for _, start_time, _ in outputs)
+    command = ['ffmpeg', '-y', '-ss', str(base_time), '-i', input_path]
+    for output_path, start_time, end_time in outputs:
+        offset = start_time - base_time
+        if offset > SEEK_EPSILON:
+            command.extend(['-ss', str(offset - SEEK_EPSILON)])
+        command.extend([
+            '-t', str(end_time - start_time),  # Duration instead of end time
+            '-c', 'copy',  # Use copy codec for faster processing
+            '-avoid_negative_ts', 'make_zero',
+            output_path
+        ])
+
+    run_ffmpeg(command)
+    return [verify_clip(output_path) for output_path, _, _ in outputs]
+
+
+def verify_clip(output_path: str) -> int:
+    """Check that FFmpeg produced a non-empty clip.
+
+    Args:
+        output_path: Absolute path of the generated clip.
+
+    Returns:
+        The size of the clip in bytes.
+
+    Raises:
+        FileNotFoundError: If the output file does not exist.
+        ValueError: If the output file is empty.
+    """
+    if not os.path.exists(output_path):
+        raise FileNotFoundError(f"Output file was not created: {output_path}")
+
+    file_size = os.path.getsize(output_path)
+    if file_size == 0:
+        raise ValueError(f"Generated clip is empty: {output_path}")
+
+    hot_logger.debug("Clip generated successfully: %s (size: %s bytes)", output_path, file_size)
+    return file_size
@@ -0,0 +1,147 @@
+# Standard library imports
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+# Local imports
+from cutting import STRATEGY_COPY, STRATEGY_ENCODE, CutPlan, SourceIndex, plan_cut, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Output audio format of re-encoded reels
+REEL_SAMPLE_RATE = 48000
+
+
+@dataclass
+class ReelRange:
+    """One range of a highlight reel."""
+
+    input_path: str
+    index: SourceIndex
+    start_time: float
+    end_time: float
+
+
+def stream_signature(index: SourceIndex) -> Tuple[object, ...]:
+    """Stream parameters that must match for sources to be concatenated without re-encoding."""
+    return (
+        index.video_codec, index.pix_fmt, index.width, index.height,
+        round(index.frame_rate or 0.0, 3), index.audio_codec
+    )
+
+
+def plan_reel(ranges: List[ReelRange], snap_tolerance: float = 0.5) -> Tuple[str, List[CutPlan]]:
+    """Choose how to join ranges into one output.
+
+    The concat demuxer can stream-copy the reel when every source shares
+    codecs and format and every range starts within snap_tolerance of a
+    keyframe; otherwise the whole reel is re-encoded in one filtergraph.
+
+    Args:
+        ranges: The ranges, in output order.
+        snap_tolerance: Maximum start shift accepted for a copy.
+
+    Returns:
+        STRATEGY_COPY or STRATEGY_ENCODE, and the plan of each range.
+    """
+    signatures = {stream_signature(r.index) for r in ranges}
+    plans = [plan_cut(r.index, r.start_time, r.end_time, snap_tolerance=snap_tolerance) for r in ranges]
+    if len(signatures) == 1 and all(plan.strategy == STRATEGY_COPY for plan in plans):
+        return STRATEGY_COPY, plans
+    return STRATEGY_ENCODE, [CutPlan(STRATEGY_ENCODE, r.start_time, r.end_time) for r in ranges]
+
+
+def _quote_concat_path(path: str) -> str:
+    """Quote a path for a concat demuxer script."""
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+def concat_copy(ranges: List[ReelRange], plans: List[CutPlan], output_path: str) -> None:
+    """Stream-copy keyframe-aligned ranges into one output through the concat demuxer.
+
+    Each range is an inpoint/outpoint entry of the concat script, so no
+    intermediate files are written.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    script_path = f'{output_path}.concat.txt'
+    with open(script_path, 'w') as f:
+        f.write('ffconcat version 1.0\n')
+        for reel_range, plan in zip(ranges, plans):
+            f.write(f'file {_quote_concat_path(reel_range.input_path)}\n')
+            f.write(f'inpoint {plan.start_time:.6f}\n')
+            f.write(f'outpoint {plan.end_time:.6f}\n')
+    try:
+        run_ffmpeg([
+            'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', script_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart', output_path
+        ])
+    finally:
+        os.remove(script_path)
+
+
+def concat_encode(ranges: List[ReelRange], output_path: str,
+                  encoder_options: Optional[List[str]] = None) -> None:
+    """Re-encode ranges into one output with a single concat filtergraph.
+
+    Every range is scaled and padded to the size and frame rate of the first
+    one. Audio is kept only when every source has an audio stream.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    first = ranges[0].index
+    width = first.width or 1280
+    height = first.height or 720
+    frame_rate = first.frame_rate or 30.0
+    with_audio = all(r.index.audio_codec is not None for r in ranges)
+
+    command = ['ffmpeg', '-y']
+    for reel_range in ranges:
+        command.extend([
+            '-ss', str(reel_range.start_time), '-t', str(reel_range.end_time - reel_range.start_time),
+            '-i', reel_range.input_path
+        ])
+
+    filters = []
+    labels = ''
+    for i in range(len(ranges)):
+        filters.append(
+            f'[{i}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,'
+            f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate:g},format=yuv420p[v{i}]'
+        )
+        labels += f'[v{i}]'
+        if with_audio:
+            filters.append(f'[{i}:a:0]aresample={REEL_SAMPLE_RATE},aformat=channel_layouts=stereo[a{i}]')
+            labels += f'[a{i}]'
+    filters.append(f"{labels}concat=n={len(ranges)}:v=1:a={1 if with_audio else 0}[v]{'[a]' if with_audio else ''}")
+
+    command.extend(['-filter_complex', ';'.join(filters), '-map', '[v]'])
+    if with_audio:
+        command.extend(['-map', '[a]', '-c:a', 'aac'])
+    command.extend(['-c:v', 'libx264', *(encoder_options or []), '-movflags', '+faststart', output_path])
+    run_ffmpeg(command)
+
+
+def write_reel(ranges: List[ReelRange], strategy: str, plans: List[CutPlan], output_path: str,
+               encoder_options: Optional[List[str]] = None) -> None:
+    """Join ranges of one or more sources into a single output.
+
+    Args:
+        ranges: The ranges, in output order.
+        strategy: The strategy chosen by plan_reel().
+        plans: The plans returned by plan_reel().
+        output_path: Absolute path of the output.
+        encoder_options: Extra video encoder options of a re-encoded reel.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    if strategy == STRATEGY_COPY:
+        concat_copy(ranges, plans, output_path)
+    else:
+        concat_encode(ranges, output_path, encoder_options)
+    logger.debug("Built %s reel of %d ranges: %s", strategy, len(ranges), output_path)
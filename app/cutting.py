@@ -0,0 +1,653 @@
+# Standard library imports
+import io
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, replace
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, cast
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from metrics import FFMPEG_KILLED, SampledLogger, span, tracked_process
+
+logger = logging.getLogger(__name__)
+hot_logger = SampledLogger(logger)
+
+STRATEGY_COPY = 'copy'
+STRATEGY_SMART = 'smart'
+STRATEGY_ENCODE = 'encode'
+
+CUT_MODE_AUTO = 'auto'
+CUT_MODES = (CUT_MODE_AUTO, STRATEGY_COPY, STRATEGY_SMART)
+
+# Encoders able to produce a head segment compatible with the copied middle
+SMART_CUT_VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+SMART_CUT_AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame'}
+
+# Keeps seek targets on the intended keyframe despite pts_time rounding
+SEEK_EPSILON = 0.0005
+
+# MP4 written front to back for pipes: moov first, one fragment per keyframe
+FRAGMENTED_MP4_FLAGS = 'frag_keyframe+empty_moov+default_base_moof'
+
+
+@dataclass
+class SourceIndex:
+    """Keyframe positions, codecs and format details of a source video."""
+
+    keyframes: List[float] = field(default_factory=list)
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    pix_fmt: Optional[str] = None
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    frame_rate: Optional[float] = None
+    bit_rate: Optional[int] = None
+
+    @property
+    def keyframe_interval(self) -> Optional[float]:
+        """Average distance between keyframes in seconds."""
+        if len(self.keyframes) < 2:
+            return None
+        return (self.keyframes[-1] - self.keyframes[0]) / (len(self.keyframes) - 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the index for persistence."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SourceIndex':
+        """Rebuild an index serialized by to_dict(), ignoring unknown keys."""
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+    def keyframe_at_or_before(self, time: float) -> Optional[float]:
+        """Return the last keyframe at or before time."""
+        index = bisect_right(self.keyframes, time + SEEK_EPSILON)
+        return self.keyframes[index - 1] if index else None
+
+    def keyframe_after(self, time: float) -> Optional[float]:
+        """Return the first keyframe strictly after time."""
+        index = bisect_right(self.keyframes, time + SEEK_EPSILON)
+        return self.keyframes[index] if index < len(self.keyframes) else None
+
+
+@dataclass
+class CutPlan:
+    """How a single range is cut from a source."""
+
+    strategy: str
+    start_time: float
+    end_time: float
+    keyframe: Optional[float] = None  # First copied keyframe of a smart cut
+
+    @property
+    def duration(self) -> float:
+        """Duration of the output in seconds."""
+        return self.end_time - self.start_time
+
+
+@dataclass(frozen=True)
+class FFmpegProgress:
+    """One block of FFmpeg's -progress output."""
+
+    out_time: float  # Seconds of output written
+    speed: Optional[float] = None  # Multiple of real time
+    fps: Optional[float] = None
+    frame: Optional[int] = None
+    finished: bool = False
+
+    @classmethod
+    def from_fields(cls, fields: Dict[str, str], finished: bool = False) -> 'FFmpegProgress':
+        """Build from the key=value pairs of a block; N/A values become None."""
+        def number(key: str) -> Optional[float]:
+            try:
+                return float(fields.get(key, '').rstrip('x'))
+            except ValueError:
+                return None
+
+        # out_time_ms também está em microssegundos
+        out_time_us = number('out_time_us')
+        if out_time_us is None:
+            out_time_us = number('out_time_ms')
+        frame = number('frame')
+        return cls(
+            out_time=max(0.0, (out_time_us or 0.0) / 1_000_000),
+            speed=number('speed'),
+            fps=number('fps'),
+            frame=int(frame) if frame is not None else None,
+            finished=finished
+        )
+
+
+ProgressListener = Callable[[FFmpegProgress], None]
+
+_progress_listener: ContextVar[Optional[ProgressListener]] = ContextVar('ffmpeg_progress_listener', default=None)
+
+
+@contextmanager
+def ffmpeg_progress(listener: Optional[ProgressListener], offset: float = 0.0) -> Iterator[None]:
+    """Send the progress of every FFmpeg run in this context to listener.
+
+    Args:
+        listener: Called with each progress block; None keeps the enclosing listener.
+        offset: Seconds added to out_time, for runs that write a later part of
+            a larger output.
+    """
+    target = listener or _progress_listener.get()
+    if target is not None and offset:
+        inner = target
+
+        def target(progress: FFmpegProgress) -> None:
+            inner(replace(progress, out_time=progress.out_time + offset))
+
+    token = _progress_listener.set(target)
+    try:
+        yield
+    finally:
+        _progress_listener.reset(token)
+
+
+def _read_progress(stream: IO[bytes]) -> Iterator[FFmpegProgress]:
+    """Parse -progress output incrementally, one block per progress= line."""
+    fields: Dict[str, str] = {}
+    for raw in stream:
+        key, _, value = raw.decode('utf-8', 'replace').strip().partition('=')
+        if key != 'progress':
+            fields[key] = value
+            continue
+        yield FFmpegProgress.from_fields(fields, finished=value == 'end')
+        fields = {}
+
+
+class _Watch:
+    """A running process and the limits it is held to."""
+
+    def __init__(self, process: 'subprocess.Popen[bytes]', timeout: Optional[float],
+                 stall_timeout: Optional[float]) -> None:
+        """Initialize watch."""
+        self.process = process
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.reason: Optional[str] = None
+
+    def touch(self) -> None:
+        """Record that the process reported progress."""
+        self.last_progress = time.monotonic()
+
+    def violation(self, now: float) -> Optional[str]:
+        """Why the process must be killed, if it must."""
+        if self.timeout and now - self.started > self.timeout:
+            return 'deadline'
+        if self.stall_timeout and now - self.last_progress > self.stall_timeout:
+            return 'stall'
+        return None
+
+
+class FFmpegWatchdog:
+    """Kills FFmpeg runs that exceed their deadline or stop reporting progress.
+
+    One monitor thread checks every watched process, so a stuck run fails
+    its job instead of holding a worker and a transcode slot forever.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize watchdog."""
+        self.timeout: Optional[float] = None
+        self.stall_timeout: Optional[float] = None
+        self.interval = 1.0
+        self._watches: Set[_Watch] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Read FFMPEG_TIMEOUT and FFMPEG_STALL_TIMEOUT; 0 disables a limit."""
+        self.timeout = float(app.config.get('FFMPEG_TIMEOUT', 0)) or None
+        self.stall_timeout = float(app.config.get('FFMPEG_STALL_TIMEOUT', 0)) or None
+        app.extensions['ffmpeg_watchdog'] = self
+
+    @contextmanager
+    def watch(self, process: 'subprocess.Popen[bytes]') -> Iterator[_Watch]:
+        """Hold a process to the limits while the context is open."""
+        watch = _Watch(process, self.timeout, self.stall_timeout)
+        with self._lock:
+            self._watches.add(watch)
+            if self._thread is None and (self.timeout or self.stall_timeout):
+                self._thread = threading.Thread(target=self._monitor, name='ffmpeg-watchdog', daemon=True)
+                self._thread.start()
+        try:
+            yield watch
+        finally:
+            with self._lock:
+                self._watches.discard(watch)
+
+    def _monitor(self) -> None:
+        """Kill watched processes past their limits."""
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                watches = list(self._watches)
+            for watch in watches:
+                reason = watch.violation(now)
+                if reason is None or watch.reason is not None:
+                    continue
+                watch.reason = reason
+                logger.warning("Killing FFmpeg process %s after %.0fs: %s",
+                               watch.process.pid, now - watch.started, reason)
+                FFMPEG_KILLED.inc(reason=reason)
+                watch.process.kill()
+
+
+ffmpeg_watchdog = FFmpegWatchdog()
+
+
+def run_ffmpeg(command: List[str]) -> None:
+    """Run an FFmpeg/FFprobe command.
+
+    FFmpeg runs report -progress on a pipe: each block goes to the listener
+    set with ffmpeg_progress() and resets the watchdog's stall timer.
+
+    Args:
+        command: The full command line.
+
+    Raises:
+        RuntimeError: If the command fails or the watchdog kills it.
+    """
+    is_ffmpeg = os.path.basename(command[0]) == 'ffmpeg'
+    if is_ffmpeg and not {'-v', '-loglevel'} & set(command):
+        # Sem banner nem estatísticas: o stderr guarda só os erros, lidos apenas em caso de falha
+        command = [command[0], '-hide_banner', '-nostats', '-loglevel', 'error', *command[1:]]
+    if is_ffmpeg and '-progress' not in command:
+        command = [command[0], '-progress', 'pipe:1', *command[1:]]
+    hot_logger.debug("FFmpeg command: %s", ' '.join(command))
+
+    listener = _progress_listener.get()
+    # O stderr vai para um arquivo temporário para não bloquear o processo enquanto lemos o stdout
+    with tracked_process(os.path.basename(command[0])), tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE if is_ffmpeg else subprocess.DEVNULL,
+            stderr=stderr
+        )
+        with ffmpeg_watchdog.watch(process) as watch:
+            try:
+                if process.stdout is not None:
+                    for progress in _read_progress(process.stdout):
+                        watch.touch()
+                        if listener is not None:
+                            listener(progress)
+                returncode = process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                if process.stdout is not None:
+                    process.stdout.close()
+
+        _raise_for_exit(watch, returncode, stderr)
+
+
+def _raise_for_exit(watch: _Watch, returncode: int, stderr: IO[bytes]) -> None:
+    """Turn a killed or failed run into a RuntimeError carrying FFmpeg's stderr."""
+    if watch.reason == 'deadline':
+        raise RuntimeError(f"FFmpeg error: killed after exceeding the {watch.timeout:.0f}s deadline")
+    if watch.reason == 'stall':
+        raise RuntimeError(f"FFmpeg error: killed after {watch.stall_timeout:.0f}s without progress")
+    if returncode != 0:
+        stderr.seek(0)
+        message = stderr.read().decode('utf-8', 'replace').strip()
+        if not message:
+            # Sem stderr, como quando o FFmpeg morre por um sinal, o código de saída é a única pista
+            message = f"exited with code {returncode}"
+            if returncode < 0:
+                try:
+                    message = f"killed by {signal.Signals(-returncode).name}"
+                except ValueError:
+                    message = f"killed by signal {-returncode}"
+        raise RuntimeError(f"FFmpeg error: {message}")
+
+
+def stream_ffmpeg(command: List[str], chunk_size: int = 256 * 1024, whole_chunks: bool = False) -> Iterator[bytes]:
+    """Run an FFmpeg command that writes to stdout and yield its output as it is produced.
+
+    Reading the output resets the watchdog's stall timer, so a client that
+    stops reading for FFMPEG_STALL_TIMEOUT seconds gets the run killed.
+    Closing the generator early, as a server does when the client goes
+    away, kills FFmpeg.
+
+    Args:
+        command: The full command line, writing to pipe:1.
+        chunk_size: Most bytes per chunk.
+        whole_chunks: Wait for chunk_size bytes before yielding, for readers
+            that process the output in bulk rather than forward it; FFmpeg
+            writes raw audio in packets of a few hundred bytes.
+
+    Raises:
+        RuntimeError: If the command fails or the watchdog kills it, after
+            the output produced so far was yielded.
+    """
+    if not {'-v', '-loglevel'} & set(command):
+        command = [command[0], '-hide_banner', '-nostats', '-loglevel', 'error', *command[1:]]
+    hot_logger.debug("FFmpeg command: %s", ' '.join(command))
+
+    with tracked_process(os.path.basename(command[0])), tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        # Com o bufsize padrão o stdout do Popen é um BufferedReader
+        stdout = cast(io.BufferedReader, process.stdout)
+        with ffmpeg_watchdog.watch(process) as watch:
+            try:
+                while True:
+                    # read1 devolve o que já chegou, sem esperar o bloco inteiro
+                    chunk = stdout.read(chunk_size) if whole_chunks else stdout.read1(chunk_size)
+                    if not chunk:
+                        break
+                    watch.touch()
+                    yield chunk
+                returncode = process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                stdout.close()
+
+        _raise_for_exit(watch, returncode, stderr)
+
+
+def probe_source(input_path: str) -> SourceIndex:
+    """Probe codecs and keyframe positions of a source video.
+
+    Keyframes are read from packet flags, so the source is demuxed but not
+    decoded.
+
+    Args:
+        input_path: Absolute path of the source video.
+
+    Returns:
+        The source index.
+
+    Raises:
+        RuntimeError: If FFprobe fails.
+    """
+    try:
+        with span('ffprobe'), tracked_process('ffprobe'):
+            streams_result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries',
+                 'stream=codec_type,codec_name,pix_fmt,width,height,avg_frame_rate:format=duration,bit_rate',
+                 '-of', 'json', input_path],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            packets_result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_path],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"FFprobe error: {e.stderr}")
+
+    info = json.loads(streams_result.stdout or '{}')
+    index = SourceIndex()
+    source_format = info.get('format', {})
+    if source_format.get('duration') not in (None, 'N/A'):
+        index.duration = float(source_format['duration'])
+    if source_format.get('bit_rate') not in (None, 'N/A'):
+        index.bit_rate = int(source_format['bit_rate'])
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == 'video' and index.video_codec is None:
+            index.video_codec = stream.get('codec_name')
+            index.pix_fmt = stream.get('pix_fmt')
+            index.width = stream.get('width')
+            index.height = stream.get('height')
+            numerator, _, denominator = str(stream.get('avg_frame_rate') or '0/0').partition('/')
+            if denominator and float(denominator) and float(numerator):
+                index.frame_rate = float(numerator) / float(denominator)
+        elif stream.get('codec_type') == 'audio' and index.audio_codec is None:
+            index.audio_codec = stream.get('codec_name')
+
+    keyframes = set()
+    for line in packets_result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.add(float(pts_time))
+    index.keyframes = sorted(keyframes)
+
+    logger.debug("Probed %s: %d keyframes, video=%s, audio=%s", input_path, len(index.keyframes), index.video_codec, index.audio_codec)
+    return index
+
+
+class KeyframeCache:
+    """Thread-safe LRU cache of SourceIndex objects.
+
+    Entries are keyed by path, size and modification time, so a replaced
+    source is probed again.
+    """
+
+    def __init__(self, max_entries: int = 64) -> None:
+        """Initialize cache."""
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, int, int], SourceIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, input_path: str, loader: Optional[Callable[[str], SourceIndex]] = None) -> SourceIndex:
+        """Return the index of a source, loading it on first use.
+
+        Args:
+            input_path: Absolute path of the source video.
+            loader: Called with input_path on a miss; defaults to probe_source.
+        """
+        stat = os.stat(input_path)
+        key = (os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        index = (loader or probe_source)(input_path)
+
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+keyframe_cache = KeyframeCache()
+
+
+def plan_cut(index: SourceIndex, start_time: float, end_time: float, mode: str = CUT_MODE_AUTO,
+             snap_tolerance: float = 0.5) -> CutPlan:
+    """Choose how to cut a range from a source.
+
+    - copy: stream copy from the keyframe at or before start_time.
+    - smart: re-encode from start_time up to the next keyframe and
+      stream-copy from there to end_time.
+    - encode: re-encode the whole range, used when the range sits inside a
+      single GOP or the codecs cannot be smart-cut.
+
+    In auto mode a copy is used when start_time is within snap_tolerance
+    seconds of a keyframe, otherwise a smart cut.
+
+    Args:
+        index: The source index.
+        start_time: Requested start in seconds.
+        end_time: Requested end in seconds.
+        mode: One of CUT_MODES.
+        snap_tolerance: Maximum start shift accepted by auto mode.
+
+    Returns:
+        The cut plan.
+    """
+    if mode not in CUT_MODES:
+        raise ValueError(f"Invalid cut mode: {mode}. Expected one of {CUT_MODES}")
+
+    previous_keyframe = index.keyframe_at_or_before(start_time)
+    if not index.keyframes:
+        return CutPlan(STRATEGY_COPY, start_time, end_time)
+    if previous_keyframe is None:
+        previous_keyframe = index.keyframes[0]
+
+    snapped = start_time - previous_keyframe <= snap_tolerance + SEEK_EPSILON
+    if mode == STRATEGY_COPY or (mode == CUT_MODE_AUTO and snapped):
+        return CutPlan(STRATEGY_COPY, previous_keyframe, end_time)
+
+    next_keyframe = index.keyframe_after(start_time)
+    can_smart_cut = (
+        index.video_codec in SMART_CUT_VIDEO_ENCODERS
+        and (index.audio_codec is None or index.audio_codec in SMART_CUT_AUDIO_ENCODERS)
+    )
+    if next_keyframe is None or next_keyframe >= end_time or not can_smart_cut:
+        return CutPlan(STRATEGY_ENCODE, start_time, end_time)
+    return CutPlan(STRATEGY_SMART, start_time, end_time, keyframe=next_keyframe)
+
+
+def encode_range(input_path: str, output_path: str, start_time: float, end_time: float,
+                 video_filter: Optional[str] = None, encoder_options: Optional[List[str]] = None) -> None:
+    """Re-encode a range using input-side seeking.
+
+    Args:
+        input_path: Absolute path of the source video.
+        output_path: Absolute path of the output.
+        start_time: Start in seconds.
+        end_time: End in seconds.
+        video_filter: Optional -vf filter chain.
+        encoder_options: Extra video encoder options such as -preset and -threads.
+    """
+    command = ['ffmpeg', '-y', '-ss', str(start_time), '-i', input_path, '-t', str(end_time - start_time)]
+    if video_filter:
+        command.extend(['-vf', video_filter])
+    command.extend(encoder_options or [])
+    command.append(output_path)
+    run_ffmpeg(command)
+
+
+def smart_cut(input_path: str, output_path: str, plan: CutPlan, index: SourceIndex,
+              encoder_options: Optional[List[str]] = None) -> None:
+    """Re-encode the partial head GOP and stream-copy the rest of the range.
+
+    Both parts are written as MPEG-TS so each carries its own in-band
+    parameter sets, then joined with the concat demuxer. The tail needs no
+    re-encode: a stream copy can stop on any packet.
+
+    Args:
+        input_path: Absolute path of the source video.
+        output_path: Absolute path of the output.
+        plan: A smart cut plan.
+        index: The source index.
+        encoder_options: Extra options of the head re-encode.
+    """
+    assert plan.keyframe is not None
+    work_dir = tempfile.mkdtemp(prefix='.smartcut_', dir=os.path.dirname(output_path))
+    try:
+        head_path = os.path.join(work_dir, 'head.ts')
+        body_path = os.path.join(work_dir, 'body.ts')
+        list_path = os.path.join(work_dir, 'segments.txt')
+
+        head = [
+            'ffmpeg', '-y', '-ss', str(plan.start_time), '-i', input_path,
+            '-t', str(plan.keyframe - plan.start_time),
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-c:v', SMART_CUT_VIDEO_ENCODERS[str(index.video_codec)],
+            *(encoder_options or [])
+        ]
+        if index.pix_fmt:
+            head.extend(['-pix_fmt', index.pix_fmt])
+        if index.audio_codec:
+            head.extend(['-c:a', SMART_CUT_AUDIO_ENCODERS[index.audio_codec]])
+        head.extend(['-f', 'mpegts', head_path])
+        run_ffmpeg(head)
+
+        with ffmpeg_progress(None, offset=plan.keyframe - plan.start_time):
+            run_ffmpeg([
+                'ffmpeg', '-y', '-ss', str(plan.keyframe), '-i', input_path,
+                '-t', str(plan.end_time - plan.keyframe),
+                '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                '-f', 'mpegts', body_path
+            ])
+
+        with open(list_path, 'w') as f:
+            f.write("file 'head.ts'\nfile 'body.ts'\n")
+        run_ffmpeg([
+            'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-c', 'copy', '-movflags', '+faststart', output_path
+        ])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def stream_command(input_path: str, plan: CutPlan, video_filter: Optional[str] = None,
+                   encoder_options: Optional[List[str]] = None) -> List[str]:
+    """FFmpeg command writing a cut plan to stdout as fragmented MP4.
+
+    The moov box goes first and a fragment starts at every keyframe, so the
+    client can play the output while it is written. A smart cut joins two
+    passes and cannot stream, so it is re-encoded instead; see
+    streamable_plan().
+
+    Args:
+        input_path: Absolute path of the source video.
+        plan: A copy or encode plan.
+        video_filter: Optional -vf filter chain of an encode.
+        encoder_options: Extra video encoder options of an encode.
+    """
+    command = ['ffmpeg', '-ss', str(plan.start_time), '-i', input_path, '-t', str(plan.duration)]
+    if plan.strategy == STRATEGY_COPY:
+        command.extend(['-c', 'copy', '-avoid_negative_ts', 'make_zero'])
+    else:
+        if video_filter:
+            command.extend(['-vf', video_filter])
+        command.extend(encoder_options or [])
+    command.extend(['-f', 'mp4', '-movflags', FRAGMENTED_MP4_FLAGS, 'pipe:1'])
+    return command
+
+
+def streamable_plan(plan: CutPlan) -> CutPlan:
+    """The plan to stream instead of plan: smart cuts become encodes of the same range."""
+    if plan.strategy == STRATEGY_SMART:
+        return CutPlan(STRATEGY_ENCODE, plan.start_time, plan.end_time)
+    return plan
+
+
+def execute_cut(input_path: str, output_path: str, plan: CutPlan, index: SourceIndex,
+                encoder_options: Optional[List[str]] = None) -> None:
+    """Write the output of a cut plan.
+
+    Args:
+        input_path: Absolute path of the source video.
+        output_path: Absolute path of the output.
+        plan: The cut plan.
+        index: The source index.
+        encoder_options: Extra video encoder options of smart and encode cuts.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    if plan.strategy == STRATEGY_SMART:
+        smart_cut(input_path, output_path, plan, index, encoder_options)
+    elif plan.strategy == STRATEGY_ENCODE:
+        encode_range(input_path, output_path, plan.start_time, plan.end_time, encoder_options=encoder_options)
+    else:
+        run_ffmpeg([
+            'ffmpeg', '-y', '-ss', str(plan.start_time), '-i', input_path,
+            '-t', str(plan.duration), '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero', output_path
+        ])
@@ -0,0 +1,105 @@
+# Standard library imports
+import logging
+import threading
+from typing import Callable, List, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from models import db
+
+logger = logging.getLogger(__name__)
+
+WORKER_MODE_EMBEDDED = 'embedded'
+WORKER_MODE_WEB = 'web'
+WORKER_MODE_WORKER = 'worker'
+WORKER_MODES = (WORKER_MODE_EMBEDDED, WORKER_MODE_WEB, WORKER_MODE_WORKER)
+
+
+def runs_workers(app: Flask) -> bool:
+    """Whether this process runs queued work, or leaves it to worker processes."""
+    return app.config.get('WORKER_MODE', WORKER_MODE_EMBEDDED) != WORKER_MODE_WEB
+
+
+class Dispatcher:
+    """Background thread that picks up queued work from the database.
+
+    Every WORKER_POLL_INTERVAL seconds each registered poll function claims
+    the clip jobs, downloads and preview renditions nobody is running, so
+    work queued by any web process, or left behind by a process that died,
+    is started by one of the worker processes. Claims are locks from
+    locks.py, released when the work finishes or its process exits.
+
+    WORKER_MODE selects the role of a process: 'embedded' serves requests
+    and runs the work, as a single-process deployment does; 'web' only
+    queues work; 'worker' (set by worker.py) only runs it.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize dispatcher."""
+        self.app: Optional[Flask] = None
+        self.polls = 0
+        self._poll_functions: List[Callable[[], int]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the dispatcher to an application."""
+        mode = app.config.get('WORKER_MODE', WORKER_MODE_EMBEDDED)
+        if mode not in WORKER_MODES:
+            raise ValueError(f"Invalid WORKER_MODE {mode!r}, expected one of {WORKER_MODES}")
+        self.app = app
+        app.extensions['dispatcher'] = self
+
+    def register(self, poll: Callable[[], int]) -> None:
+        """Add a function that claims pending work and returns how much it started."""
+        self._poll_functions.append(poll)
+
+    def start(self) -> None:
+        """Poll once, then keep polling in the background, unless this is a web process."""
+        assert self.app is not None
+        if not runs_workers(self.app) or self._thread is not None:
+            return
+        self.poll()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop claiming new work; work already started runs to completion."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> int:
+        """Run every poll function once.
+
+        Returns:
+            The amount of work started.
+        """
+        assert self.app is not None
+        started = 0
+        with self.app.app_context():
+            for poll in self._poll_functions:
+                try:
+                    started += poll()
+                except Exception as e:
+                    logger.error("Error claiming pending work in %s: %s", getattr(poll, '__qualname__', poll), str(e),
+                                 exc_info=True)
+                    db.session.rollback()
+        self.polls += 1
+        return started
+
+    def _loop(self) -> None:
+        """Poll until stopped."""
+        assert self.app is not None
+        interval = float(self.app.config.get('WORKER_POLL_INTERVAL', 2.0))
+        while not self._stop.wait(interval):
+            self.poll()
+
+
+dispatcher = Dispatcher()
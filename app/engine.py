@@ -0,0 +1,365 @@
+# Standard library imports
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from fractions import Fraction
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Third-party imports
+import av
+from flask import Flask
+
+# Local imports
+from clips import cut_clips, verify_clip
+from cutting import STRATEGY_COPY, CutPlan, SourceIndex, execute_cut
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Slack when matching packet times against keyframe-aligned starts
+PACKET_EPSILON = 0.001
+
+ProgressCallback = Callable[[float], None]
+
+
+class _PooledInput:
+    """An opened input container and the file state it was opened for.
+
+    An entry removed from the pool while in use is marked retired; its
+    holder closes it when done and callers waiting for it open another.
+    """
+
+    def __init__(self, input_path: str, mtime_ns: int) -> None:
+        """Open the container."""
+        self.container = av.open(input_path)
+        self.mtime_ns = mtime_ns
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.retired = False
+        self.closed = False
+
+    def close(self) -> None:
+        """Close the container; closing it again does nothing."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.container.close()
+        except av.FFmpegError as e:
+            logger.debug("Error closing pooled input: %s", e)
+
+
+class _RangeOutput:
+    """One output of a multi-range remux and its per-stream state."""
+
+    def __init__(self, output_path: str, start_time: float, end_time: float, streams: List[Any]) -> None:
+        """Open the output container with one stream per copied input stream."""
+        self.path = output_path
+        self.start_time = start_time
+        self.end_time = end_time
+        self.container = av.open(output_path, 'w', options={'avoid_negative_ts': 'make_zero'})
+        self.streams = {stream.index: self.container.add_stream_from_template(stream) for stream in streams}
+        self.offsets = {stream.index: int(round(start_time / stream.time_base)) for stream in streams}
+        self.pending = set(self.streams)
+        self.video_started = False
+        self.closed = False
+
+    def close(self) -> None:
+        """Flush and close the output container."""
+        if not self.closed:
+            self.closed = True
+            self.container.close()
+
+
+class MediaEngine:
+    """In-process stream copy of source ranges through PyAV.
+
+    Stream-copy cuts are the common case of iterative editing and most of
+    their cost with the ffmpeg CLI is process start, container parsing and
+    stderr capture. The engine keeps up to ENGINE_POOL_SIZE opened input
+    containers in an LRU pool, one per recently used source, and serves
+    successive copies from them with a seek and a packet loop. Batches of
+    ranges are written in a single demux pass. Re-encoding cuts still go
+    through FFmpeg via execute_cut().
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize engine."""
+        self.app: Optional[Flask] = None
+        self.enabled = True
+        self.pool_size = 8
+        self.idle_seconds = 300.0
+        self._pool: 'OrderedDict[str, _PooledInput]' = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the engine to an application."""
+        self.app = app
+        self.enabled = bool(app.config.get('ENGINE_ENABLED', True))
+        self.pool_size = max(1, int(app.config.get('ENGINE_POOL_SIZE', 8)))
+        self.idle_seconds = float(app.config.get('ENGINE_IDLE_SECONDS', 300))
+        app.extensions['media_engine'] = self
+
+    def cut(self, input_path: str, output_path: str, plan: CutPlan, index: SourceIndex,
+            encoder_options: Optional[List[str]] = None, progress: Optional[ProgressCallback] = None) -> None:
+        """Write the output of a cut plan, stream copies in-process.
+
+        Args:
+            input_path: Absolute path of the source video.
+            output_path: Absolute path of the output.
+            plan: The cut plan.
+            index: The source index.
+            encoder_options: Extra video encoder options of smart and encode cuts.
+            progress: Called with the completed fraction of a stream copy.
+
+        Raises:
+            RuntimeError: If PyAV or FFmpeg fails.
+            FileNotFoundError: If the source does not exist.
+        """
+        with span('cut' if plan.strategy == STRATEGY_COPY else 'encode'):
+            if plan.strategy == STRATEGY_COPY and self.enabled:
+                self.remux_ranges(input_path, [(output_path, plan.start_time, plan.end_time)], progress)
+            else:
+                execute_cut(input_path, output_path, plan, index, encoder_options)
+
+    def cut_clips(self, input_path: str, outputs: List[Tuple[str, float, float]],
+                  progress: Optional[ProgressCallback] = None) -> List[int]:
+        """Stream-copy keyframe-aligned clips in one pass, like clips.cut_clips().
+
+        Returns:
+            The size in bytes of each generated clip, in the order of outputs.
+
+        Raises:
+            RuntimeError: If PyAV or FFmpeg fails.
+            FileNotFoundError: If an output file was not created.
+            ValueError: If an output file is empty.
+        """
+        with span('cut'):
+            if not self.enabled:
+                return cut_clips(input_path, outputs)
+            self.remux_ranges(input_path, outputs, progress)
+            return [verify_clip(output_path) for output_path, _, _ in outputs]
+
+    def remux_ranges(self, input_path: str, outputs: List[Tuple[str, float, float]],
+                     progress: Optional[ProgressCallback] = None) -> None:
+        """Copy the packets of one or more ranges of a source into their outputs.
+
+        The pooled container is seeked to the earliest start and demuxed once
+        up to the latest end; every packet is written to each output whose
+        range contains it. Starts must be keyframes, as for clips.cut_clips().
+
+        Args:
+            input_path: Absolute path of the source video.
+            outputs: (output_path, start_seconds, end_seconds) tuples.
+            progress: Called with the fraction of the demuxed span done.
+
+        Raises:
+            RuntimeError: If PyAV fails.
+            FileNotFoundError: If the source does not exist.
+        """
+        with self.open(input_path) as container:
+            try:
+                self._remux(container, outputs, progress)
+            except av.FFmpegError as e:
+                # Um contêiner em estado de erro não volta para o pool
+                self._discard(input_path, container)
+                raise RuntimeError(f"FFmpeg error: {e}")
+
+    @contextmanager
+    def open(self, input_path: str) -> Iterator[Any]:
+        """Borrow the pooled container of a source, opening it on a miss.
+
+        The container is used by one thread at a time; other callers wanting
+        the same source wait for it. A container opened before the file was
+        replaced is never handed out again.
+
+        Raises:
+            FileNotFoundError: If the source does not exist.
+            RuntimeError: If PyAV cannot open the source.
+        """
+        try:
+            mtime_ns = os.stat(input_path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Input video not found: {input_path}")
+
+        while True:
+            entry = self._checkout(input_path, mtime_ns)
+            with entry.lock:
+                if entry.retired:
+                    # Saiu do pool enquanto esperávamos: arquivo trocado, ocioso ou com erro
+                    continue
+                entry.last_used = time.monotonic()
+                try:
+                    yield entry.container
+                finally:
+                    if entry.retired:
+                        entry.close()
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy."""
+        with self._lock:
+            return {'enabled': self.enabled, 'open': len(self._pool), 'poolSize': self.pool_size}
+
+    def close_all(self) -> None:
+        """Close every idle pooled container."""
+        with self._lock:
+            for input_path, entry in list(self._pool.items()):
+                if not entry.lock.locked():
+                    self._retire(input_path)
+
+    def _checkout(self, input_path: str, mtime_ns: int) -> _PooledInput:
+        """The pooled container of a source, opened outside the pool lock on a miss.
+
+        Opening parses the whole container header, which can be slow for a
+        large moov atom or on a network file system, so the pool lock is not
+        held meanwhile and other sources stay available.
+
+        Raises:
+            RuntimeError: If PyAV cannot open the source.
+        """
+        with self._lock:
+            self._sweep(reserve=False)
+            entry = self._current(input_path, mtime_ns)
+            if entry is not None:
+                self._pool.move_to_end(input_path)
+                return entry
+
+        try:
+            fresh = _PooledInput(input_path, mtime_ns)
+        except av.FFmpegError as e:
+            raise RuntimeError(f"FFmpeg error: {e}")
+        with self._lock:
+            entry = self._current(input_path, mtime_ns)
+            if entry is None:
+                self._sweep(reserve=True)
+                self._pool[input_path] = entry = fresh
+            else:
+                self._pool.move_to_end(input_path)
+        if entry is not fresh:
+            # Outra chamada abriu a mesma fonte ao mesmo tempo
+            fresh.close()
+        return entry
+
+    def _current(self, input_path: str, mtime_ns: int) -> Optional[_PooledInput]:
+        """The pooled entry of a source if it was opened for the file's current state.
+
+        Called with the pool lock held.
+        """
+        entry = self._pool.get(input_path)
+        if entry is not None and entry.mtime_ns != mtime_ns:
+            # O arquivo mudou desde a abertura, por exemplo num novo download
+            self._retire(input_path)
+            return None
+        return entry
+
+    def _retire(self, input_path: str) -> None:
+        """Remove a container from the pool, closing it now if idle or when its holder is done.
+
+        Called with the pool lock held.
+        """
+        entry = self._pool.pop(input_path)
+        entry.retired = True
+        if entry.lock.acquire(blocking=False):
+            entry.close()
+            entry.lock.release()
+
+    def _sweep(self, reserve: bool) -> None:
+        """Close idle containers past ENGINE_IDLE_SECONDS and the LRU ones past the pool size.
+
+        Called with the pool lock held. Containers in use are skipped.
+
+        Args:
+            reserve: Whether to make room for a container about to be opened.
+        """
+        now = time.monotonic()
+        excess = len(self._pool) - self.pool_size + (1 if reserve else 0)
+        for input_path, entry in list(self._pool.items()):
+            if excess <= 0 and now - entry.last_used < self.idle_seconds:
+                continue
+            if entry.lock.locked():
+                continue
+            self._retire(input_path)
+            excess -= 1
+
+    def _discard(self, input_path: str, container: Any) -> None:
+        """Drop a pooled container in error; the caller holds it and it is closed on release."""
+        with self._lock:
+            entry = self._pool.get(input_path)
+            if entry is not None and entry.container is container:
+                self._retire(input_path)
+
+    @staticmethod
+    def _remux(container: Any, ranges: List[Tuple[str, float, float]],
+               progress: Optional[ProgressCallback]) -> None:
+        """Demux the span of all ranges once and route packets to their outputs."""
+        streams = container.streams.video[:1] + container.streams.audio[:1]
+        video = streams[0] if container.streams.video else None
+        if video is None:
+            raise RuntimeError("Input video has no video stream")
+
+        base_time = min(start_time for _, start_time, _ in ranges)
+        last_end = max(end_time for _, _, end_time in ranges)
+        span = max(last_end - base_time, PACKET_EPSILON)
+        outputs = [_RangeOutput(path, start_time, end_time, streams) for path, start_time, end_time in ranges]
+        try:
+            container.seek(int(base_time / video.time_base), stream=video, backward=True, any_frame=False)
+            reported = 0.0
+            for packet in container.demux(*streams):
+                if packet.dts is None or packet.size == 0:
+                    continue
+                time_base: Fraction = packet.time_base
+                pts = packet.pts if packet.pts is not None else packet.dts
+                seconds = float(pts * time_base)
+                is_video = packet.stream.index == video.index
+
+                for output in outputs:
+                    if output.closed or packet.stream.index not in output.pending:
+                        continue
+                    if seconds >= output.end_time - PACKET_EPSILON:
+                        # Em ordem de decodificação, só o dts garante que o stream passou do fim
+                        if float(packet.dts * time_base) >= output.end_time - PACKET_EPSILON:
+                            output.pending.discard(packet.stream.index)
+                            if not output.pending:
+                                output.close()
+                        continue
+                    if is_video and not output.video_started:
+                        if not packet.is_keyframe or seconds < output.start_time - PACKET_EPSILON:
+                            continue
+                        output.video_started = True
+                    elif not is_video and seconds < output.start_time - PACKET_EPSILON:
+                        continue
+
+                    copy = av.Packet(bytes(packet))
+                    offset = output.offsets[packet.stream.index]
+                    copy.pts = pts - offset
+                    copy.dts = packet.dts - offset
+                    copy.duration = packet.duration
+                    copy.time_base = time_base
+                    copy.is_keyframe = packet.is_keyframe
+                    copy.stream = output.streams[packet.stream.index]
+                    output.container.mux(copy)
+
+                if progress is not None and is_video:
+                    done = min(max((seconds - base_time) / span, 0.0), 1.0)
+                    if done - reported >= 0.01:
+                        reported = done
+                        progress(done)
+                if all(output.closed for output in outputs):
+                    break
+        finally:
+            for output in outputs:
+                output.close()
+        if progress is not None:
+            progress(1.0)
+        for output in outputs:
+            if not output.video_started:
+                raise RuntimeError(f"No keyframe found at {output.start_time:g}s for {output.path}")
+
+
+media_engine = MediaEngine()
@@ -0,0 +1,191 @@
+# Standard library imports
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from models import db, column, DownloadTask
+from dispatcher import runs_workers
+from locks import FileLock, locks
+from media_info import media_info_cache
+from metrics import queued
+from previews import previews
+from scheduling import FairExecutor, admission
+from source_cache import source_cache
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Worker pool that downloads submitted URLs in the background.
+
+    Download progress from yt-dlp's progress hooks is written to the
+    DownloadTask row, at most once per INGEST_PROGRESS_INTERVAL seconds, so
+    any web process can report it. Tasks left unfinished by a previous
+    process are resumed by resume_pending() and continue from their .part
+    files; a task runs only while its process holds the task's lock, so
+    several worker processes never download the same task twice. Tasks with
+    a DownloadSection fetch only that window, widened by CLIP_FIRST_MARGIN
+    seconds on each side; the editor and the clip APIs keep using the
+    original video's times, translated by the source's section_start.
+    Workers are shared between users by fair queuing, at most
+    SCHEDULER_USER_WORKERS downloads per user.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize queue."""
+        self.app: Optional[Flask] = None
+        self._executor: Optional[FairExecutor] = None
+        self._last_update: Dict[str, float] = {}
+        self._claims: Dict[str, FileLock] = {}
+        self._lock = threading.Lock()
+        self.enabled = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the queue to an application and start the worker pool."""
+        self.app = app
+        max_workers = int(app.config.get('INGEST_WORKERS', 2))
+        self._executor = FairExecutor(max_workers, admission.user_limit(max_workers), 'ingest-worker')
+        self.enabled = runs_workers(app)
+        app.extensions['ingest'] = self
+
+    def submit(self, task: DownloadTask) -> None:
+        """Queue a download task; in a web process a worker process claims it instead."""
+        if self._executor is None:
+            raise RuntimeError("IngestQueue is not initialized")
+        if self.enabled and self._claim(task.id):
+            self._executor.submit(task.user_id, admission.weight_for_user(task.user_id),
+                                  queued('ingest', self._run_claimed), task.id)
+
+    def resume_pending(self) -> int:
+        """Claim and re-queue unfinished downloads that no process is running.
+
+        Returns:
+            The number of tasks that were re-queued.
+        """
+        assert self._executor is not None
+        with self._lock:
+            claimed = set(self._claims)
+        tasks = DownloadTask.query.filter(
+            column(DownloadTask.status).in_([DownloadTask.QUEUED, DownloadTask.DOWNLOADING])
+        ).all()
+        resumed = 0
+        for task in tasks:
+            if task.id not in claimed and self._claim(task.id):
+                self._executor.submit(task.user_id, admission.weight_for_user(task.user_id),
+                                      queued('ingest', self._run_claimed), task.id)
+                resumed += 1
+        if resumed:
+            logger.info("Resumed %d unfinished downloads", resumed)
+        return resumed
+
+    def _claim(self, task_id: str) -> bool:
+        """Take the lock of a task unless this or another process already runs it."""
+        with self._lock:
+            if task_id in self._claims:
+                return False
+            lock = locks.try_claim(f'download-task:{task_id}')
+            if lock is None:
+                return False
+            self._claims[task_id] = lock
+            return True
+
+    def _run_claimed(self, task_id: str) -> None:
+        """Run a claimed task and release its claim."""
+        try:
+            self._run(task_id)
+        finally:
+            with self._lock:
+                self._claims.pop(task_id).release()
+
+    def _run(self, task_id: str) -> None:
+        """Download a task's URL into the source cache and link it for the user."""
+        assert self.app is not None
+        with self.app.app_context():
+            task: Optional[DownloadTask] = db.session.get(DownloadTask, task_id)
+            if task is None or task.is_finished:
+                return
+
+            task.status = DownloadTask.DOWNLOADING
+            task.error = None
+            db.session.commit()
+
+            section = None
+            if task.section is not None:
+                section = (task.section.start_time, task.section.end_time)
+
+            try:
+                source = source_cache.fetch(
+                    task.url,
+                    self.app.config['YTDLP_FORMAT'],
+                    {'quiet': True, 'noprogress': True},
+                    progress_callback=lambda progress: self._record_progress(task_id, progress),
+                    section=section,
+                    # Margem para que cortes perto das bordas ainda tenham keyframes e contexto
+                    margin=float(self.app.config.get('CLIP_FIRST_MARGIN', 5))
+                )
+                entry = source_cache.link_for_user(source, task.user_id)
+                try:
+                    # Sondar uma única vez aqui para que o editor valide cortes sem chamar o ffprobe
+                    media_info_cache.get(source_cache.source_path(source), source)
+                except RuntimeError as e:
+                    logger.warning("Could not probe downloaded video %s: %s", entry.video_path, str(e))
+                previews.submit(source)
+
+                task = db.session.get(DownloadTask, task_id)
+                assert task is not None
+                task.status = DownloadTask.DONE
+                task.title = source.title
+                task.video_path = entry.video_path
+                task.downloaded_bytes = source.size
+                task.total_bytes = source.size
+                task.eta = 0
+                db.session.commit()
+                logger.debug("Download task %s finished: %s", task_id, entry.video_path)
+            except (ValueError, FileNotFoundError) as e:
+                logger.error("Error in download task %s: %s", task_id, str(e))
+                self._fail(task_id, str(e))
+            except Exception as e:
+                logger.error("Unexpected error in download task %s: %s", task_id, str(e), exc_info=True)
+                self._fail(task_id, 'An unexpected error occurred while processing the video')
+            finally:
+                with self._lock:
+                    self._last_update.pop(task_id, None)
+
+    def _record_progress(self, task_id: str, progress: Dict[str, Any]) -> None:
+        """Persist a yt-dlp progress update, throttled per task."""
+        assert self.app is not None
+        interval = float(self.app.config.get('INGEST_PROGRESS_INTERVAL', 0.5))
+        now = time.monotonic()
+        with self._lock:
+            if progress.get('status') == 'downloading' and now - self._last_update.get(task_id, 0.0) < interval:
+                return
+            self._last_update[task_id] = now
+
+        task: Optional[DownloadTask] = db.session.get(DownloadTask, task_id)
+        if task is None:
+            return
+        task.downloaded_bytes = int(progress.get('downloaded_bytes') or 0)
+        total = progress.get('total_bytes') or progress.get('total_bytes_estimate')
+        task.total_bytes = int(total) if total else None
+        task.speed = progress.get('speed')
+        task.eta = progress.get('eta')
+        db.session.commit()
+
+    def _fail(self, task_id: str, error: str) -> None:
+        """Mark a task as failed."""
+        db.session.rollback()
+        task: Optional[DownloadTask] = db.session.get(DownloadTask, task_id)
+        if task is not None:
+            task.status = DownloadTask.FAILED
+            task.error = error
+            db.session.commit()
+
+
+ingest_queue = IngestQueue()
@@ -0,0 +1,239 @@
+# Standard library imports
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third-party imports
+from flask import Flask
+from sqlalchemy import func
+
+# Local imports
+from catalog import catalog
+from locks import locks
+from models import db, CachedSource, Clip, SourceVideo, User
+from source_cache import source_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Budget:
+    """File and time allowance of a single janitor pass."""
+
+    def __init__(self, max_files: int, max_seconds: float) -> None:
+        """Initialize budget."""
+        self.remaining = max_files
+        self.deadline = time.monotonic() + max_seconds
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the pass must stop."""
+        return self.remaining <= 0 or time.monotonic() >= self.deadline
+
+    def take(self, wanted: int) -> int:
+        """Reserve up to wanted file removals and return how many were granted."""
+        if self.exhausted:
+            return 0
+        granted = min(wanted, self.remaining)
+        self.remaining -= granted
+        return granted
+
+
+class Janitor:
+    """Background thread that expires files incrementally.
+
+    Every JANITOR_INTERVAL seconds a pass removes, oldest first:
+
+    - clips and download links older than FILE_CLEANUP_AGE, found through the
+      created_at indexes of the catalog;
+    - the oldest clips, then download links, of users above USER_DISK_QUOTA,
+      checking up to JANITOR_QUOTA_USERS users per pass in turn;
+    - shared sources nobody references any more, least recently used first;
+    - lock files no process has taken within FILE_CLEANUP_AGE.
+
+    Each pass stops after JANITOR_MAX_FILES removals or JANITOR_MAX_SECONDS,
+    so work on a large tree is spread over many short passes instead of one
+    long scan. With several worker processes only one of them runs a pass
+    at a time.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize janitor."""
+        self.app: Optional[Flask] = None
+        self.passes = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        self.seconds_spent = 0.0
+        self.last_pass: Dict[str, Any] = {}
+        # Último usuário cuja cota foi verificada; a próxima passada continua dele
+        self._quota_cursor = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the janitor to an application."""
+        self.app = app
+        app.extensions['janitor'] = self
+
+    def start(self) -> None:
+        """Start the background thread if JANITOR_ENABLED is set."""
+        assert self.app is not None
+        if not self.app.config.get('JANITOR_ENABLED', True) or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='janitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after its current pass."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_pass(self) -> Dict[str, Any]:
+        """Run one bounded expiry pass.
+
+        Returns:
+            The files removed, bytes reclaimed and seconds spent by the pass.
+        """
+        assert self.app is not None
+        config = self.app.config
+        started = time.monotonic()
+        budget = Budget(int(config.get('JANITOR_MAX_FILES', 200)), float(config.get('JANITOR_MAX_SECONDS', 2.0)))
+        cutoff = datetime.utcnow() - config['FILE_CLEANUP_AGE']
+        files = 0
+        reclaimed = 0
+
+        with self.app.app_context():
+            clips = self._take(budget, Clip.query.filter(Clip.created_at < cutoff).order_by(Clip.created_at))
+            reclaimed += catalog.remove_clips(clips)
+            files += len(clips)
+
+            entries = self._take(budget, SourceVideo.query.filter(SourceVideo.created_at < cutoff).order_by(SourceVideo.created_at))
+            files += catalog.remove_videos(entries)
+
+            quota = int(config.get('USER_DISK_QUOTA', 0))
+            if quota > 0:
+                quota_files, quota_bytes = self._enforce_quotas(budget, quota, int(config.get('JANITOR_QUOTA_USERS', 100)))
+                files += quota_files
+                reclaimed += quota_bytes
+
+            granted = budget.take(int(config.get('JANITOR_MAX_SOURCES', 10)))
+            if granted:
+                reclaimed += source_cache.evict(cutoff, limit=granted)
+
+        if not budget.exhausted:
+            locks.prune(config['FILE_CLEANUP_AGE'].total_seconds(), budget.remaining)
+
+        elapsed = time.monotonic() - started
+        result = {'filesRemoved': files, 'bytesReclaimed': reclaimed, 'seconds': round(elapsed, 4)}
+        with self._lock:
+            self.passes += 1
+            self.files_removed += files
+            self.bytes_reclaimed += reclaimed
+            self.seconds_spent += elapsed
+            self.last_pass = result
+        if files:
+            logger.info("Janitor pass removed %d files, reclaimed %d bytes in %.3fs", files, reclaimed, elapsed)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of every pass since the process started."""
+        with self._lock:
+            return {
+                'passes': self.passes,
+                'filesRemoved': self.files_removed,
+                'bytesReclaimed': self.bytes_reclaimed,
+                'secondsSpent': round(self.seconds_spent, 4),
+                'lastPass': dict(self.last_pass)
+            }
+
+    def _loop(self) -> None:
+        """Run passes until stopped."""
+        assert self.app is not None
+        interval = float(self.app.config.get('JANITOR_INTERVAL', 60))
+        while not self._stop.wait(interval):
+            claim = locks.try_claim('janitor')
+            if claim is None:
+                continue
+            try:
+                self.run_pass()
+            except Exception as e:
+                logger.error("Unexpected error in janitor pass: %s", str(e), exc_info=True)
+                with self.app.app_context():
+                    db.session.rollback()
+            finally:
+                claim.release()
+
+    @staticmethod
+    def _take(budget: Budget, query: Any) -> List[Any]:
+        """Fetch at most as many rows as the budget allows and charge them to it."""
+        if budget.exhausted:
+            return []
+        rows = query.limit(budget.remaining).all()
+        budget.remaining -= len(rows)
+        return rows
+
+    def _enforce_quotas(self, budget: Budget, quota: int, max_users: int) -> Tuple[int, int]:
+        """Evict the oldest files of users whose usage exceeds quota.
+
+        Usage is the size of a user's clips plus the size of the sources
+        their download links point to, summed per user through the user_id
+        indexes. A pass checks at most max_users users, in id order after
+        the last user the previous pass checked, and stops early when the
+        budget runs out, so the whole user table is covered over several
+        passes instead of being aggregated on every pass.
+
+        Returns:
+            The files removed and bytes reclaimed.
+        """
+        files = 0
+        reclaimed = 0
+        users: List[User] = User.query.filter(User.id > self._quota_cursor).order_by(User.id).limit(max_users).all()
+        for user in users:
+            if budget.exhausted:
+                return files, reclaimed
+            self._quota_cursor = user.id
+            used = self._usage(user.id)
+            if used <= quota:
+                continue
+            excess = used - quota
+
+            clips: List[Clip] = []
+            for clip in Clip.query.filter_by(user_id=user.id).order_by(Clip.created_at).limit(budget.remaining):
+                if excess <= 0 or not budget.take(1):
+                    break
+                clips.append(clip)
+                excess -= clip.size
+            reclaimed += catalog.remove_clips(clips)
+            files += len(clips)
+
+            entries: List[SourceVideo] = []
+            for entry in SourceVideo.query.filter_by(user_id=user.id).order_by(SourceVideo.created_at).limit(budget.remaining):
+                if excess <= 0 or not budget.take(1):
+                    break
+                entries.append(entry)
+                excess -= entry.source.size if entry.source is not None else 0
+            files += catalog.remove_videos(entries)
+            logger.info("User %s over disk quota by %d bytes, evicted %d clips and %d videos",
+                        user.id, used - quota, len(clips), len(entries))
+        if len(users) < max_users:
+            # Fim da tabela: a próxima passada recomeça do primeiro usuário
+            self._quota_cursor = 0
+        return files, reclaimed
+
+    @staticmethod
+    def _usage(user_id: int) -> int:
+        """Bytes taken by a user's clips and by the sources of their download links."""
+        clips = db.session.query(func.sum(Clip.size)).filter_by(user_id=user_id).scalar()
+        linked = db.session.query(func.sum(CachedSource.size)).join(CachedSource.references).filter_by(
+            user_id=user_id
+        ).scalar()
+        return int(clips or 0) + int(linked or 0)
+
+janitor = Janitor()
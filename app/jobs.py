@@ -0,0 +1,305 @@
+# Standard library imports
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from models import db, column, ClipJob, ClipJobItem
+from catalog import catalog
+from clips import build_clip_filename, plan_clip_batches, verify_clip
+from cutting import STRATEGY_COPY, CutPlan, SourceIndex, ffmpeg_progress, plan_cut
+from dispatcher import runs_workers
+from engine import media_engine
+from locks import FileLock, locks
+from media_info import media_info_cache
+from metrics import queued
+from progress import progress_hub
+from scheduling import FairExecutor, admission
+from transcoding import PROFILE_EXPORT, transcoder
+
+logger = logging.getLogger(__name__)
+
+
+class ClipJobQueue:
+    """Bounded worker pool that runs clip jobs outside the request cycle.
+
+    The pool is shared between users by weighted fair queuing: each batch
+    costs the seconds of output it writes, and at most SCHEDULER_USER_WORKERS
+    batches of one user run at once, so one large job cannot hold every
+    worker while other users wait.
+
+    Job and clip state lives in the database, so jobs that were queued or
+    running when the process stopped are picked up again by resume_pending().
+    A process runs a job only while it holds the job's lock, from planning
+    until its last batch finishes; with several worker processes each job is
+    therefore run by exactly one of them, and a job whose process died is
+    claimed again by the next resume_pending() of any worker.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize queue."""
+        self.app: Optional[Flask] = None
+        self._executor: Optional[FairExecutor] = None
+        self._status_lock = threading.Lock()
+        self._claims: Dict[str, FileLock] = {}
+        self._outstanding: Dict[str, int] = {}
+        self._claims_lock = threading.Lock()
+        self.enabled = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the queue to an application and start the worker pool."""
+        self.app = app
+        max_workers = int(app.config.get('CLIP_WORKERS', 2))
+        self._executor = FairExecutor(max_workers, admission.user_limit(max_workers), 'clip-worker')
+        self.enabled = runs_workers(app)
+        app.extensions['clip_jobs'] = self
+
+    def submit(self, job: ClipJob) -> None:
+        """Queue a job on the worker pool.
+
+        A worker probes the source, plans each cut and then fans the clips
+        out to the pool in batches. In a web process the job stays queued in
+        the database until a worker process claims it.
+        """
+        if self._executor is None:
+            raise RuntimeError("ClipJobQueue is not initialized")
+        if self.enabled and self._claim(job.id):
+            self._dispatch(job, self._plan_job, job.id)
+
+    def resume_pending(self) -> int:
+        """Claim and re-queue unfinished jobs that no process is running.
+
+        Called at startup and then periodically by the dispatcher. Clips
+        marked running belong to a process that stopped, so they are queued
+        again.
+
+        Returns:
+            The number of jobs that were re-queued.
+        """
+        with self._claims_lock:
+            claimed = set(self._claims)
+        jobs = []
+        for job in ClipJob.query.filter(column(ClipJob.status).in_([ClipJob.QUEUED, ClipJob.RUNNING])).all():
+            if job.id not in claimed and self._claim(job.id):
+                jobs.append(job)
+        for job in jobs:
+            for item in job.items:
+                if item.status == ClipJob.RUNNING:
+                    item.status = ClipJob.QUEUED
+            job.refresh_status()
+        db.session.commit()
+        for job in jobs:
+            self._dispatch(job, self._plan_job, job.id)
+        if jobs:
+            logger.info("Resumed %d unfinished clip jobs", len(jobs))
+        return len(jobs)
+
+    def _claim(self, job_id: str) -> bool:
+        """Take the lock of a job unless this or another process already runs it."""
+        with self._claims_lock:
+            if job_id in self._claims:
+                return False
+            lock = locks.try_claim(f'clip-job:{job_id}')
+            if lock is None:
+                return False
+            self._claims[job_id] = lock
+            self._outstanding[job_id] = 0
+            return True
+
+    def _dispatch(self, job: ClipJob, fn: Callable[..., None], *args: Any, cost: float = 1.0) -> None:
+        """Submit a task of a claimed job; the claim is released after the job's last task."""
+        assert self._executor is not None
+        job_id = job.id
+        with self._claims_lock:
+            self._outstanding[job_id] += 1
+
+        def run() -> None:
+            try:
+                fn(*args)
+            finally:
+                with self._claims_lock:
+                    self._outstanding[job_id] -= 1
+                    if self._outstanding[job_id] == 0:
+                        del self._outstanding[job_id]
+                        self._claims.pop(job_id).release()
+
+        self._executor.submit(job.user_id, admission.weight_for_user(job.user_id), queued('clips', run), cost=cost)
+
+    def _input_path(self, job: ClipJob) -> str:
+        """Absolute path of the source video of a job."""
+        assert self.app is not None
+        return os.path.join(self.app.root_path, 'downloads', job.video_path)
+
+    def _plan_cuts(self, job: ClipJob, items: List[ClipJobItem], index: SourceIndex) -> Dict[int, CutPlan]:
+        """Plan the cut of each clip, keyed by item ID, in seconds of the file."""
+        assert self.app is not None
+        snap_tolerance = float(self.app.config.get('CUT_SNAP_TOLERANCE', 0.5))
+        # Os itens guardam tempos do vídeo original; downloads clip-first começam em time_offset
+        return {
+            item.id: plan_cut(index, item.start_time - job.time_offset, item.end_time - job.time_offset,
+                              job.cut_mode, snap_tolerance)
+            for item in items
+        }
+
+    def _plan_job(self, job_id: str) -> None:
+        """Probe the source of a job and queue its clips in batches."""
+        assert self.app is not None
+        with self.app.app_context():
+            job: Optional[ClipJob] = db.session.get(ClipJob, job_id)
+            if job is None:
+                return
+            items = [item for item in job.items if item.status in (ClipJob.QUEUED, ClipJob.RUNNING)]
+            if not items:
+                return
+
+            try:
+                plans = self._plan_cuts(job, items, media_info_cache.get_for_user(job.user_id, job.video_path))
+            except (RuntimeError, FileNotFoundError, ValueError) as e:
+                logger.error("Error planning clip job %s: %s", job_id, str(e))
+                for item in items:
+                    item.error = str(e)
+                self._set_item_status(items, ClipJob.FAILED)
+                return
+
+            # Stream copies of keyframe-aligned ranges share FFmpeg runs, other cuts run alone
+            copy_ranges = []
+            batches: List[List[int]] = []
+            for item in items:
+                plan = plans[item.id]
+                item.strategy = plan.strategy
+                if plan.strategy == STRATEGY_COPY:
+                    copy_ranges.append((item.id, plan.start_time, plan.end_time))
+                else:
+                    batches.append([item.id])
+            db.session.commit()
+
+            max_outputs = int(self.app.config.get('CLIP_BATCH_MAX_OUTPUTS', 16))
+            max_gap = float(self.app.config.get('CLIP_BATCH_MAX_GAP', 60))
+            batches = plan_clip_batches(copy_ranges, max_outputs, max_gap) + batches
+            for batch in batches:
+                self._dispatch(job, self._run_batch, batch, cost=sum(plans[item_id].duration for item_id in batch))
+
+    def _run_batch(self, item_ids: List[int]) -> None:
+        """Generate a batch of clips of the same job inside an application context."""
+        assert self.app is not None
+        with self.app.app_context():
+            items: List[ClipJobItem] = []
+            for item_id in item_ids:
+                item: Optional[ClipJobItem] = db.session.get(ClipJobItem, item_id)
+                if item is not None and item.status in (ClipJob.QUEUED, ClipJob.RUNNING):
+                    items.append(item)
+            if not items:
+                return
+
+            job: ClipJob = items[0].job
+            job_id = job.id
+            self._set_item_status(items, ClipJob.RUNNING)
+
+            try:
+                self._cut_batch(job, items)
+            except Exception as e:
+                logger.error("Unexpected error in clip job %s: %s", job_id, str(e), exc_info=True)
+                unfinished = [item for item in items if item.status == ClipJob.RUNNING]
+                for item in unfinished:
+                    item.error = 'An unexpected error occurred while generating the clip'
+                if unfinished:
+                    self._set_item_status(unfinished, ClipJob.FAILED)
+
+    def _cut_batch(self, job: ClipJob, items: List[ClipJobItem]) -> None:
+        """Cut a batch in one FFmpeg run, falling back to one run per clip."""
+        assert self.app is not None
+        job_id, user_id, video_path, offset = job.id, job.user_id, job.video_path, job.time_offset
+        input_path = self._input_path(job)
+        if not os.path.exists(input_path):
+            for item in items:
+                item.error = f"Input video not found: {input_path}"
+            self._set_item_status(items, ClipJob.FAILED)
+            return
+
+        # O índice de keyframes já está em cache desde o planejamento
+        index = media_info_cache.get_for_user(user_id, video_path)
+        plans = self._plan_cuts(job, items, index)
+
+        output_dir = os.path.join(self.app.root_path, 'static', 'processed', str(user_id))
+        os.makedirs(output_dir, exist_ok=True)
+        outputs = [
+            (item, build_clip_filename(item.name, video_path, item.start_time, item.end_time))
+            for item in items
+        ]
+
+        if len(outputs) > 1:
+            ranges = [
+                (os.path.join(output_dir, filename), plans[item.id].start_time, plans[item.id].end_time)
+                for item, filename in outputs
+            ]
+            # O lote inteiro avança junto: uma única passada sobre o trecho coberto
+            span_seconds = max(end for _, _, end in ranges) - min(start for _, start, _ in ranges)
+            tracker = progress_hub.tracker(job_id, [item.id for item in items], span_seconds)
+            try:
+                with ffmpeg_progress(tracker.ffmpeg):
+                    media_engine.cut_clips(input_path, ranges, tracker.fraction)
+                for item, filename in outputs:
+                    item.output_filename = filename
+                    item.strategy = plans[item.id].strategy
+                    item.error = None
+                    catalog.add_clip(user_id, video_path, item.name, plans[item.id].start_time + offset,
+                                     plans[item.id].end_time + offset, filename)
+                self._set_item_status(items, ClipJob.DONE)
+                return
+            except (RuntimeError, FileNotFoundError, ValueError) as e:
+                # Descartar os clips já catalogados deste lote antes de refazer um a um
+                db.session.rollback()
+                progress_hub.clear(job_id, [item.id for item in items])
+                # Uma faixa inválida não deve derrubar o lote inteiro
+                logger.warning("Batched extraction failed for job %s, falling back to per-clip runs: %s", job_id, str(e))
+
+        for item, filename in outputs:
+            self._run_item(item, job_id, input_path, os.path.join(output_dir, filename), plans[item.id], index)
+
+    def _run_item(self, item: ClipJobItem, job_id: str, input_path: str, output_path: str,
+                  plan: CutPlan, index: SourceIndex) -> None:
+        """Generate a single clip with its own cut."""
+        tracker = progress_hub.tracker(job_id, [item.id], plan.duration)
+        try:
+            with transcoder.slot(plan.strategy != STRATEGY_COPY), ffmpeg_progress(tracker.ffmpeg):
+                media_engine.cut(input_path, output_path, plan, index,
+                                 transcoder.options(PROFILE_EXPORT, index.height), tracker.fraction)
+            verify_clip(output_path)
+            item.output_filename = os.path.basename(output_path)
+            item.strategy = plan.strategy
+            item.error = None
+            catalog.add_clip(item.job.user_id, item.job.video_path, item.name, plan.start_time + item.job.time_offset,
+                             plan.end_time + item.job.time_offset, item.output_filename)
+            self._set_item_status([item], ClipJob.DONE)
+        except (RuntimeError, FileNotFoundError, ValueError) as e:
+            logger.error("Error generating clip %s of job %s: %s", item.position, job_id, str(e))
+            item.error = str(e)
+            self._set_item_status([item], ClipJob.FAILED)
+        except Exception as e:
+            logger.error("Unexpected error in clip job %s: %s", job_id, str(e), exc_info=True)
+            item.error = 'An unexpected error occurred while generating the clip'
+            self._set_item_status([item], ClipJob.FAILED)
+
+    def _set_item_status(self, items: List[ClipJobItem], status: str) -> None:
+        """Persist a status change of some clips and the derived job status."""
+        with self._status_lock:
+            for item in items:
+                item.status = status
+            db.session.commit()
+            # The commit expired every loaded row, so sibling clips are re-read here
+            job: ClipJob = items[0].job
+            job.refresh_status()
+            db.session.commit()
+            if job.is_finished:
+                progress_hub.forget(job.id)
+            else:
+                progress_hub.clear(job.id, [item.id for item in items])
+
+
+clip_jobs = ClipJobQueue()
@@ -0,0 +1,212 @@
+# Standard library imports
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Third-party imports
+from flask import Flask
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Interval between attempts while waiting for a lock held elsewhere
+POLL_INTERVAL = 0.05
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared by every process on the host.
+
+    The lock is taken with flock(), so it belongs to the open file and not to
+    the thread: it may be released by another thread than the one that took
+    it, two opens in the same process exclude each other, and the kernel
+    drops it when the holder dies, so a crashed process never leaves a stale
+    lock behind. The file may be deleted by prune() while unlocked, so a
+    lock taken on a file that was unlinked meanwhile is dropped and retaken
+    on the new file. Without fcntl (Windows) the lock only excludes threads of
+    the same process.
+    """
+
+    _local_locks: Dict[str, threading.Lock] = {}
+    _local_guard = threading.Lock()
+
+    def __init__(self, path: str) -> None:
+        """Initialize lock."""
+        self.path = path
+        self._fd: Optional[int] = None
+        self._local: Optional[threading.Lock] = None
+
+    @property
+    def locked(self) -> bool:
+        """Whether this handle holds the lock."""
+        return self._fd is not None or self._local is not None
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """Take the lock.
+
+        Args:
+            blocking: Wait while another holder has it.
+            timeout: Seconds to wait at most; None waits forever.
+
+        Returns:
+            Whether the lock was taken.
+        """
+        if self.locked:
+            raise RuntimeError(f"Lock already held: {self.path}")
+        if fcntl is None:
+            return self._acquire_local(blocking, timeout)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                    return False
+                time.sleep(POLL_INTERVAL)
+                continue
+            except BaseException:
+                os.close(fd)
+                raise
+
+            try:
+                current = os.stat(self.path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(fd).st_ino:
+                # prune() apagou o arquivo entre o open e o flock
+                os.close(fd)
+                continue
+            # O mtime marca o último uso para prune()
+            os.utime(fd)
+            self._fd = fd
+            return True
+
+    def release(self) -> None:
+        """Give the lock back; releasing a lock that is not held does nothing."""
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            # Fechar o descritor libera o flock
+            os.close(fd)
+        if self._local is not None:
+            local, self._local = self._local, None
+            local.release()
+
+    def _acquire_local(self, blocking: bool, timeout: Optional[float]) -> bool:
+        """Process-local fallback of acquire()."""
+        with self._local_guard:
+            local = self._local_locks.setdefault(self.path, threading.Lock())
+        if local.acquire(blocking, -1 if timeout is None or not blocking else timeout):
+            self._local = local
+            return True
+        return False
+
+    def __enter__(self) -> 'FileLock':
+        """Take the lock, waiting as long as needed."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        """Release the lock."""
+        self.release()
+
+
+class LockManager:
+    """Named locks that coordinate the web and worker processes of one deployment.
+
+    Each name maps to a lock file under LOCK_DIR; files unused for a while
+    are removed by prune(). Every process of a deployment must see the same
+    LOCK_DIR. Across hosts that means a shared filesystem with working
+    flock(), such as NFSv4.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize lock manager."""
+        self.lock_dir: Optional[str] = None
+        self.timeout = 3600.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the lock manager to an application."""
+        self.lock_dir = app.config.get('LOCK_DIR') or os.path.join(app.instance_path, 'locks')
+        self.timeout = float(app.config.get('LOCK_TIMEOUT', 3600))
+        os.makedirs(self.lock_dir, exist_ok=True)
+        if fcntl is None:
+            logger.warning("fcntl is unavailable: locks only coordinate threads of a single process")
+        app.extensions['locks'] = self
+
+    def lock(self, name: str) -> FileLock:
+        """An unlocked handle on the lock of a name."""
+        assert self.lock_dir is not None
+        digest = hashlib.sha256(name.encode('utf-8')).hexdigest()[:32]
+        return FileLock(os.path.join(self.lock_dir, f'{digest}.lock'))
+
+    def try_claim(self, name: str) -> Optional[FileLock]:
+        """Take the lock of a name if nobody holds it.
+
+        Returns:
+            The held lock, which the caller must release, or None.
+        """
+        lock = self.lock(name)
+        return lock if lock.acquire(blocking=False) else None
+
+    @contextmanager
+    def hold(self, name: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold the lock of a name, waiting at most timeout (default LOCK_TIMEOUT) seconds.
+
+        Raises:
+            RuntimeError: If the lock could not be taken in time.
+        """
+        lock = self.lock(name)
+        if not lock.acquire(timeout=self.timeout if timeout is None else timeout):
+            raise RuntimeError(f"Timed out waiting for lock: {name}")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def prune(self, max_age: float, limit: int) -> int:
+        """Remove lock files nobody has taken for max_age seconds.
+
+        Args:
+            max_age: Seconds since a lock file was last taken.
+            limit: Most files to remove.
+
+        Returns:
+            The number of files removed.
+        """
+        assert self.lock_dir is not None
+        if fcntl is None or limit <= 0:
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        with os.scandir(self.lock_dir) as entries:
+            for entry in entries:
+                if removed >= limit:
+                    break
+                try:
+                    if not entry.name.endswith('.lock') or entry.stat().st_mtime >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                lock = FileLock(entry.path)
+                if lock.acquire(blocking=False):
+                    try:
+                        os.unlink(entry.path)
+                        removed += 1
+                    finally:
+                        lock.release()
+        return removed
+
+
+locks = LockManager()
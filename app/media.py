@@ -0,0 +1,156 @@
+# Standard library imports
+import mimetypes
+import os
+import stat
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+# Third-party imports
+from flask import Response, current_app, request
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+# Local imports
+from metrics import span
+
+SENDFILE_NONE = ''
+SENDFILE_X_SENDFILE = 'x-sendfile'
+SENDFILE_X_ACCEL = 'x-accel-redirect'
+
+# Types of the HLS preview files, missing from the default mimetypes table
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/iso.segment', '.m4s')
+
+# Seconds immutable media may be cached by the browser
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def make_etag(st: os.stat_result) -> str:
+    """Strong ETag of a file, derived from its inode, size and modification time."""
+    return f'{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}'
+
+
+def _iter_range(f: BinaryIO, start: int, length: int, chunk_size: int) -> Iterator[bytes]:
+    """Yield length bytes of a file starting at start, then close it."""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _requested_range(etag: str, st: os.stat_result) -> Optional[Tuple[int, int]]:
+    """Return the (start, stop) byte range to serve, or None for the whole file.
+
+    Multi-range requests and ranges whose If-Range validator no longer matches
+    fall back to the whole file. An unsatisfiable range is returned as
+    (size, size) so the caller can answer 416.
+    """
+    byte_range = request.range
+    if byte_range is None or len(byte_range.ranges) != 1:
+        return None
+
+    if 'If-Range' in request.headers:
+        if_range = request.if_range
+        if if_range.etag is not None:
+            if if_range.etag != etag:
+                return None
+        elif if_range.date is None or int(st.st_mtime) > if_range.date.timestamp():
+            return None
+
+    bounds = byte_range.range_for_length(st.st_size)
+    if bounds is None:
+        return st.st_size, st.st_size
+    return bounds
+
+
+def send_media(directory: str, filename: str, immutable: bool = False) -> Response:
+    """Serve a video file with Range, ETag and conditional request support.
+
+    The file is stat'ed once per request. If-None-Match is answered with 304
+    before the file is opened, single byte ranges with 206, and when
+    MEDIA_SENDFILE is set the body is left to the front-end server through
+    X-Sendfile or X-Accel-Redirect.
+
+    Args:
+        directory: Directory the file is served from.
+        filename: Path of the file relative to directory.
+        immutable: Whether the file never changes under its name, allowing
+            long-lived browser caching.
+
+    Returns:
+        The media response.
+
+    Raises:
+        FileNotFoundError: If the file does not exist or lies outside directory.
+    """
+    with span('serve'):
+        return _prepare_media(directory, filename, immutable)
+
+
+def _prepare_media(directory: str, filename: str, immutable: bool) -> Response:
+    """Build the response of send_media()."""
+    path = safe_join(directory, filename)
+    if path is None:
+        raise FileNotFoundError(f"Invalid media path: {filename}")
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"Media file not found: {path}")
+    if not stat.S_ISREG(st.st_mode):
+        raise FileNotFoundError(f"Media file not found: {path}")
+
+    etag = make_etag(st)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if immutable:
+        max_age = int(current_app.config.get('MEDIA_CACHE_MAX_AGE', IMMUTABLE_MAX_AGE))
+        cache_control = f'private, max-age={max_age}, immutable'
+    else:
+        cache_control = 'private, no-cache'
+
+    response = Response(mimetype=mimetype, direct_passthrough=True)
+    response.set_etag(etag)
+    response.headers['Last-Modified'] = http_date(st.st_mtime)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Accept-Ranges'] = 'bytes'
+
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    sendfile = current_app.config.get('MEDIA_SENDFILE', SENDFILE_NONE)
+    if sendfile == SENDFILE_X_SENDFILE:
+        response.headers['X-Sendfile'] = path
+        return response
+    if sendfile == SENDFILE_X_ACCEL:
+        prefix = current_app.config.get('MEDIA_ACCEL_PREFIX', '/_media').rstrip('/')
+        relative_path = os.path.relpath(path, current_app.root_path).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = quote(f'{prefix}/{relative_path}')
+        return response
+
+    bounds = _requested_range(etag, st)
+    if bounds is not None and bounds[0] >= st.st_size:
+        response.status_code = 416
+        response.headers['Content-Range'] = f'bytes */{st.st_size}'
+        return response
+
+    chunk_size = int(current_app.config.get('MEDIA_CHUNK_SIZE', 256 * 1024))
+    f = open(path, 'rb')
+    if bounds is None:
+        response.response = wrap_file(request.environ, f, chunk_size)
+        response.content_length = st.st_size
+        return response
+
+    start, stop = bounds
+    response.status_code = 206
+    response.response = _iter_range(f, start, stop - start, chunk_size)
+    response.content_length = stop - start
+    response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{st.st_size}'
+    return response
@@ -0,0 +1,124 @@
+# Standard library imports
+import json
+import logging
+import os
+from typing import Optional, cast
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from cutting import SourceIndex, keyframe_cache, probe_source
+from models import db, CachedSource, MediaInfo
+from source_cache import source_cache
+
+logger = logging.getLogger(__name__)
+
+# Slack allowed past the probed duration, for container/stream duration rounding
+DURATION_TOLERANCE = 0.05
+
+
+class MediaInfoCache:
+    """FFprobe results of source videos, probed once and persisted per source.
+
+    Lookups go through the in-memory keyframe cache first, then the
+    MediaInfo row of the cached source, and only run FFprobe when both miss
+    or the file changed since it was probed. Downloads without a cached
+    source are kept in memory only.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize cache."""
+        self.downloads_dir: Optional[str] = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the cache to an application."""
+        self.downloads_dir = os.path.join(app.root_path, 'downloads')
+        app.extensions['media_info'] = self
+
+    def get(self, input_path: str, source: Optional[CachedSource] = None) -> SourceIndex:
+        """Return the media info of a video file.
+
+        Args:
+            input_path: Absolute path of the video.
+            source: The cached source the file belongs to, if known.
+
+        Raises:
+            RuntimeError: If FFprobe fails.
+        """
+        return keyframe_cache.get(input_path, loader=lambda path: self._load(path, source))
+
+    def get_for_user(self, user_id: int, video_path: str) -> SourceIndex:
+        """Return the media info of one of a user's downloaded videos.
+
+        Args:
+            user_id: The user's ID.
+            video_path: The video path relative to downloads/.
+
+        Raises:
+            FileNotFoundError: If the video does not exist.
+            RuntimeError: If FFprobe fails.
+        """
+        assert self.downloads_dir is not None
+        input_path = os.path.join(self.downloads_dir, video_path)
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input video not found: {input_path}")
+        return keyframe_cache.get(
+            input_path,
+            loader=lambda path: self._load(path, source_cache.source_for_user(user_id, video_path))
+        )
+
+    def _load(self, input_path: str, source: Optional[CachedSource]) -> SourceIndex:
+        """Read persisted media info, probing and storing it when stale or missing."""
+        stat = os.stat(input_path)
+        row = cast(Optional[MediaInfo], source.media_info) if source is not None else None
+        if row is not None and row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns:
+            try:
+                return SourceIndex.from_dict(json.loads(row.data))
+            except (ValueError, TypeError) as e:
+                logger.warning("Discarding unreadable media info of source %s: %s", row.source_id, e)
+
+        index = probe_source(input_path)
+        if source is not None:
+            data = json.dumps(index.to_dict())
+            if row is None:
+                source.media_info = MediaInfo(source_id=source.id, size=stat.st_size, mtime_ns=stat.st_mtime_ns, data=data)
+            else:
+                row.size = stat.st_size
+                row.mtime_ns = stat.st_mtime_ns
+                row.data = data
+            db.session.commit()
+        return index
+
+
+def check_range(index: SourceIndex, start_time: float, end_time: float, label: str = 'Clip',
+                offset: float = 0.0) -> None:
+    """Reject a time range the source cannot satisfy, before any FFmpeg run.
+
+    Args:
+        index: The media info of the source.
+        start_time: Requested start in seconds of the file.
+        end_time: Requested end in seconds of the file.
+        label: How the range is named in error messages.
+        offset: Second of the original video at which the file starts;
+            error messages report times of the original video.
+
+    Raises:
+        ValueError: If the source has no video stream or the range lies outside it.
+    """
+    if index.video_codec is None:
+        raise ValueError("Input video has no video stream")
+    if start_time < 0:
+        raise ValueError(f"{label} starts at {start_time + offset:g}s, before the start of the downloaded video ({offset:.2f}s)")
+    if index.duration is None:
+        return
+    end_of_video = index.duration + offset
+    if start_time >= index.duration:
+        raise ValueError(f"{label} starts at {start_time + offset:g}s, after the end of the video ({end_of_video:.2f}s)")
+    if end_time > index.duration + DURATION_TOLERANCE:
+        raise ValueError(f"{label} ends at {end_time + offset:g}s, after the end of the video ({end_of_video:.2f}s)")
+
+
+media_info_cache = MediaInfoCache()
@@ -0,0 +1,316 @@
+# Standard library imports
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# Third-party imports
+from flask import Flask, g, has_request_context
+
+LabelValues = Tuple[str, ...]
+
+# One hot-path record logged in every _sample_every, set from LOG_SAMPLE_EVERY
+_sample_every = 1
+
+# Seconds; covers sub-millisecond cache hits up to long re-encodes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render a {name="value",...} label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base of the metric types: a name, help text and label names."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """Initialize metric."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        """Label values in declaration order."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """Exposition lines of the metric's samples."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """HELP, TYPE and sample lines."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """Initialize counter."""
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Add amount to the counter of a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        """Exposition lines of the metric's samples."""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[LabelValues, float]]] = None) -> None:
+        """Initialize gauge."""
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Raise the gauge of a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """Lower the gauge of a label set."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        """Set the gauge of a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_callback(self, callback: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Read the gauge from callback on every scrape instead of stored values."""
+        self._callback = callback
+
+    def samples(self) -> List[str]:
+        """Exposition lines of the metric's samples."""
+        if self._callback is not None:
+            values = sorted(self._callback().items())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in values]
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count of observations per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """Initialize histogram."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one observation."""
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        """Exposition lines of the metric's samples."""
+        with self._lock:
+            snapshot = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in snapshot:
+            for bound, cumulative in zip(self.buckets, itertools.accumulate(counts)):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {sum(counts)}')
+        return lines
+
+
+MetricT = TypeVar('MetricT', bound=Metric)
+
+
+class Registry:
+    """The metrics exposed by /metrics."""
+
+    def __init__(self) -> None:
+        """Initialize registry."""
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the registry to an application and apply its LOG_SAMPLE_EVERY to every SampledLogger."""
+        global _sample_every
+        _sample_every = max(1, int(app.config.get('LOG_SAMPLE_EVERY', 1)))
+        app.extensions['metrics'] = self
+
+    def register(self, metric: MetricT) -> MetricT:
+        """Add a metric; names must be unique."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        """Look a metric up by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """The Prometheus text exposition of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'cutter_stage_seconds', 'Time spent in each pipeline stage.', ['stage']
+))
+STAGE_ERRORS = registry.register(Counter(
+    'cutter_stage_errors_total', 'Pipeline stages that raised an exception.', ['stage']
+))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    'cutter_http_request_seconds', 'Time to produce an HTTP response, excluding streamed bodies.',
+    ['endpoint', 'method', 'status']
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    'cutter_queue_depth', 'Tasks submitted to a worker pool and not started yet.', ['queue']
+))
+QUEUE_ACTIVE = registry.register(Gauge(
+    'cutter_queue_active', 'Tasks a worker pool is running.', ['queue']
+))
+FFMPEG_PROCESSES = registry.register(Gauge(
+    'cutter_ffmpeg_processes', 'FFmpeg and FFprobe processes currently running.', ['tool']
+))
+FFMPEG_KILLED = registry.register(Counter(
+    'cutter_ffmpeg_killed_total', 'FFmpeg runs killed by the watchdog.', ['reason']
+))
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into cutter_stage_seconds.
+
+    Inside a request the span is also collected for its Server-Timing header.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if has_request_context():
+            g.setdefault('spans', []).append((stage, elapsed))
+
+
+def timed_iter(stage: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Time a streamed response body, from its first chunk until it is exhausted or closed."""
+    with span(stage):
+        yield from chunks
+
+
+@contextmanager
+def tracked_process(tool: str) -> Iterator[None]:
+    """Count a running FFmpeg/FFprobe process."""
+    FFMPEG_PROCESSES.inc(tool=tool)
+    try:
+        yield
+    finally:
+        FFMPEG_PROCESSES.dec(tool=tool)
+
+
+def queued(queue: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Count a task as queued until a worker starts fn, then as active until it returns.
+
+    Call it when submitting: executor.submit(queued('clips', self._run), job_id).
+    """
+    QUEUE_DEPTH.inc(queue=queue)
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        QUEUE_DEPTH.dec(queue=queue)
+        QUEUE_ACTIVE.inc(queue=queue)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            QUEUE_ACTIVE.dec(queue=queue)
+
+    return run
+
+
+def server_timing() -> Optional[str]:
+    """Server-Timing header value of the spans recorded during the request."""
+    spans = g.get('spans')
+    if not spans:
+        return None
+    return ', '.join(f'{stage};dur={elapsed * 1000:.1f}' for stage, elapsed in spans)
+
+
+class SampledLogger:
+    """Level-checked logger for hot paths that emits one record in every LOG_SAMPLE_EVERY calls.
+
+    The level check comes first, so disabled records cost neither formatting
+    nor the sampling counter.
+    """
+
+    def __init__(self, logger: logging.Logger) -> None:
+        """Initialize sampled logger."""
+        self.logger = logger
+        self._calls = itertools.count()
+
+    def debug(self, msg: str, *args: Any) -> None:
+        """Log at DEBUG, sampled."""
+        if self.logger.isEnabledFor(logging.DEBUG) and next(self._calls) % _sample_every == 0:
+            self.logger.debug(msg, *args)
+
+    def info(self, msg: str, *args: Any) -> None:
+        """Log at INFO, sampled."""
+        if self.logger.isEnabledFor(logging.INFO) and next(self._calls) % _sample_every == 0:
+            self.logger.info(msg, *args)
@@ -1,11 +1,47 @@
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import ColumnElement, Engine, event
+from sqlalchemy.orm import Mapped, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, cast
 from datetime import datetime
+import uuid
 
 db = SQLAlchemy()
 
+
+def column(attribute: Any) -> ColumnElement[Any]:
+    """A model column as a typed SQL expression, for operators such as in_().
+
+    Columns are annotated with the type of their value on instances, which
+    mypy also applies to the class attribute used in queries.
+    """
+    return cast(ColumnElement[Any], attribute)
+
+
+def configure_sqlite(engine: Engine, busy_timeout: float) -> None:
+    """Open SQLite databases in WAL mode so several processes can share them.
+
+    In WAL mode readers never block the single writer and vice versa, and a
+    writer that finds the database locked retries for busy_timeout seconds
+    instead of failing at once. Other databases are left untouched.
+
+    Args:
+        engine: The engine, before its first connection.
+        busy_timeout: Seconds a write waits for another process's write.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout * 1000)}')
+        # Com WAL, NORMAL só arrisca a última transação numa queda de energia
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
 class User(UserMixin, db.Model):
     """User model for authentication."""
     
@@ -37,4 +73,376 @@ class User(UserMixin, db.Model):
 
     def __repr__(self) -> str:
         """String representation."""
-        return f'<User {self.username}>' 
\ No newline at end of file
+        return f'<User {self.username}>' 
+
+class ClipJob(db.Model):
+    """Background clip generation job submitted through /api/generate-clips."""
+
+    __tablename__ = 'clip_jobs'
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id: str = db.Column(db.String(32), primary_key=True)
+    user_id: int = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    video_path: str = db.Column(db.String(512), nullable=False)
+    cut_mode: str = db.Column(db.String(20), nullable=False, default='auto')
+    status: str = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    # Início do arquivo no vídeo original: os tempos dos itens são do vídeo original
+    time_offset: float = db.Column(db.Float, nullable=False, default=0.0)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # relationship() do SQLAlchemy, ao contrário de db.relationship(), tem o tipo que Mapped[] espera
+    items: Mapped[List['ClipJobItem']] = relationship(
+        'ClipJobItem',
+        backref='job',
+        order_by='ClipJobItem.position',
+        cascade='all, delete-orphan'
+    )
+
+    def __init__(self, user_id: int, video_path: str, cut_mode: str = 'auto', time_offset: float = 0.0) -> None:
+        """Initialize job."""
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.video_path = video_path
+        self.cut_mode = cut_mode
+        self.time_offset = time_offset
+        self.status = self.QUEUED
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether every clip of the job reached a final state."""
+        return self.status in (self.DONE, self.FAILED)
+
+    def refresh_status(self) -> None:
+        """Derive the job status from the status of its clips."""
+        statuses = {item.status for item in self.items}
+        if statuses <= {self.DONE, self.FAILED}:
+            self.status = self.DONE if self.DONE in statuses else self.FAILED
+        elif statuses == {self.QUEUED}:
+            self.status = self.QUEUED
+        else:
+            self.status = self.RUNNING
+
+    def to_dict(self, live: Optional[Dict[int, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Serialize job progress for the status endpoint.
+
+        Args:
+            live: Live progress of running clips keyed by item ID, as kept by
+                the progress hub; running clips count by their fraction done.
+        """
+        live = live or {}
+        completed = sum(1 for item in self.items if item.status in (self.DONE, self.FAILED))
+        partial = sum(live[item.id]['fraction'] for item in self.items
+                      if item.status == self.RUNNING and item.id in live)
+        total = len(self.items)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'cutMode': self.cut_mode,
+            'completed': completed,
+            'total': total,
+            'progress': round(100.0 * (completed + partial) / total, 1) if total else 0.0,
+            'clips': [item.to_dict(live.get(item.id)) for item in self.items],
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<ClipJob {self.id} {self.status}>'
+
+
+class ClipJobItem(db.Model):
+    """A single clip range belonging to a ClipJob."""
+
+    __tablename__ = 'clip_job_items'
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    job_id: str = db.Column(db.String(32), db.ForeignKey('clip_jobs.id'), nullable=False, index=True)
+    position: int = db.Column(db.Integer, nullable=False)
+    name: str = db.Column(db.String(255), nullable=False)
+    start_time: float = db.Column(db.Float, nullable=False)
+    end_time: float = db.Column(db.Float, nullable=False)
+    status: str = db.Column(db.String(20), nullable=False, default=ClipJob.QUEUED)
+    strategy: Optional[str] = db.Column(db.String(20))
+    output_filename: Optional[str] = db.Column(db.String(512))
+    error: Optional[str] = db.Column(db.Text)
+
+    def __init__(self, position: int, name: str, start_time: float, end_time: float) -> None:
+        """Initialize job item."""
+        self.position = position
+        self.name = name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.status = ClipJob.QUEUED
+
+    def to_dict(self, live: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Serialize clip progress.
+
+        Args:
+            live: Fraction done, speed, fps and ETA of the clip while it runs.
+        """
+        return {
+            'name': self.name,
+            'startTime': self.start_time,
+            'endTime': self.end_time,
+            'status': self.status,
+            'strategy': self.strategy,
+            'error': self.error,
+            'progress': live if self.status == ClipJob.RUNNING else None
+        }
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<ClipJobItem {self.job_id}#{self.position} {self.status}>'
+
+
+class CachedSource(db.Model):
+    """A downloaded video shared by every user who submitted it."""
+
+    __tablename__ = 'cached_sources'
+    __table_args__ = (db.UniqueConstraint('extractor', 'video_id', 'format'),)
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    extractor: str = db.Column(db.String(64), nullable=False)
+    video_id: str = db.Column(db.String(255), nullable=False)
+    format: str = db.Column(db.String(255), nullable=False)
+    title: str = db.Column(db.String(512), nullable=False)
+    path: str = db.Column(db.String(1024), nullable=False)
+    size: int = db.Column(db.BigInteger, nullable=False, default=0)
+    # Segundo do vídeo original em que o arquivo começa; 0 para downloads completos
+    section_start: float = db.Column(db.Float, nullable=False, default=0.0)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    references = db.relationship('SourceVideo', backref='source')
+    assets: Mapped[List['SourceAsset']] = relationship('SourceAsset', backref='source', cascade='all, delete-orphan')
+    media_info = db.relationship('MediaInfo', backref='source', uselist=False, cascade='all, delete-orphan')
+
+    def __init__(self, extractor: str, video_id: str, format: str, title: str, path: str, size: int,
+                 section_start: float = 0.0) -> None:
+        """Initialize cached source."""
+        self.extractor = extractor
+        self.video_id = video_id
+        self.format = format
+        self.title = title
+        self.path = path
+        self.size = size
+        self.section_start = section_start
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<CachedSource {self.extractor}:{self.video_id} {self.format}>'
+
+
+class SourceVideo(db.Model):
+    """A user's reference to a downloaded video under downloads/<user_id>/."""
+
+    __tablename__ = 'source_videos'
+    __table_args__ = (db.UniqueConstraint('user_id', 'video_path'),)
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    user_id: int = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    source_id: Optional[int] = db.Column(db.Integer, db.ForeignKey('cached_sources.id'), index=True)
+    video_path: str = db.Column(db.String(1024), nullable=False)
+    title: str = db.Column(db.String(512), nullable=False)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __init__(self, user_id: int, video_path: str, title: str, source_id: Optional[int] = None) -> None:
+        """Initialize source video."""
+        self.user_id = user_id
+        self.video_path = video_path
+        self.title = title
+        self.source_id = source_id
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<SourceVideo {self.video_path}>'
+
+
+class Clip(db.Model):
+    """A clip produced from one of a user's videos, stored under static/processed/<user_id>/."""
+
+    __tablename__ = 'clips'
+    __table_args__ = (db.Index('ix_clips_user_video', 'user_id', 'video_path'),)
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    user_id: int = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    video_path: str = db.Column(db.String(1024), nullable=False)
+    name: str = db.Column(db.String(255), nullable=False)
+    start_time: float = db.Column(db.Float, nullable=False)
+    end_time: float = db.Column(db.Float, nullable=False)
+    path: str = db.Column(db.String(1024), unique=True, nullable=False)
+    size: int = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __init__(self, user_id: int, video_path: str, name: str, start_time: float, end_time: float,
+                 path: str, size: int) -> None:
+        """Initialize clip."""
+        self.user_id = user_id
+        self.video_path = video_path
+        self.name = name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.path = path
+        self.size = size
+
+    @property
+    def filename(self) -> str:
+        """Name of the clip file inside the user's directory."""
+        return self.path.rsplit('/', 1)[-1]
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<Clip {self.path}>'
+
+
+class DownloadTask(db.Model):
+    """Background download of a submitted video URL."""
+
+    __tablename__ = 'download_tasks'
+
+    QUEUED = 'queued'
+    DOWNLOADING = 'downloading'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id: str = db.Column(db.String(32), primary_key=True)
+    user_id: int = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    url: str = db.Column(db.String(2048), nullable=False)
+    status: str = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    downloaded_bytes: int = db.Column(db.BigInteger, nullable=False, default=0)
+    total_bytes: Optional[int] = db.Column(db.BigInteger)
+    speed: Optional[float] = db.Column(db.Float)
+    eta: Optional[float] = db.Column(db.Float)
+    title: Optional[str] = db.Column(db.String(512))
+    video_path: Optional[str] = db.Column(db.String(1024))
+    error: Optional[str] = db.Column(db.Text)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    section = db.relationship('DownloadSection', uselist=False, cascade='all, delete-orphan')
+
+    def __init__(self, user_id: int, url: str) -> None:
+        """Initialize download task."""
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.url = url
+        self.status = self.QUEUED
+        self.downloaded_bytes = 0
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether the download reached a final state."""
+        return self.status in (self.DONE, self.FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize download progress."""
+        progress = None
+        if self.status == self.DONE:
+            progress = 100.0
+        elif self.total_bytes:
+            progress = round(100.0 * self.downloaded_bytes / self.total_bytes, 1)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'downloadedBytes': self.downloaded_bytes,
+            'totalBytes': self.total_bytes,
+            'progress': progress,
+            'speed': self.speed,
+            'eta': self.eta,
+            'title': self.title,
+            'videoPath': self.video_path,
+            'error': self.error,
+            'section': self.section.to_dict() if self.section is not None else None
+        }
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<DownloadTask {self.id} {self.status}>'
+
+
+class DownloadSection(db.Model):
+    """Time window of a clip-first download: only this part of the video is fetched."""
+
+    __tablename__ = 'download_sections'
+
+    task_id: str = db.Column(db.String(32), db.ForeignKey('download_tasks.id'), primary_key=True)
+    start_time: float = db.Column(db.Float, nullable=False)
+    end_time: float = db.Column(db.Float, nullable=False)
+
+    def __init__(self, start_time: float, end_time: float) -> None:
+        """Initialize download section."""
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the requested window."""
+        return {
+            'startTime': self.start_time,
+            'endTime': self.end_time
+        }
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<DownloadSection {self.task_id} {self.start_time}-{self.end_time}>'
+
+
+class SourceAsset(db.Model):
+    """A derived rendition of a cached source, such as the editor preview proxy."""
+
+    __tablename__ = 'source_assets'
+    __table_args__ = (db.UniqueConstraint('source_id', 'kind'),)
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    source_id: int = db.Column(db.Integer, db.ForeignKey('cached_sources.id'), nullable=False, index=True)
+    kind: str = db.Column(db.String(32), nullable=False)
+    status: str = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    error: Optional[str] = db.Column(db.Text)
+    created_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, source_id: int, kind: str) -> None:
+        """Initialize source asset."""
+        self.source_id = source_id
+        self.kind = kind
+        self.status = self.QUEUED
+
+    @property
+    def is_finished(self) -> bool:
+        """Whether the asset reached a final state."""
+        return self.status in (self.DONE, self.FAILED)
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<SourceAsset {self.source_id} {self.kind} {self.status}>'
+
+
+class MediaInfo(db.Model):
+    """FFprobe results of a cached source, valid while its size and mtime match."""
+
+    __tablename__ = 'media_info'
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    source_id: int = db.Column(db.Integer, db.ForeignKey('cached_sources.id'), unique=True, nullable=False)
+    size: int = db.Column(db.BigInteger, nullable=False)
+    mtime_ns: int = db.Column(db.BigInteger, nullable=False)
+    data: str = db.Column(db.Text, nullable=False)
+    updated_at: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, source_id: int, size: int, mtime_ns: int, data: str) -> None:
+        """Initialize media info."""
+        self.source_id = source_id
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.data = data
+
+    def __repr__(self) -> str:
+        """String representation."""
+        return f'<MediaInfo {self.source_id}>'
@@ -0,0 +1,325 @@
+# Standard library imports
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from analysis import ANALYSIS_FILENAME, analyzer
+from cutting import run_ffmpeg
+from dispatcher import runs_workers
+from locks import FileLock, locks
+from media_info import media_info_cache
+from metrics import queued, span
+from models import db, column, CachedSource, SourceAsset
+from source_cache import source_cache
+from timeline import MANIFEST_FILENAME, build_timeline
+from transcoding import PROFILE_PREVIEW, transcoder
+
+logger = logging.getLogger(__name__)
+
+ASSET_PROXY = 'proxy'
+ASSET_HLS = 'hls'
+ASSET_TIMELINE = 'timeline'
+ASSET_ANALYSIS = 'analysis'
+ASSET_KINDS = (ASSET_PROXY, ASSET_HLS, ASSET_TIMELINE, ASSET_ANALYSIS)
+
+PROXY_FILENAME = 'proxy.mp4'
+HLS_DIRNAME = 'hls'
+HLS_PLAYLIST = 'index.m3u8'
+TIMELINE_DIRNAME = 'timeline'
+
+
+class PreviewQueue:
+    """Worker pool that renders lightweight preview renditions of cached sources.
+
+    The proxy is a low-resolution H.264 MP4 with a keyframe every
+    PREVIEW_KEYFRAME_INTERVAL seconds, so the editor player can seek without
+    pulling the full-quality original. With PREVIEW_HLS enabled the proxy is
+    also segmented into a VOD HLS playlist with fMP4 segments. A timeline
+    index (thumbnail sprites, WebVTT map and audio peaks) is then built from
+    the proxy for scrubbing, and with ANALYSIS_ENABLED the proxy is scanned
+    for shot boundaries and silences to suggest clips. Renditions are stored
+    once per cached source and shared by every user who references it; clips
+    are still cut from the original. The renditions of a source are rendered
+    by whichever process holds its lock, so worker processes never render
+    the same files at once.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize queue."""
+        self.app: Optional[Flask] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._claims: Dict[int, FileLock] = {}
+        self._lock = threading.Lock()
+        self.enabled = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the queue to an application and start the worker pool."""
+        self.app = app
+        max_workers = int(app.config.get('PREVIEW_WORKERS', 1))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='preview-worker')
+        self.enabled = runs_workers(app)
+        app.extensions['previews'] = self
+
+    def kinds(self) -> List[str]:
+        """Asset kinds rendered for every source."""
+        assert self.app is not None
+        kinds = [ASSET_PROXY, ASSET_TIMELINE]
+        if self.app.config.get('PREVIEW_HLS'):
+            kinds.insert(1, ASSET_HLS)
+        if self.app.config.get('ANALYSIS_ENABLED'):
+            kinds.append(ASSET_ANALYSIS)
+        return kinds
+
+    def submit(self, source: CachedSource) -> None:
+        """Queue the preview renditions of a source that are not ready yet."""
+        if self._executor is None:
+            raise RuntimeError("PreviewQueue is not initialized")
+
+        queued = False
+        existing = {asset.kind: asset for asset in source.assets}
+        for kind in self.kinds():
+            asset = existing.get(kind)
+            if asset is None:
+                source.assets.append(SourceAsset(source_id=source.id, kind=kind))
+                queued = True
+            elif asset.status == SourceAsset.FAILED or (
+                asset.status == SourceAsset.DONE and not os.path.exists(self.asset_path(source, kind))
+            ):
+                asset.status = SourceAsset.QUEUED
+                asset.error = None
+                queued = True
+            elif asset.status != SourceAsset.DONE:
+                queued = True
+        db.session.commit()
+
+        if queued:
+            self._schedule(source.id)
+
+    def resume_pending(self) -> int:
+        """Claim and re-queue unfinished renditions that no process is rendering.
+
+        Returns:
+            The number of sources that were re-queued.
+        """
+        source_ids = {
+            asset.source_id for asset in SourceAsset.query.filter(
+                column(SourceAsset.kind).in_(ASSET_KINDS),
+                column(SourceAsset.status).in_([SourceAsset.QUEUED, SourceAsset.RUNNING])
+            ).all()
+        }
+        resumed = sum(1 for source_id in source_ids if self._schedule(source_id))
+        if resumed:
+            logger.info("Resumed previews of %d sources", resumed)
+        return resumed
+
+    def asset_path(self, source: CachedSource, kind: str) -> str:
+        """Absolute path of the file the player loads for an asset kind."""
+        asset_dir = source_cache.asset_dir(source)
+        if kind == ASSET_HLS:
+            return os.path.join(asset_dir, HLS_DIRNAME, HLS_PLAYLIST)
+        if kind == ASSET_TIMELINE:
+            return os.path.join(asset_dir, TIMELINE_DIRNAME, MANIFEST_FILENAME)
+        if kind == ASSET_ANALYSIS:
+            return os.path.join(asset_dir, ANALYSIS_FILENAME)
+        return os.path.join(asset_dir, PROXY_FILENAME)
+
+    def status(self, source: CachedSource) -> Dict[str, Optional[str]]:
+        """Status and asset-relative filename of each preview rendition.
+
+        Returns:
+            A dict with 'status' (the proxy status) and, for each finished
+            rendition, its filename relative to the source's asset directory.
+        """
+        assets = {asset.kind: asset for asset in source.assets}
+        proxy = assets.get(ASSET_PROXY)
+        result: Dict[str, Optional[str]] = {
+            'status': proxy.status if proxy is not None else None,
+            'error': proxy.error if proxy is not None else None,
+            ASSET_PROXY: None,
+            ASSET_HLS: None,
+            ASSET_TIMELINE: None,
+            ASSET_ANALYSIS: None
+        }
+        for kind in ASSET_KINDS:
+            asset = assets.get(kind)
+            if asset is not None and asset.status == SourceAsset.DONE:
+                result[kind] = os.path.relpath(self.asset_path(source, kind), source_cache.asset_dir(source)).replace(os.sep, '/')
+        return result
+
+    def _schedule(self, source_id: int) -> bool:
+        """Claim a source and submit it to the pool unless some process already renders it.
+
+        In a web process nothing is submitted; a worker process claims the
+        source instead.
+
+        Returns:
+            Whether the source was submitted.
+        """
+        assert self._executor is not None
+        if not self.enabled:
+            return False
+        with self._lock:
+            if source_id in self._claims:
+                return False
+            lock = locks.try_claim(f'previews:{source_id}')
+            if lock is None:
+                return False
+            self._claims[source_id] = lock
+        self._executor.submit(queued('previews', self._run), source_id)
+        return True
+
+    def _run(self, source_id: int) -> None:
+        """Render the pending preview renditions of a source."""
+        assert self.app is not None
+        with self.app.app_context():
+            try:
+                source: Optional[CachedSource] = db.session.get(CachedSource, source_id)
+                if source is None:
+                    return
+                for kind in ASSET_KINDS:
+                    asset = next((a for a in source.assets if a.kind == kind), None)
+                    if asset is None or asset.status == SourceAsset.DONE:
+                        continue
+                    self._render(source, asset)
+            except Exception as e:
+                logger.error("Unexpected error rendering previews of source %s: %s", source_id, str(e), exc_info=True)
+            finally:
+                with self._lock:
+                    self._claims.pop(source_id).release()
+
+    def _render(self, source: CachedSource, asset: SourceAsset) -> None:
+        """Render one asset and record its outcome."""
+        asset.status = SourceAsset.RUNNING
+        asset.error = None
+        db.session.commit()
+
+        asset_dir = source_cache.asset_dir(source)
+        try:
+            os.makedirs(asset_dir, exist_ok=True)
+            with span(f'preview_{asset.kind}'):
+                if asset.kind == ASSET_HLS:
+                    self._render_hls(asset_dir)
+                elif asset.kind == ASSET_TIMELINE:
+                    self._render_timeline(source_cache.source_path(source), asset_dir)
+                elif asset.kind == ASSET_ANALYSIS:
+                    self._render_analysis(source, asset_dir)
+                else:
+                    self._render_proxy(source_cache.source_path(source), asset_dir)
+            asset.status = SourceAsset.DONE
+            logger.debug("Rendered %s preview of source %s", asset.kind, source.id)
+        except Exception as e:
+            # Qualquer falha vira FAILED: um asset deixado em RUNNING seria retomado por resume_pending para sempre
+            logger.error("Error rendering %s preview of source %s: %s", asset.kind, source.id, str(e),
+                         exc_info=not isinstance(e, (RuntimeError, FileNotFoundError)))
+            db.session.rollback()
+            asset.status = SourceAsset.FAILED
+            asset.error = str(e)
+        db.session.commit()
+
+    def _render_proxy(self, input_path: str, asset_dir: str) -> None:
+        """Transcode the low-resolution, short-GOP proxy."""
+        assert self.app is not None
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Source file not found: {input_path}")
+
+        config = self.app.config
+        height = int(config.get('PREVIEW_HEIGHT', 360))
+        interval = float(config.get('PREVIEW_KEYFRAME_INTERVAL', 1.0))
+        temp_path = os.path.join(asset_dir, f'.{PROXY_FILENAME}.tmp.mp4')
+        try:
+            with transcoder.slot():
+                run_ffmpeg([
+                    'ffmpeg', '-y', '-i', input_path,
+                    '-map', '0:v:0', '-map', '0:a:0?',
+                    '-vf', f"scale=-2:'min({height},ih)'",
+                    '-c:v', 'libx264', *transcoder.options(PROFILE_PREVIEW, height),
+                    '-pix_fmt', 'yuv420p',
+                    '-force_key_frames', f'expr:gte(t,n_forced*{interval})',
+                    '-c:a', 'aac', '-b:a', '96k', '-ac', '2',
+                    '-movflags', '+faststart', temp_path
+                ])
+            os.replace(temp_path, os.path.join(asset_dir, PROXY_FILENAME))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _render_hls(self, asset_dir: str) -> None:
+        """Segment the proxy into a VOD HLS playlist without re-encoding."""
+        assert self.app is not None
+        proxy_path = os.path.join(asset_dir, PROXY_FILENAME)
+        if not os.path.exists(proxy_path):
+            raise FileNotFoundError(f"Proxy not found: {proxy_path}")
+
+        hls_dir = os.path.join(asset_dir, HLS_DIRNAME)
+        temp_dir = os.path.join(asset_dir, f'.{HLS_DIRNAME}.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        try:
+            run_ffmpeg([
+                'ffmpeg', '-y', '-i', proxy_path, '-c', 'copy',
+                '-f', 'hls', '-hls_time', str(self.app.config.get('PREVIEW_HLS_SEGMENT', 4)),
+                '-hls_playlist_type', 'vod', '-hls_segment_type', 'fmp4',
+                '-hls_fmp4_init_filename', 'init.mp4',
+                '-hls_segment_filename', os.path.join(temp_dir, 'segment_%05d.m4s'),
+                os.path.join(temp_dir, HLS_PLAYLIST)
+            ])
+            shutil.rmtree(hls_dir, ignore_errors=True)
+            os.replace(temp_dir, hls_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _render_timeline(self, input_path: str, asset_dir: str) -> None:
+        """Build the scrubbing index, from the proxy when it exists."""
+        assert self.app is not None
+        proxy_path = os.path.join(asset_dir, PROXY_FILENAME)
+        if os.path.exists(proxy_path):
+            input_path = proxy_path
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Source file not found: {input_path}")
+
+        config = self.app.config
+        timeline_dir = os.path.join(asset_dir, TIMELINE_DIRNAME)
+        temp_dir = os.path.join(asset_dir, f'.{TIMELINE_DIRNAME}.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        try:
+            with transcoder.slot():
+                build_timeline(
+                    input_path, temp_dir,
+                    interval=float(config.get('TIMELINE_INTERVAL', 2.0)),
+                    thumb_width=int(config.get('TIMELINE_THUMB_WIDTH', 160)),
+                    columns=int(config.get('TIMELINE_COLUMNS', 10)),
+                    rows=int(config.get('TIMELINE_ROWS', 10)),
+                    peaks_per_second=int(config.get('TIMELINE_PEAKS_PER_SECOND', 50))
+                )
+            shutil.rmtree(timeline_dir, ignore_errors=True)
+            os.replace(temp_dir, timeline_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _render_analysis(self, source: CachedSource, asset_dir: str) -> None:
+        """Detect shot boundaries and silences, from the proxy when it exists."""
+        input_path = source_cache.source_path(source)
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Source file not found: {input_path}")
+        # A duração e as faixas vêm da sondagem já feita no download
+        index = media_info_cache.get(input_path, source)
+        if not index.duration:
+            raise RuntimeError(f"Unknown duration of source {source.id}")
+        proxy_path = os.path.join(asset_dir, PROXY_FILENAME)
+        if os.path.exists(proxy_path):
+            input_path = proxy_path
+        analyzer.analyze(input_path, os.path.join(asset_dir, ANALYSIS_FILENAME),
+                         index.duration, index.audio_codec is not None)
+
+
+previews = PreviewQueue()
@@ -0,0 +1,146 @@
+# Standard library imports
+import itertools
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from cutting import FFmpegProgress
+
+# Minimum time between two published updates of the same clips
+PUBLISH_INTERVAL = 0.25
+
+
+class ProgressTracker:
+    """Turns FFmpeg and engine progress of some clips into fractions, speed and ETA."""
+
+    def __init__(self, hub: 'ProgressHub', job_id: str, item_ids: Iterable[int], duration: float) -> None:
+        """Initialize tracker.
+
+        Args:
+            hub: Where updates are published.
+            job_id: The clip job.
+            item_ids: The clips written by the tracked run.
+            duration: Seconds of output the run writes, the 100% mark of out_time.
+        """
+        self.hub = hub
+        self.job_id = job_id
+        self.item_ids = list(item_ids)
+        self.duration = max(duration, 0.001)
+        self.started = time.monotonic()
+        self._done = 0.0
+        self._published = 0.0
+
+    def fraction(self, done: float, speed: Optional[float] = None, fps: Optional[float] = None) -> None:
+        """Record the completed fraction of the run.
+
+        Fractions never go back, so runs made of several FFmpeg passes report
+        a steady bar.
+        """
+        done = min(max(done, self._done), 1.0)
+        now = time.monotonic()
+        if done < 1.0 and now - self._published < PUBLISH_INTERVAL:
+            self._done = done
+            return
+        self._done = done
+        self._published = now
+
+        remaining = (1.0 - done) * self.duration
+        if speed:
+            eta: Optional[float] = remaining / speed
+        elif done > 0:
+            # Sem velocidade do FFmpeg (cópia no engine): extrapolar o tempo decorrido
+            eta = (now - self.started) * (1.0 - done) / done
+        else:
+            eta = None
+        self.hub.publish(self.job_id, self.item_ids, {
+            'fraction': round(done, 4),
+            'outTime': round(done * self.duration, 3),
+            'speed': speed,
+            'fps': fps,
+            'eta': round(eta, 1) if eta is not None else None,
+            'elapsed': round(now - self.started, 1)
+        })
+
+    def ffmpeg(self, progress: FFmpegProgress) -> None:
+        """Record a block of FFmpeg -progress output."""
+        self.fraction(progress.out_time / self.duration, progress.speed, progress.fps)
+
+
+class ProgressHub:
+    """Live progress of running clips, published to the job event streams.
+
+    Only clips that are running have an entry; the database keeps their
+    status. Every change bumps a per-job version that event streams wait on,
+    so they wake up as soon as there is something new to send.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize hub."""
+        self._progress: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._counter = itertools.count(1)
+        self._changed = threading.Condition()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the hub to an application."""
+        app.extensions['progress_hub'] = self
+
+    def tracker(self, job_id: str, item_ids: Iterable[int], duration: float) -> ProgressTracker:
+        """A tracker publishing the progress of a run writing some clips of a job."""
+        return ProgressTracker(self, job_id, item_ids, duration)
+
+    def publish(self, job_id: str, item_ids: Iterable[int], progress: Dict[str, Any]) -> None:
+        """Set the live progress of some clips."""
+        with self._changed:
+            items = self._progress.setdefault(job_id, {})
+            for item_id in item_ids:
+                items[item_id] = progress
+            self._versions[job_id] = next(self._counter)
+            self._changed.notify_all()
+
+    def clear(self, job_id: str, item_ids: Iterable[int]) -> None:
+        """Drop the live progress of clips that changed status and wake the streams."""
+        with self._changed:
+            items = self._progress.get(job_id, {})
+            for item_id in item_ids:
+                items.pop(item_id, None)
+            if not items:
+                self._progress.pop(job_id, None)
+            self._versions[job_id] = next(self._counter)
+            self._changed.notify_all()
+
+    def snapshot(self, job_id: str) -> Dict[int, Dict[str, Any]]:
+        """Live progress of the running clips of a job, keyed by item ID."""
+        with self._changed:
+            return dict(self._progress.get(job_id, {}))
+
+    def version(self, job_id: str) -> int:
+        """Current version of a job's progress."""
+        with self._changed:
+            return self._versions.get(job_id, 0)
+
+    def wait(self, job_id: str, version: int, timeout: float) -> int:
+        """Block until the job's progress moves past version or timeout elapses.
+
+        Returns:
+            The version at wake-up.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(job_id, 0) != version, timeout)
+            return self._versions.get(job_id, 0)
+
+    def forget(self, job_id: str) -> None:
+        """Release the bookkeeping of a finished job."""
+        with self._changed:
+            self._progress.pop(job_id, None)
+            self._versions.pop(job_id, None)
+            self._changed.notify_all()
+
+
+progress_hub = ProgressHub()
@@ -0,0 +1,220 @@
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+# Third-party imports
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """Size-bounded LRU cache of rendered edits, addressed by content key.
+
+    The key hashes the identity of the source file (device, inode, size and
+    modification time) together with the normalized edit parameters, so a
+    repeated request maps to the same output file. Each entry is stored as
+    <key>.mp4 with a <key>.json sidecar holding render metadata; the file
+    access time is refreshed on every hit so the LRU order survives restarts.
+    Entries stored by other processes sharing the directory are adopted on
+    their first lookup; each process enforces the budget over the entries
+    it knows.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize cache."""
+        self.cache_dir: Optional[str] = None
+        self.max_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the cache to an application and load existing entries."""
+        self.cache_dir = os.path.join(app.root_path, 'static', 'renders')
+        self.max_bytes = int(app.config.get('RENDER_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        app.extensions['render_cache'] = self
+
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(filename)
+            if ext != '.mp4' or '.' in key:
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, filename))
+            entries.append((max(stat.st_atime, stat.st_mtime), key, stat.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            for _, key, size in sorted(entries):
+                self._entries[key] = size
+                self._total_bytes += size
+            self._evict()
+
+    @staticmethod
+    def make_key(input_path: str, params: Dict[str, Any], other_inputs: Sequence[str] = ()) -> str:
+        """Build the cache key of a render.
+
+        Args:
+            input_path: Absolute path of the source video.
+            params: Normalized edit parameters.
+            other_inputs: Further sources of a render joining several videos.
+
+        Returns:
+            A hex digest identifying the render.
+        """
+        stat = os.stat(input_path)
+        identity: Dict[str, Any] = {
+            'source': [stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns],
+            'params': params
+        }
+        if other_inputs:
+            identity['sources'] = [
+                [other.st_dev, other.st_ino, other.st_size, other.st_mtime_ns]
+                for other in map(os.stat, other_inputs)
+            ]
+        return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def filename(self, key: str) -> str:
+        """Name of the cached output relative to the cache directory."""
+        return f'{key}.mp4'
+
+    def path(self, key: str) -> str:
+        """Absolute path of the cached output."""
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, self.filename(key))
+
+    def temp_path(self, key: str) -> str:
+        """Unique path to render into before the output is stored."""
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, f'{key}.{uuid.uuid4().hex}.tmp.mp4')
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the metadata of a cached render and mark it as recently used.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The metadata stored with the render, or None on a miss.
+        """
+        output_path = self.path(key)
+        with self._lock:
+            if key not in self._entries:
+                try:
+                    size = os.path.getsize(output_path)
+                    self._entries[key] = size
+                    self._total_bytes += size
+                except OSError:
+                    pass
+            if key not in self._entries or not os.path.exists(output_path):
+                if key in self._entries:
+                    self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        try:
+            os.utime(output_path)
+            with open(self._metadata_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def store(self, key: str, rendered_path: str, metadata: Dict[str, Any]) -> str:
+        """Move a finished render into the cache.
+
+        Args:
+            key: The cache key.
+            rendered_path: Path of the rendered file, usually from temp_path().
+            metadata: JSON-serializable data returned on later hits.
+
+        Returns:
+            The absolute path of the cached output.
+        """
+        output_path = self.path(key)
+        with open(self._metadata_path(key), 'w') as f:
+            json.dump(metadata, f)
+        os.replace(rendered_path, output_path)
+        size = os.path.getsize(output_path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+        return output_path
+
+    def tee(self, key: str, chunks: Iterable[bytes], metadata: Dict[str, Any]) -> Iterator[bytes]:
+        """Pass a streamed render through while writing it into the cache.
+
+        The render is stored only once the stream is exhausted; a stream
+        that fails or is closed early leaves nothing behind.
+
+        Args:
+            key: The cache key.
+            chunks: The render as it is produced.
+            metadata: JSON-serializable data returned on later hits.
+        """
+        rendered_path = self.temp_path(key)
+        try:
+            with open(rendered_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            self.store(key, rendered_path, metadata)
+        finally:
+            if os.path.exists(rendered_path):
+                os.remove(rendered_path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters used to size the cache disk budget."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'maxBytes': self.max_bytes
+            }
+
+    def _metadata_path(self, key: str) -> str:
+        """Absolute path of the metadata sidecar of an entry."""
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits its budget.
+
+        Must be called with the lock held. The most recent entry is kept even
+        if it alone exceeds the budget.
+        """
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            for path in (self.path(key), self._metadata_path(key)):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning("Could not remove cached render %s: %s", path, e)
+
+
+render_cache = RenderCache()
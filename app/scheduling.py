@@ -0,0 +1,311 @@
+# Standard library imports
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, NamedTuple, Optional
+
+# Third-party imports
+from flask import Flask
+from sqlalchemy import func
+
+# Local imports
+from locks import locks
+from metrics import Counter, Gauge, registry
+from models import db, column, ClipJob, ClipJobItem, DownloadTask, User
+from transcoding import transcoder
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHT = 1.0
+
+
+def parse_role_weights(value: str) -> Dict[str, float]:
+    """Parse a 'role:weight,role:weight' table such as 'admin:4,user:1'."""
+    weights: Dict[str, float] = {}
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        role, _, weight = entry.partition(':')
+        weights[role.strip()] = float(weight)
+    return weights
+
+
+class Overloaded(Exception):
+    """Work refused because the deployment cannot start it soon.
+
+    Attributes:
+        retry_after: Seconds after which the client may try again.
+    """
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        """Initialize error."""
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Task(NamedTuple):
+    """A submitted task waiting for a worker."""
+
+    start_tag: float
+    fn: Callable[..., Any]
+    args: tuple
+
+
+class FairExecutor:
+    """Worker pool that shares its threads between users by weighted fair queuing.
+
+    Each user has a FIFO of tasks. A task gets a virtual start tag when it is
+    submitted, max(virtual time, finish tag of the user's previous task), and
+    its finish tag adds cost / weight, so a user's backlog is spread over
+    virtual time in proportion to the work it represents and the user's
+    weight. Free workers take the task with the lowest start tag among users
+    below the per-user limit. A user posting hundreds of clips therefore
+    delays other users' jobs by at most a fair share instead of the whole
+    backlog, and heavier tiers get proportionally more of the pool.
+    """
+
+    def __init__(self, max_workers: int, user_limit: int, thread_name_prefix: str) -> None:
+        """Initialize executor.
+
+        Args:
+            max_workers: Tasks running at once across all users.
+            user_limit: Tasks of a single user running at once.
+            thread_name_prefix: Name prefix of the worker threads.
+        """
+        self.max_workers = max(1, max_workers)
+        self.user_limit = max(1, min(user_limit, self.max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=thread_name_prefix)
+        self._queues: Dict[int, Deque[_Task]] = {}
+        self._finish_tags: Dict[int, float] = {}
+        self._running: Dict[int, int] = {}
+        self._virtual_time = 0.0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: int, weight: float, fn: Callable[..., Any], *args: Any, cost: float = 1.0) -> None:
+        """Queue fn(*args) on behalf of a user.
+
+        Args:
+            user_id: The user the work is done for.
+            weight: The user's share of the pool relative to other users.
+            fn: The task.
+            cost: Relative size of the task, such as seconds of output.
+        """
+        with self._lock:
+            start_tag = max(self._virtual_time, self._finish_tags.get(user_id, 0.0))
+            self._finish_tags[user_id] = start_tag + max(cost, 0.001) / max(weight, 0.001)
+            self._queues.setdefault(user_id, deque()).append(_Task(start_tag, fn, args))
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Running and waiting tasks per user."""
+        with self._lock:
+            return {
+                'maxWorkers': self.max_workers,
+                'userLimit': self.user_limit,
+                'active': self._active,
+                'users': {
+                    str(user_id): {'running': self._running.get(user_id, 0), 'waiting': len(self._queues.get(user_id, ()))}
+                    for user_id in set(self._queues) | set(self._running)
+                }
+            }
+
+    def _dispatch(self) -> None:
+        """Hand tasks to free workers in start-tag order. Must be called with the lock held."""
+        while self._active < self.max_workers:
+            candidates = [
+                (queue[0].start_tag, user_id) for user_id, queue in self._queues.items()
+                if self._running.get(user_id, 0) < self.user_limit
+            ]
+            if not candidates:
+                return
+            _, user_id = min(candidates)
+            queue = self._queues[user_id]
+            task = queue.popleft()
+            if not queue:
+                del self._queues[user_id]
+            self._virtual_time = max(self._virtual_time, task.start_tag)
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            self._active += 1
+            self._executor.submit(self._run, user_id, task)
+
+    def _run(self, user_id: int, task: _Task) -> None:
+        """Run a task and start the next ones."""
+        try:
+            task.fn(*task.args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._running[user_id] -= 1
+                if not self._running[user_id]:
+                    del self._running[user_id]
+                    if user_id not in self._queues and self._finish_tags.get(user_id, 0.0) <= self._virtual_time:
+                        # Usuário ocioso: a próxima tarefa parte do tempo virtual atual
+                        self._finish_tags.pop(user_id, None)
+                self._dispatch()
+
+
+class AdmissionController:
+    """Refuses work up front when it cannot start soon, instead of queueing it.
+
+    Clip jobs and downloads are admitted while the clips (or downloads) still
+    queued or running stay under a global cap and a per-user cap, counted in
+    the database so every web process sees the same backlog. Synchronous
+    renders of /api/edit-video and /api/concat-video are admitted while the
+    renders in flight in this process stay under global and per-user caps;
+    the global cap defaults to twice the encode slots, so admitted renders
+    wait for at most one render ahead of them. Requests for a render already
+    in progress wait for it through exclusive(), for a bounded time.
+    Per-user caps are multiplied by the weight of the user's role from
+    SCHEDULER_ROLE_WEIGHTS, the same weight the fair executors use. Refused
+    work raises Overloaded, answered with 429 and Retry-After.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize admission controller."""
+        self.app: Optional[Flask] = None
+        self.role_weights: Dict[str, float] = {}
+        self._renders: Dict[int, int] = {}
+        self._renders_total = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the controller to an application."""
+        self.app = app
+        self.role_weights = parse_role_weights(str(app.config.get('SCHEDULER_ROLE_WEIGHTS', '')))
+        app.extensions['admission'] = self
+
+    def weight(self, role: Optional[str]) -> float:
+        """Scheduling weight of a role; unknown roles weigh DEFAULT_WEIGHT."""
+        return self.role_weights.get(role or '', DEFAULT_WEIGHT)
+
+    def weight_for_user(self, user_id: int) -> float:
+        """Scheduling weight of a user's role."""
+        user: Optional[User] = db.session.get(User, user_id)
+        return self.weight(user.role if user is not None else None)
+
+    def user_limit(self, workers: int) -> int:
+        """Tasks of one user a pool of workers runs at once, from SCHEDULER_USER_WORKERS."""
+        assert self.app is not None
+        configured = int(self.app.config.get('SCHEDULER_USER_WORKERS', 0))
+        return configured if configured > 0 else max(1, workers // 2)
+
+    def check_clips(self, user: User, count: int) -> None:
+        """Admit a job of count clips.
+
+        Raises:
+            ValueError: If the job alone exceeds the user's cap.
+            Overloaded: If the job must wait for queued clips to finish.
+        """
+        assert self.app is not None
+        config = self.app.config
+        user_cap = int(config.get('ADMISSION_USER_MAX_CLIPS', 100) * self.weight(user.role))
+        if count > user_cap:
+            raise ValueError(f"Too many clips in one job: {count}, at most {user_cap}")
+
+        pending = db.session.query(func.count(column(ClipJobItem.id))).join(ClipJob).filter(
+            column(ClipJob.status).in_([ClipJob.QUEUED, ClipJob.RUNNING]),
+            column(ClipJobItem.status).in_([ClipJob.QUEUED, ClipJob.RUNNING])
+        )
+        if pending.filter(column(ClipJob.user_id) == user.id).scalar() + count > user_cap:
+            self._reject('clips_user', "You have too many clips in progress, try again when some finish")
+        if pending.scalar() + count > int(config.get('ADMISSION_MAX_CLIPS', 1000)):
+            self._reject('clips', "The server is busy generating clips, try again later")
+
+    def check_download(self, user: User) -> None:
+        """Admit a download.
+
+        Raises:
+            Overloaded: If the download must wait for others to finish.
+        """
+        assert self.app is not None
+        config = self.app.config
+        pending = db.session.query(func.count(column(DownloadTask.id))).filter(
+            column(DownloadTask.status).in_([DownloadTask.QUEUED, DownloadTask.DOWNLOADING])
+        )
+        user_cap = int(config.get('ADMISSION_USER_MAX_DOWNLOADS', 3) * self.weight(user.role))
+        if pending.filter(column(DownloadTask.user_id) == user.id).scalar() >= user_cap:
+            self._reject('downloads_user', "You have too many downloads in progress, try again when some finish")
+        if pending.scalar() >= int(config.get('ADMISSION_MAX_DOWNLOADS', 20)):
+            self._reject('downloads', "The server is busy downloading videos, try again later")
+
+    @contextmanager
+    def render(self, user: User) -> Iterator[None]:
+        """Admit a synchronous render for the duration of the block.
+
+        Raises:
+            Overloaded: If the render cannot start now.
+        """
+        assert self.app is not None
+        config = self.app.config
+        user_cap = int(config.get('ADMISSION_USER_MAX_RENDERS', 2) * self.weight(user.role))
+        user_id = user.id
+        with self._lock:
+            if self._renders.get(user_id, 0) >= user_cap:
+                reason = 'renders_user'
+            elif self._renders_total >= int(config.get('ADMISSION_MAX_RENDERS') or 2 * transcoder.slots):
+                reason = 'renders'
+            else:
+                reason = None
+                self._renders[user_id] = self._renders.get(user_id, 0) + 1
+                self._renders_total += 1
+        if reason == 'renders_user':
+            self._reject(reason, "You have too many renders in progress, try again when one finishes")
+        elif reason is not None:
+            self._reject(reason, "The server is busy rendering, try again later")
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._renders_total -= 1
+                self._renders[user_id] -= 1
+                if not self._renders[user_id]:
+                    del self._renders[user_id]
+
+    @contextmanager
+    def exclusive(self, name: str) -> Iterator[None]:
+        """Hold a named lock for the block, such as the lock of a render key.
+
+        A request for work another request or process is already doing waits
+        for it at most ADMISSION_LOCK_WAIT seconds, instead of LOCK_TIMEOUT,
+        so it ties up a web worker no longer than a request should take.
+
+        Raises:
+            Overloaded: If the lock is still held after the wait.
+        """
+        assert self.app is not None
+        lock = locks.lock(name)
+        if not lock.acquire(timeout=float(self.app.config.get('ADMISSION_LOCK_WAIT', 20))):
+            self._reject('busy', "The same work is already in progress, try again shortly")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Renders in flight in this process."""
+        with self._lock:
+            return {'renders': self._renders_total, 'rendersByUser': {str(k): v for k, v in self._renders.items()}}
+
+    def _reject(self, reason: str, message: str) -> None:
+        """Count a refusal and raise Overloaded."""
+        assert self.app is not None
+        ADMISSION_REJECTED.inc(reason=reason)
+        logger.info("Admission refused (%s): %s", reason, message)
+        raise Overloaded(message, int(self.app.config.get('ADMISSION_RETRY_AFTER', 10)))
+
+
+admission = AdmissionController()
+
+ADMISSION_REJECTED = registry.register(Counter(
+    'cutter_admission_rejected_total', 'Requests refused with 429 by admission control.', ['reason']
+))
+registry.register(Gauge(
+    'cutter_renders_in_flight', 'Synchronous renders admitted and not finished.', [],
+    callback=lambda: {(): float(admission.stats()['renders'])}
+))
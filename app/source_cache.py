@@ -0,0 +1,366 @@
+# Standard library imports
+import logging
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+
+# Third-party imports
+from flask import Flask
+import yt_dlp
+from yt_dlp.utils import download_range_func, sanitize_filename
+
+# Local imports
+from locks import locks
+from metrics import span
+from models import db, CachedSource, SourceVideo
+
+logger = logging.getLogger(__name__)
+
+SourceKey = Tuple[str, str, str]
+Section = Tuple[float, float]
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def format_section(section: Section) -> str:
+    """Compact start-end label of a section, used in cache keys and titles."""
+    return f'{section[0]:g}-{section[1]:g}'
+
+
+class SourceCache:
+    """Shared store of downloaded videos keyed by extractor, video ID and format.
+
+    Each video is downloaded once into source_cache/ and exposed to users as
+    a hardlink under downloads/<user_id>/, recorded as a SourceVideo row.
+    Concurrent requests for the same video wait on a single download and
+    receive its yt-dlp progress updates; across processes the download is
+    guarded by a lock per key, so a second process waits for the first and
+    then finds the video in the cache. Partial downloads are kept as .part
+    files, so an interrupted download resumes where it stopped.
+
+    A section download fetches only a time window of the video, through
+    yt-dlp's download ranges: FFmpeg seeks the remote file with HTTP range
+    requests, or reads just the HLS/DASH segments covering the window. Each
+    window is cached as its own source, keyed by the format plus the window.
+    Its file starts at CachedSource.section_start seconds of the original
+    video; time_offset() reports it so callers can keep speaking in the
+    original video's times.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize cache."""
+        self.cache_dir: Optional[str] = None
+        self.downloads_dir: Optional[str] = None
+        self._inflight: Dict[SourceKey, 'Future[int]'] = {}
+        self._listeners: Dict[SourceKey, List[ProgressCallback]] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the cache to an application."""
+        self.cache_dir = os.path.join(app.root_path, 'source_cache')
+        self.downloads_dir = os.path.join(app.root_path, 'downloads')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        app.extensions['source_cache'] = self
+
+    def extract_info(self, url: str, ydl_opts: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract video metadata without downloading.
+
+        Raises:
+            ValueError: If the URL cannot be resolved.
+        """
+        try:
+            info = yt_dlp.YoutubeDL(ydl_opts).extract_info(url, download=False)
+        except yt_dlp.DownloadError as e:
+            raise ValueError(f"Failed to download video: {str(e)}")
+        if not info:
+            raise ValueError("Failed to extract video information")
+        return cast(Dict[str, Any], info)
+
+    def fetch(self, url: str, video_format: str, ydl_opts: Optional[Dict[str, Any]] = None,
+              progress_callback: Optional[ProgressCallback] = None,
+              section: Optional[Section] = None, margin: float = 0.0) -> CachedSource:
+        """Return the cached source for a URL, downloading it at most once.
+
+        Args:
+            url: The video URL.
+            video_format: The yt-dlp format selector.
+            ydl_opts: Extra yt-dlp options.
+            progress_callback: Called with each yt-dlp progress dict of the
+                download serving this request.
+            section: (start, end) seconds to download instead of the whole
+                video. A full download already in the cache is reused.
+            margin: Seconds added on each side of the section, so cuts near
+                its edges still have keyframes and context.
+
+        Returns:
+            The cached source row.
+
+        Raises:
+            ValueError: If the video cannot be resolved or downloaded.
+            FileNotFoundError: If the download did not produce a file.
+        """
+        options = dict(ydl_opts or {})
+        with span('extract'):
+            info = self.extract_info(url, {**options, 'format': video_format})
+        requested = None
+        if section is not None:
+            requested = self._clamp_section(section, info)
+            full = self._cached(self.make_key(info, video_format))
+            if full is not None:
+                logger.debug("Serving section %s from the full download of %s", format_section(requested), url)
+                return full
+            section = self._clamp_section((requested[0] - margin, requested[1] + margin), info)
+        key = self.make_key(info, video_format, section)
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                self._listeners[key] = []
+            if progress_callback is not None:
+                self._listeners[key].append(progress_callback)
+
+        if not owner:
+            logger.debug("Waiting for in-flight download of %s", key)
+            source = db.session.get(CachedSource, future.result())
+            if source is None:
+                raise FileNotFoundError(f"Cached source disappeared: {key}")
+            return source
+
+        options['progress_hooks'] = [lambda progress: self._notify(key, progress)]
+        try:
+            # Outro processo pode estar baixando a mesma chave: esperar e reaproveitar
+            with locks.hold('source:' + '/'.join(key)):
+                source = self._get_or_download(key, info, video_format, options, section, requested)
+            future.set_result(source.id)
+            return source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._listeners.pop(key, None)
+
+    def _notify(self, key: SourceKey, progress: Dict[str, Any]) -> None:
+        """Forward a yt-dlp progress update to every request waiting on key."""
+        with self._lock:
+            listeners = list(self._listeners.get(key, []))
+        for listener in listeners:
+            try:
+                listener(progress)
+            except Exception as e:
+                logger.warning("Progress listener failed for %s: %s", key, e)
+
+    @staticmethod
+    def make_key(info: Dict[str, Any], video_format: str, section: Optional[Section] = None) -> SourceKey:
+        """Cache key of a video: extractor, video ID and format selector, plus the section if any."""
+        extractor = str(info.get('extractor_key') or info.get('extractor') or 'generic')
+        video_id = str(info.get('id') or '')
+        if not video_id:
+            raise ValueError("Failed to get video ID")
+        if section is not None:
+            video_format = f'{video_format}@{format_section(section)}'
+        return extractor.lower(), video_id, video_format
+
+    @staticmethod
+    def _clamp_section(section: Section, info: Dict[str, Any]) -> Section:
+        """Fit a section inside the video's duration, when the extractor reports one.
+
+        Raises:
+            ValueError: If the section is empty or starts after the end of the video.
+        """
+        start, end = max(0.0, section[0]), section[1]
+        duration = info.get('duration')
+        if duration:
+            if start >= float(duration):
+                raise ValueError(f"Clip starts after the end of the video ({float(duration):g}s)")
+            end = min(end, float(duration))
+        if end <= start:
+            raise ValueError("End time must be greater than start time")
+        return start, end
+
+    def _cached(self, key: SourceKey) -> Optional[CachedSource]:
+        """The cached source of key, if its file is still on disk."""
+        extractor, video_id, video_format = key
+        source: Optional[CachedSource] = CachedSource.query.filter_by(
+            extractor=extractor, video_id=video_id, format=video_format
+        ).first()
+        if source is None or not os.path.exists(self.source_path(source)):
+            return None
+        return source
+
+    def time_offset(self, user_id: int, video_path: str) -> float:
+        """Second of the original video at which a user's download starts; 0 unless it is a section."""
+        source = self.source_for_user(user_id, video_path)
+        return source.section_start if source is not None else 0.0
+
+    def source_path(self, source: CachedSource) -> str:
+        """Absolute path of a cached source."""
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, source.path)
+
+    def asset_dir(self, source: CachedSource) -> str:
+        """Absolute directory holding the derived assets of a cached source."""
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, 'assets', str(source.id))
+
+    def source_for_user(self, user_id: int, video_path: str) -> Optional[CachedSource]:
+        """Return the cached source behind a user's download, if it has one."""
+        entry: Optional[SourceVideo] = SourceVideo.query.filter_by(user_id=user_id, video_path=video_path).first()
+        return entry.source if entry is not None else None
+
+    def link_for_user(self, source: CachedSource, user_id: int) -> SourceVideo:
+        """Expose a cached source under downloads/<user_id>/.
+
+        Args:
+            source: The cached source.
+            user_id: The user's ID.
+
+        Returns:
+            The user's SourceVideo row.
+        """
+        assert self.downloads_dir is not None
+        filename = f'{sanitize_filename(source.title)}.mp4'
+        video_path = f'{user_id}/{filename}'
+        user_dir = os.path.join(self.downloads_dir, str(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+
+        target = os.path.join(user_dir, filename)
+        shared = self.source_path(source)
+        if not (os.path.exists(target) and os.path.samefile(target, shared)):
+            if os.path.lexists(target):
+                os.remove(target)
+            try:
+                os.link(shared, target)
+            except OSError:
+                # Sistemas de arquivos diferentes não permitem hardlink
+                os.symlink(shared, target)
+
+        entry: Optional[SourceVideo] = SourceVideo.query.filter_by(user_id=user_id, video_path=video_path).first()
+        if entry is None:
+            entry = SourceVideo(user_id=user_id, video_path=video_path, title=source.title, source_id=source.id)
+            db.session.add(entry)
+        else:
+            entry.source_id = source.id
+            entry.title = source.title
+        source.last_used_at = datetime.utcnow()
+        db.session.commit()
+        return entry
+
+    def evict(self, cutoff: datetime, limit: Optional[int] = None) -> int:
+        """Remove cached sources no user references that were last used before cutoff.
+
+        Derived assets of a removed source are removed with it.
+
+        Args:
+            cutoff: Sources used after this time are kept.
+            limit: Maximum number of sources to remove, least recently used first.
+
+        Returns:
+            The number of bytes reclaimed.
+        """
+        reclaimed = 0
+        query = CachedSource.query.filter(
+            CachedSource.last_used_at < cutoff,
+            ~CachedSource.references.any()
+        ).order_by(CachedSource.last_used_at)
+        if limit is not None:
+            query = query.limit(limit)
+        for source in query.all():
+            path = self.source_path(source)
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                    reclaimed += source.size
+            except OSError as e:
+                logger.warning("Could not remove cached source %s: %s", path, e)
+                continue
+            shutil.rmtree(self.asset_dir(source), ignore_errors=True)
+            db.session.delete(source)
+        db.session.commit()
+        return reclaimed
+
+    def _get_or_download(self, key: SourceKey, info: Dict[str, Any], video_format: str,
+                         ydl_opts: Dict[str, Any], section: Optional[Section] = None,
+                         window: Optional[Section] = None) -> CachedSource:
+        """Return the cached row for key, downloading the video or its section if needed.
+
+        The section is the part downloaded; window is the part the user
+        asked for, without the margin, which labels the title.
+        """
+        assert self.cache_dir is not None
+        extractor, video_id, cache_format = key
+        source: Optional[CachedSource] = CachedSource.query.filter_by(
+            extractor=extractor, video_id=video_id, format=cache_format
+        ).first()
+        if source is not None and os.path.exists(self.source_path(source)):
+            logger.debug("Source cache hit for %s", key)
+            source.last_used_at = datetime.utcnow()
+            db.session.commit()
+            return source
+
+        logger.debug("Source cache miss for %s, downloading", key)
+        format_slug = re.sub(r'[^A-Za-z0-9_.+-]', '_', cache_format)
+        relative_base = os.path.join(extractor, f'{sanitize_filename(video_id)}.{format_slug}')
+        options = dict(ydl_opts)
+        options.update({
+            'format': video_format,
+            'outtmpl': os.path.join(self.cache_dir, relative_base + '.%(ext)s'),
+            'merge_output_format': 'mp4',
+            'continuedl': True,  # Retomar arquivos .part de downloads interrompidos
+            'retries': 10,
+            'fragment_retries': 10
+        })
+        if section is not None:
+            # Só a janela pedida é baixada; o arquivo começa em 0 no início da seção
+            options['download_ranges'] = download_range_func(None, [section])
+
+        try:
+            ydl = yt_dlp.YoutubeDL(options)
+            with span('download'):
+                downloaded = cast(Dict[str, Any], ydl.process_ie_result(info, download=True) or {})
+        except yt_dlp.DownloadError as e:
+            raise ValueError(f"Failed to download video: {str(e)}")
+
+        requested = downloaded.get('requested_downloads') or [{}]
+        full_path = str(requested[0].get('filepath') or ydl.prepare_filename(downloaded))
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"Downloaded file not found: {full_path}")
+
+        file_size = os.path.getsize(full_path)
+        if file_size == 0:
+            raise ValueError(f"Downloaded file is empty: {full_path}")
+
+        title = str(downloaded.get('title') or info.get('title') or '')
+        if not title:
+            raise ValueError("Failed to get video title")
+        if section is not None:
+            title = f'{title} [{format_section(window or section)}]'
+        section_start = section[0] if section is not None else 0.0
+
+        relative_path = os.path.relpath(full_path, self.cache_dir)
+        if source is None:
+            source = CachedSource(
+                extractor=extractor, video_id=video_id, format=cache_format,
+                title=title, path=relative_path, size=file_size, section_start=section_start
+            )
+            db.session.add(source)
+        else:
+            source.path = relative_path
+            source.size = file_size
+            source.title = title
+            source.section_start = section_start
+        source.last_used_at = datetime.utcnow()
+        db.session.commit()
+        return source
+
+
+source_cache = SourceCache()
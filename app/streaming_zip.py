@@ -0,0 +1,200 @@
+# Standard library imports
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+# Sizes and offsets at or above this limit need ZIP64 records
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+# Values stored in 32/16-bit fields whose real value lives in a ZIP64 record
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+# General purpose flags: sizes and CRC follow the data (bit 3), UTF-8 names (bit 11)
+FLAGS = 0x0008 | 0x0800
+VERSION_ZIP64 = 45
+VERSION_DEFAULT = 20
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+ZIP64_EXTRA_LOCAL = struct.Struct('<HHQQ')
+ZIP64_EXTRA_CENTRAL = struct.Struct('<HHQQQ')
+ZIP64_END = struct.Struct('<IQHHIIQQQQ')
+ZIP64_LOCATOR = struct.Struct('<IIQI')
+END_RECORD = struct.Struct('<IHHHHIIH')
+
+
+@dataclass
+class ZipEntry:
+    """A file stored in a streaming ZIP archive."""
+
+    path: str
+    name: str
+    size: int
+    mtime: float
+    offset: int = 0
+    crc: int = 0
+
+    @property
+    def encoded_name(self) -> bytes:
+        """Archive name as UTF-8."""
+        return self.name.encode('utf-8')
+
+    @property
+    def zip64(self) -> bool:
+        """Whether the entry's size or offset needs ZIP64 fields."""
+        return self.size >= ZIP64_LIMIT or self.offset >= ZIP64_LIMIT
+
+    @property
+    def dos_time(self) -> Tuple[int, int]:
+        """Modification time as DOS (time, date)."""
+        t = time.localtime(self.mtime)
+        year = max(t.tm_year, 1980)
+        return (
+            (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+        )
+
+
+class StreamingZip:
+    """Uncompressed (STORED) ZIP archive written chunk by chunk from disk.
+
+    Video files barely compress, so entries are stored as-is with their CRC
+    and sizes in a trailing data descriptor. That keeps memory bounded by the
+    chunk size and lets the exact archive size be computed before any file is
+    read, so it can be sent as Content-Length.
+    """
+
+    def __init__(self, files: List[Tuple[str, str]], chunk_size: int = 1024 * 1024) -> None:
+        """Initialize archive.
+
+        Args:
+            files: (path on disk, name in archive) tuples.
+            chunk_size: Bytes read from disk per chunk.
+        """
+        self.chunk_size = chunk_size
+        self.entries: List[ZipEntry] = []
+        offset = 0
+        for path, name in files:
+            stat = os.stat(path)
+            entry = ZipEntry(path=path, name=name, size=stat.st_size, mtime=stat.st_mtime, offset=offset)
+            self.entries.append(entry)
+            offset += self._local_size(entry) + entry.size + self._descriptor_size(entry)
+        self._central_offset = offset
+
+    def content_length(self) -> int:
+        """Exact size in bytes of the archive produced by iter_chunks()."""
+        central_size = sum(self._central_size(entry) for entry in self.entries)
+        return self._central_offset + central_size + self._end_size(central_size)
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """Yield the archive as a sequence of byte chunks."""
+        for entry in self.entries:
+            yield self._local_header(entry)
+            crc = 0
+            remaining = entry.size
+            with open(entry.path, 'rb') as f:
+                while remaining > 0:
+                    chunk = f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        raise IOError(f"File changed while streaming: {entry.path}")
+                    crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+                    yield chunk
+            entry.crc = crc
+            yield self._data_descriptor(entry)
+
+        central = b''.join(self._central_header(entry) for entry in self.entries)
+        yield central
+        yield self._end_records(len(central))
+
+    def _local_size(self, entry: ZipEntry) -> int:
+        """Size of the local file header of an entry."""
+        extra = ZIP64_EXTRA_LOCAL.size if entry.zip64 else 0
+        return LOCAL_HEADER.size + len(entry.encoded_name) + extra
+
+    def _descriptor_size(self, entry: ZipEntry) -> int:
+        """Size of the data descriptor of an entry."""
+        return DATA_DESCRIPTOR64.size if entry.zip64 else DATA_DESCRIPTOR.size
+
+    def _central_size(self, entry: ZipEntry) -> int:
+        """Size of the central directory header of an entry."""
+        extra = ZIP64_EXTRA_CENTRAL.size if entry.zip64 else 0
+        return CENTRAL_HEADER.size + len(entry.encoded_name) + extra
+
+    def _needs_zip64_end(self, central_size: int) -> bool:
+        """Whether the archive needs ZIP64 end records."""
+        return (
+            len(self.entries) >= ZIP64_COUNT_LIMIT
+            or self._central_offset >= ZIP64_LIMIT
+            or central_size >= ZIP64_LIMIT
+        )
+
+    def _end_size(self, central_size: int) -> int:
+        """Size of the end of central directory records."""
+        size = END_RECORD.size
+        if self._needs_zip64_end(central_size):
+            size += ZIP64_END.size + ZIP64_LOCATOR.size
+        return size
+
+    def _local_header(self, entry: ZipEntry) -> bytes:
+        """Local file header; CRC and sizes are left to the data descriptor."""
+        dos_time, dos_date = entry.dos_time
+        name = entry.encoded_name
+        if entry.zip64:
+            header = LOCAL_HEADER.pack(
+                0x04034b50, VERSION_ZIP64, FLAGS, 0, dos_time, dos_date,
+                0, ZIP64_MARKER, ZIP64_MARKER, len(name), ZIP64_EXTRA_LOCAL.size
+            )
+            return header + name + ZIP64_EXTRA_LOCAL.pack(0x0001, 16, 0, 0)
+        header = LOCAL_HEADER.pack(
+            0x04034b50, VERSION_DEFAULT, FLAGS, 0, dos_time, dos_date,
+            0, 0, 0, len(name), 0
+        )
+        return header + name
+
+    def _data_descriptor(self, entry: ZipEntry) -> bytes:
+        """Data descriptor with the CRC and sizes of an entry."""
+        if entry.zip64:
+            return DATA_DESCRIPTOR64.pack(0x08074b50, entry.crc, entry.size, entry.size)
+        return DATA_DESCRIPTOR.pack(0x08074b50, entry.crc, entry.size, entry.size)
+
+    def _central_header(self, entry: ZipEntry) -> bytes:
+        """Central directory header of an entry."""
+        dos_time, dos_date = entry.dos_time
+        name = entry.encoded_name
+        version = VERSION_ZIP64 if entry.zip64 else VERSION_DEFAULT
+        size = ZIP64_MARKER if entry.zip64 else entry.size
+        offset = ZIP64_MARKER if entry.zip64 else entry.offset
+        extra = ZIP64_EXTRA_CENTRAL.pack(0x0001, 24, entry.size, entry.size, entry.offset) if entry.zip64 else b''
+        header = CENTRAL_HEADER.pack(
+            0x02014b50, (3 << 8) | version, version, FLAGS, 0, dos_time, dos_date,
+            entry.crc, size, size, len(name), len(extra), 0, 0, 0,
+            0o100644 << 16, offset
+        )
+        return header + name + extra
+
+    def _end_records(self, central_size: int) -> bytes:
+        """End of central directory records, with ZIP64 records when needed."""
+        count = len(self.entries)
+        records = b''
+        if self._needs_zip64_end(central_size):
+            zip64_end_offset = self._central_offset + central_size
+            records += ZIP64_END.pack(
+                0x06064b50, ZIP64_END.size - 12, (3 << 8) | VERSION_ZIP64, VERSION_ZIP64,
+                0, 0, count, count, central_size, self._central_offset
+            )
+            records += ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1)
+            return records + END_RECORD.pack(
+                0x06054b50, 0, 0, ZIP64_COUNT_MARKER, ZIP64_COUNT_MARKER,
+                ZIP64_MARKER, ZIP64_MARKER, 0
+            )
+        return END_RECORD.pack(
+            0x06054b50, 0, 0, count, count, central_size, self._central_offset, 0
+        )
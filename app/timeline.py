@@ -0,0 +1,180 @@
+# Standard library imports
+import glob
+import json
+import logging
+import math
+import os
+import subprocess
+from typing import Any, Dict, List
+
+# Third-party imports
+import numpy as np
+
+# Local imports
+from cutting import run_ffmpeg, stream_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'timeline.json'
+VTT_FILENAME = 'sprites.vtt'
+PEAKS_FILENAME = 'peaks.u8'
+
+# Audio samples decoded per waveform peak
+SAMPLES_PER_PEAK = 160
+
+# Most PCM bytes read from FFmpeg at a time while computing peaks
+PCM_CHUNK_SIZE = 256 * 1024
+
+
+def _probe(path: str, entries: str) -> Dict[str, Any]:
+    """Run FFprobe and return its JSON output."""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', entries, '-of', 'json', path],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"FFprobe error: {e.stderr}")
+    return json.loads(result.stdout or '{}')
+
+
+def _format_vtt_time(seconds: float) -> str:
+    """Format seconds as a WebVTT timestamp."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}'
+
+
+def render_sprites(input_path: str, output_dir: str, interval: float, thumb_width: int,
+                   columns: int, rows: int) -> Dict[str, Any]:
+    """Render thumbnail sprite sheets, one thumbnail every interval seconds.
+
+    Returns:
+        The sprite part of the timeline manifest.
+    """
+    run_ffmpeg([
+        'ffmpeg', '-y', '-i', input_path, '-an', '-sn',
+        '-vf', f'fps=1/{interval},scale={thumb_width}:-2,tile={columns}x{rows}',
+        '-q:v', '5', os.path.join(output_dir, 'sprite_%03d.jpg')
+    ])
+    sheets = sorted(os.path.basename(path) for path in glob.glob(os.path.join(output_dir, 'sprite_*.jpg')))
+    if not sheets:
+        raise RuntimeError(f"FFmpeg produced no sprite sheets for {input_path}")
+
+    stream = _probe(os.path.join(output_dir, sheets[0]), 'stream=width,height').get('streams', [{}])[0]
+    return {
+        'interval': interval,
+        'columns': columns,
+        'rows': rows,
+        'tileWidth': int(stream['width']) // columns,
+        'tileHeight': int(stream['height']) // rows,
+        'sheets': sheets
+    }
+
+
+def write_vtt(path: str, sprites: Dict[str, Any], duration: float) -> None:
+    """Write a WebVTT thumbnail map pointing into the sprite sheets."""
+    per_sheet = sprites['columns'] * sprites['rows']
+    count = min(max(1, math.ceil(duration / sprites['interval'])), per_sheet * len(sprites['sheets']))
+    lines = ['WEBVTT', '']
+    for index in range(count):
+        start = index * sprites['interval']
+        end = min(start + sprites['interval'], duration)
+        sheet, tile = divmod(index, per_sheet)
+        row, column = divmod(tile, sprites['columns'])
+        lines.append(f'{_format_vtt_time(start)} --> {_format_vtt_time(end)}')
+        lines.append(
+            f"{sprites['sheets'][sheet]}#xywh={column * sprites['tileWidth']},{row * sprites['tileHeight']},"
+            f"{sprites['tileWidth']},{sprites['tileHeight']}"
+        )
+        lines.append('')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def compute_peaks(input_path: str, peaks_per_second: int) -> np.ndarray:
+    """Downsample the first audio track to one 0-255 peak per window.
+
+    Audio is decoded as mono 16-bit PCM at SAMPLES_PER_PEAK samples per peak
+    and read from FFmpeg's pipe a chunk at a time. Each chunk is reduced to
+    peaks as it arrives, carrying the bytes of an unfinished window over to
+    the next, so memory holds one chunk plus the peak array.
+
+    Raises:
+        RuntimeError: If FFmpeg fails or the watchdog kills it.
+    """
+    window_bytes = SAMPLES_PER_PEAK * 2
+    peaks: List[np.ndarray] = []
+    pending = b''
+    for chunk in stream_ffmpeg(
+        ['ffmpeg', '-i', input_path, '-map', '0:a:0', '-ac', '1',
+         '-ar', str(peaks_per_second * SAMPLES_PER_PEAK), '-f', 's16le', 'pipe:1'],
+        PCM_CHUNK_SIZE, whole_chunks=True
+    ):
+        data = pending + chunk
+        whole = len(data) - len(data) % window_bytes
+        pending = data[whole:]
+        if whole:
+            # int32 para que abs(-32768) não transborde
+            samples = np.frombuffer(data, dtype='<i2', count=whole // 2).astype(np.int32)
+            peaks.append(np.abs(samples).reshape(-1, SAMPLES_PER_PEAK).max(axis=1))
+    if len(pending) >= 2:
+        samples = np.frombuffer(pending, dtype='<i2', count=len(pending) // 2).astype(np.int32)
+        peaks.append(np.abs(samples).max(keepdims=True))
+    if not peaks:
+        return np.zeros(0, dtype=np.uint8)
+    return np.minimum(np.concatenate(peaks) * 255 // 32767, 255).astype(np.uint8)
+
+
+def build_timeline(input_path: str, output_dir: str, interval: float = 2.0, thumb_width: int = 160,
+                   columns: int = 10, rows: int = 10, peaks_per_second: int = 50) -> Dict[str, Any]:
+    """Build the scrubbing index of a video: sprite sheets, VTT map and audio peaks.
+
+    Args:
+        input_path: Video to index; the preview proxy is the cheapest to decode.
+        output_dir: Existing empty directory receiving the files.
+        interval: Seconds between thumbnails.
+        thumb_width: Thumbnail width in pixels.
+        columns: Thumbnails per sprite row.
+        rows: Thumbnail rows per sprite sheet.
+        peaks_per_second: Waveform resolution.
+
+    Returns:
+        The timeline manifest, also written to timeline.json.
+
+    Raises:
+        RuntimeError: If FFmpeg or FFprobe fails.
+    """
+    info = _probe(input_path, 'format=duration:stream=codec_type')
+    duration = float(info.get('format', {}).get('duration') or 0.0)
+    has_audio = any(stream.get('codec_type') == 'audio' for stream in info.get('streams', []))
+
+    sprites = render_sprites(input_path, output_dir, interval, thumb_width, columns, rows)
+    write_vtt(os.path.join(output_dir, VTT_FILENAME), sprites, duration)
+
+    peaks = compute_peaks(input_path, peaks_per_second) if has_audio else np.zeros(0, dtype=np.uint8)
+    peaks.tofile(os.path.join(output_dir, PEAKS_FILENAME))
+
+    manifest: Dict[str, Any] = {
+        'duration': duration,
+        'sprites': sprites,
+        'vtt': VTT_FILENAME,
+        'peaks': PEAKS_FILENAME,
+        'peaksPerSecond': peaks_per_second,
+        'peakCount': int(peaks.size)
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f)
+    logger.debug("Built timeline of %s: %d sheets, %d peaks", input_path, len(sprites['sheets']), peaks.size)
+    return manifest
+
+
+def load_manifest(timeline_dir: str) -> Dict[str, Any]:
+    """Load the manifest written by build_timeline()."""
+    with open(os.path.join(timeline_dir, MANIFEST_FILENAME)) as f:
+        return json.load(f)
+
@@ -0,0 +1,147 @@
+# Standard library imports
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# Third-party imports
+from flask import Flask
+
+# Local imports
+from metrics import Gauge, registry
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREVIEW = 'preview'
+PROFILE_EXPORT = 'export'
+
+
+def parse_crf_table(value: str) -> Dict[int, int]:
+    """Parse a 'height:crf,height:crf' table such as '480:26,720:23,1080:21'."""
+    table: Dict[int, int] = {}
+    for entry in value.split(','):
+        if not entry.strip():
+            continue
+        height, _, crf = entry.partition(':')
+        table[int(height)] = int(crf)
+    return table
+
+
+class TranscodeScheduler:
+    """Fixed number of encode slots sharing the machine's cores.
+
+    Stream copies are I/O bound and run freely, but every libx264/libx265
+    encode takes one of TRANSCODE_SLOTS slots and is limited to its share of
+    the cores through -threads, so concurrent renders queue instead of
+    oversubscribing the CPU. Presets and CRF come from per-profile settings:
+    a fast preset for previews and a quality preset with a CRF per output
+    height for exports.
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        """Initialize scheduler."""
+        self.app: Optional[Flask] = None
+        self.slots = 1
+        self.threads_per_slot = 1
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self._semaphore = threading.BoundedSemaphore(1)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Bind the scheduler to an application and size its slots."""
+        self.app = app
+        cores = os.cpu_count() or 1
+        self.slots = max(1, int(app.config.get('TRANSCODE_SLOTS') or max(1, cores // 2)))
+        self.threads_per_slot = max(1, cores // self.slots)
+        self._semaphore = threading.BoundedSemaphore(self.slots)
+        app.extensions['transcoder'] = self
+        logger.debug("Transcoding with %d slots of %d threads", self.slots, self.threads_per_slot)
+
+    def options(self, profile: str, height: Optional[int] = None) -> List[str]:
+        """FFmpeg video encoder options of a profile.
+
+        Args:
+            profile: PROFILE_PREVIEW or PROFILE_EXPORT.
+            height: Output height, used to pick the export CRF.
+
+        Returns:
+            -preset, -crf and -threads options for libx264/libx265.
+        """
+        assert self.app is not None
+        config = self.app.config
+        if profile == PROFILE_PREVIEW:
+            preset = config.get('TRANSCODE_PREVIEW_PRESET', 'veryfast')
+            crf = int(config.get('PREVIEW_CRF', 28))
+        elif profile == PROFILE_EXPORT:
+            preset = config.get('TRANSCODE_EXPORT_PRESET', 'medium')
+            crf = self._export_crf(height)
+        else:
+            raise ValueError(f"Unknown transcoding profile: {profile}")
+        return ['-preset', str(preset), '-crf', str(crf), '-threads', str(self.threads_per_slot)]
+
+    @contextmanager
+    def slot(self, needed: bool = True) -> Iterator[None]:
+        """Hold an encode slot for the duration of the block.
+
+        Args:
+            needed: False for stream copies, which run without a slot.
+        """
+        if not needed:
+            yield
+            return
+
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        self._semaphore.acquire()
+        waited = time.monotonic() - started
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            self.wait_seconds += waited
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Slot usage counters."""
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'threadsPerSlot': self.threads_per_slot,
+                'active': self.active,
+                'waiting': self.waiting,
+                'completed': self.completed,
+                'waitSeconds': round(self.wait_seconds, 4)
+            }
+
+    def _export_crf(self, height: Optional[int]) -> int:
+        """CRF of the smallest configured height at or above the output height."""
+        assert self.app is not None
+        table = parse_crf_table(str(self.app.config.get('TRANSCODE_CRF', '')))
+        default = int(self.app.config.get('TRANSCODE_DEFAULT_CRF', 23))
+        if not table or height is None:
+            return default
+        for max_height in sorted(table):
+            if height <= max_height:
+                return table[max_height]
+        return table[max(table)]
+
+
+transcoder = TranscodeScheduler()
+
+registry.register(Gauge(
+    'cutter_transcode_slots', 'Encode slots of the transcoding scheduler by state.', ['state'],
+    callback=lambda: {(state,): float(transcoder.stats()[state]) for state in ('slots', 'active', 'waiting')}
+))
@@ -0,0 +1,50 @@
+"""Standalone worker process: runs clip jobs, downloads and previews without serving HTTP.
+
+Run it next to web processes started with WORKER_MODE=web, sharing their
+DATABASE_URL, downloads, source_cache, static and LOCK_DIR directories:
+
+    python worker.py
+
+Start as many as the encode capacity allows, on this host or others. Each
+claims queued work from the database with the locks in locks.py, so a job,
+download or preview rendition is run by a single worker. SIGTERM and SIGINT
+stop claiming new work; work already started finishes before the process
+exits, and work of a worker that dies is claimed by the others.
+"""
+# Standard library imports
+import logging
+import os
+import signal
+import threading
+from types import FrameType
+from typing import Optional
+
+# Precisa vir antes de importar a aplicação, que lê o modo ao inicializar
+os.environ['WORKER_MODE'] = 'worker'
+
+# Local imports
+from app import app  # noqa: E402
+from dispatcher import dispatcher  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Run until SIGTERM or SIGINT."""
+    stopping = threading.Event()
+
+    def stop(signum: int, frame: Optional[FrameType]) -> None:
+        logger.info("Received signal %d, finishing running work", signum)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info("Worker %d started, polling every %ss", os.getpid(), app.config['WORKER_POLL_INTERVAL'])
+    stopping.wait()
+    dispatcher.stop()
+    # Os pools de threads terminam o trabalho em andamento antes da saída do interpretador
+
+
+if __name__ == '__main__':
+    main()
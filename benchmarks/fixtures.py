@@ -0,0 +1,90 @@
+# Standard library imports
+import logging
+import os
+import subprocess
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Frame rate of every synthetic fixture
+FIXTURE_FRAME_RATE = 24
+
+
+@dataclass(frozen=True)
+class Fixture:
+    """A synthetic source video: test pattern plus a sine tone."""
+
+    duration: int
+    width: int
+    height: int
+    gop: int  # Frames between keyframes
+
+    @property
+    def name(self) -> str:
+        """Stable file stem describing the fixture."""
+        return f'bench_{self.width}x{self.height}_{self.duration}s_g{self.gop}'
+
+    @property
+    def keyframe_interval(self) -> float:
+        """Seconds between keyframes."""
+        return self.gop / FIXTURE_FRAME_RATE
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the fixture in the results file."""
+        return {'name': self.name, **asdict(self)}
+
+
+def parse_resolution(value: str) -> List[int]:
+    """Parse a WIDTHxHEIGHT resolution."""
+    width, _, height = value.lower().partition('x')
+    return [int(width), int(height)]
+
+
+def fixture_matrix(durations: List[int], resolutions: List[str], gops: List[int]) -> List[Fixture]:
+    """Every combination of durations, resolutions and GOP sizes."""
+    return [
+        Fixture(duration, *parse_resolution(resolution), gop)
+        for duration in durations
+        for resolution in resolutions
+        for gop in gops
+    ]
+
+
+def ensure_fixture(fixture: Fixture, fixtures_dir: str) -> str:
+    """Generate a fixture with FFmpeg's testsrc/sine sources unless it already exists.
+
+    Args:
+        fixture: The fixture to generate.
+        fixtures_dir: Directory keeping generated fixtures between runs.
+
+    Returns:
+        Absolute path of the fixture.
+
+    Raises:
+        RuntimeError: If FFmpeg fails.
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    path = os.path.abspath(os.path.join(fixtures_dir, f'{fixture.name}.mp4'))
+    if os.path.exists(path):
+        return path
+
+    logger.info("Generating fixture %s", fixture.name)
+    temp_path = f'{path}.tmp.mp4'
+    try:
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'lavfi', '-i',
+            f'testsrc=size={fixture.width}x{fixture.height}:rate={FIXTURE_FRAME_RATE}:duration={fixture.duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:duration={fixture.duration}',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            '-g', str(fixture.gop), '-keyint_min', str(fixture.gop), '-sc_threshold', '0',
+            '-c:a', 'aac', '-shortest', '-movflags', '+faststart', temp_path
+        ], capture_output=True, text=True, check=True)
+        os.replace(temp_path, path)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"FFmpeg error: {e.stderr}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return path
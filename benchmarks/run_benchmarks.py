@@ -0,0 +1,401 @@
+"""Benchmarks of the clip pipeline on synthetic fixtures.
+
+Measures the raw cutting step (FFmpeg CLI, in-process engine, smart cuts,
+re-encodes and batched copies) and the end-to-end latency of
+/api/edit-video, /api/generate-clips and /api/download-clips through the
+Flask test client. Results are written as JSON so runs of different commits
+can be compared:
+
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/<previous>.json
+"""
+# Standard library imports
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(REPO_DIR, 'app')
+
+# Local imports
+from fixtures import FIXTURE_FRAME_RATE, Fixture, ensure_fixture, fixture_matrix
+
+logger = logging.getLogger('benchmarks')
+
+BENCH_USERNAME = 'benchmark'
+BENCH_PASSWORD = 'benchmark-password'
+
+# Clips requested per /api/generate-clips call and per batched cut
+CLIPS_PER_JOB = 4
+JOB_POLL_INTERVAL = 0.05
+JOB_TIMEOUT = 600.0
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency statistics of a case in milliseconds."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'meanMs': round(statistics.mean(ordered) * 1000, 3),
+        'medianMs': round(statistics.median(ordered) * 1000, 3),
+        'p95Ms': round(p95 * 1000, 3),
+        'minMs': round(ordered[0] * 1000, 3),
+        'maxMs': round(ordered[-1] * 1000, 3)
+    }
+
+
+def measure(run: Callable[[int], Any], iterations: int, warmup: int) -> Tuple[List[float], Any]:
+    """Time iterations of run(i) after warmup untimed calls.
+
+    Returns:
+        The duration of each timed call and the value of the last one.
+    """
+    for i in range(warmup):
+        run(-1 - i)
+    samples = []
+    result = None
+    for i in range(iterations):
+        started = time.perf_counter()
+        result = run(i)
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+
+def clip_ranges(fixture: Fixture, count: int) -> List[Tuple[float, float]]:
+    """Keyframe-aligned ranges spread over a fixture."""
+    interval = fixture.keyframe_interval
+    length = max(interval, min(10.0, fixture.duration / (count + 1)))
+    step = fixture.duration / (count + 1)
+    ranges = []
+    for i in range(count):
+        start = (int(i * step / interval)) * interval
+        ranges.append((start, min(start + length, fixture.duration - interval)))
+    return ranges
+
+
+def mmss(seconds: float) -> str:
+    """Format whole seconds as the MM:SS clip time of /api/generate-clips."""
+    return f'{int(seconds) // 60:02d}:{int(seconds) % 60:02d}'
+
+
+def git_commit() -> Optional[str]:
+    """Commit of the benchmarked tree."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ffmpeg_version() -> Optional[str]:
+    """First line of ffmpeg -version."""
+    try:
+        return subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True).stdout.splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
+
+
+class BenchmarkRunner:
+    """Runs every case against each fixture inside an isolated app database and file tree."""
+
+    def __init__(self, args: argparse.Namespace, work_dir: str) -> None:
+        """Import the app against a scratch database and file tree and log a benchmark user in."""
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+        os.environ.setdefault('JANITOR_ENABLED', '0')
+        sys.path.insert(0, APP_DIR)
+
+        import app as app_module  # noqa: E402  (needs the environment above)
+        from models import db, User
+
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        self.args = args
+        self.work_dir = work_dir
+        self.app = app_module.app
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self._isolate_files(work_dir)
+        self.results: List[Dict[str, Any]] = []
+
+        with self.app.app_context():
+            user = User.query.filter_by(username=BENCH_USERNAME).first()
+            if user is None:
+                user = User(username=BENCH_USERNAME)
+                user.set_password(BENCH_PASSWORD)
+                db.session.add(user)
+                db.session.commit()
+            self.user_id = user.id
+        self.client = self.app.test_client()
+        response = self.client.post('/login', data={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f"Benchmark login failed with status {response.status_code}")
+
+    def _isolate_files(self, work_dir: str) -> None:
+        """Move every directory the app writes to under work_dir.
+
+        Downloads, clips, renders, cached sources and locks all derive from
+        the app's root and instance paths, so a run leaves the real tree,
+        where the scratch database's user ids belong to other users, untouched.
+        """
+        from catalog import catalog
+        from locks import locks
+        from media_info import media_info_cache
+        from render_cache import render_cache
+        from source_cache import source_cache
+
+        app = self.app
+        # Os templates continuam no diretório da aplicação
+        app.template_folder = os.path.join(app.root_path, app.template_folder or 'templates')
+        app.root_path = work_dir
+        app.instance_path = os.path.join(work_dir, 'instance')
+        for extension in (catalog, locks, media_info_cache, render_cache, source_cache):
+            extension.init_app(app)
+
+    def run(self, fixtures: List[Fixture]) -> None:
+        """Run every case against every fixture."""
+        for fixture in fixtures:
+            source_path = ensure_fixture(fixture, self.args.fixtures_dir)
+            # Uma cópia nova por execução: as chaves do cache de renderização mudam junto com o inode
+            video_path = f'{self.user_id}/{fixture.name}.mp4'
+            input_path = os.path.join(self.app.root_path, 'downloads', video_path)
+            os.makedirs(os.path.dirname(input_path), exist_ok=True)
+            shutil.copyfile(source_path, input_path)
+            try:
+                self._raw_cases(fixture, input_path)
+                self._http_cases(fixture, video_path)
+            finally:
+                self._cleanup(input_path)
+
+    def _record(self, case: str, fixture: Fixture, run: Callable[[int], Any],
+                throughput: Optional[Callable[[List[float], Any], Dict[str, float]]] = None) -> None:
+        """Measure a case and append its result; failures are recorded, not raised."""
+        entry: Dict[str, Any] = {'case': case, 'fixture': fixture.name, 'iterations': self.args.iterations}
+        try:
+            samples, last = measure(run, self.args.iterations, self.args.warmup)
+            entry['stats'] = summarize(samples)
+            if throughput is not None:
+                entry['throughput'] = throughput(samples, last)
+        except Exception as e:
+            logger.warning("Case %s on %s failed: %s", case, fixture.name, str(e)[:500])
+            entry['error'] = str(e)[:2000]
+        self.results.append(entry)
+        logger.info("%-28s %-32s %s", case, fixture.name, entry.get('stats', entry.get('error')))
+
+    def _raw_cases(self, fixture: Fixture, input_path: str) -> None:
+        """Time the cutting step without the HTTP layer."""
+        from clips import verify_clip
+        from cutting import STRATEGY_COPY, STRATEGY_SMART, CutPlan, encode_range, execute_cut, probe_source
+        from engine import media_engine
+        from transcoding import PROFILE_EXPORT, transcoder
+
+        index = probe_source(input_path)
+        start, end = clip_ranges(fixture, 1)[0]
+        seconds = end - start
+        output_path = os.path.join(self.work_dir, 'cut.mp4')
+
+        def realtime(samples: List[float], _: Any) -> Dict[str, float]:
+            return {'sourceSecondsPerSecond': round(seconds / statistics.median(samples), 3)}
+
+        copy_plan = CutPlan(STRATEGY_COPY, start, end)
+        self._record('cut.copy.cli', fixture, lambda i: execute_cut(input_path, output_path, copy_plan, index), realtime)
+        self._record('cut.copy.engine', fixture,
+                     lambda i: media_engine.cut(input_path, output_path, copy_plan, index), realtime)
+
+        middle = start + fixture.keyframe_interval / 2
+        smart_plan = CutPlan(STRATEGY_SMART, middle, end, keyframe=start + fixture.keyframe_interval)
+        if smart_plan.keyframe is not None and smart_plan.keyframe < end:
+            self._record('cut.smart', fixture, lambda i: execute_cut(
+                input_path, output_path, smart_plan, index, transcoder.options(PROFILE_EXPORT, index.height)
+            ), realtime)
+
+        self._record('cut.encode', fixture, lambda i: encode_range(
+            input_path, output_path, start, end, encoder_options=transcoder.options(PROFILE_EXPORT, index.height)
+        ), realtime)
+
+        ranges = clip_ranges(fixture, CLIPS_PER_JOB * 2)
+        outputs = [(os.path.join(self.work_dir, f'batch_{n}.mp4'), s, e) for n, (s, e) in enumerate(ranges)]
+        batch_seconds = sum(e - s for s, e in ranges)
+
+        def batch(i: int) -> None:
+            media_engine.cut_clips(input_path, outputs)
+            for path, _, _ in outputs:
+                verify_clip(path)
+
+        self._record('cut.batch.engine', fixture, batch, lambda samples, _: {
+            'clipsPerSecond': round(len(outputs) / statistics.median(samples), 3),
+            'sourceSecondsPerSecond': round(batch_seconds / statistics.median(samples), 3)
+        })
+
+    def _http_cases(self, fixture: Fixture, video_path: str) -> None:
+        """Time the public endpoints end to end."""
+        start, end = clip_ranges(fixture, 1)[0]
+
+        def edit(end_time: float) -> Dict[str, Any]:
+            response = self.client.post('/api/edit-video', json={
+                'videoPath': video_path, 'startTime': start, 'endTime': end_time, 'resolution': 'original'
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/edit-video returned {response.status_code}: {response.get_json()}")
+            return response.get_json()
+
+        # Cada iteração "fria" pede um fim diferente para não acertar o cache de renderização
+        frame = 1.0 / FIXTURE_FRAME_RATE
+        self._record('http.edit_video.cold', fixture, lambda i: edit(end - (i + self.args.warmup + 1) * frame))
+        self._record('http.edit_video.warm', fixture, lambda i: edit(end))
+
+        ranges = clip_ranges(fixture, CLIPS_PER_JOB)
+        clips = [
+            {'name': f'bench_{n}', 'startTime': mmss(s), 'endTime': mmss(max(e, s + 1))}
+            for n, (s, e) in enumerate(ranges)
+        ]
+
+        def generate(i: int) -> Dict[str, Any]:
+            response = self.client.post('/api/generate-clips', json={'videoPath': video_path, 'clips': clips})
+            if response.status_code != 202:
+                raise RuntimeError(f"/api/generate-clips returned {response.status_code}: {response.get_json()}")
+            job_id = response.get_json()['jobId']
+            deadline = time.monotonic() + JOB_TIMEOUT
+            while time.monotonic() < deadline:
+                job = self.client.get(f'/api/jobs/{job_id}').get_json()['job']
+                if job['status'] in ('done', 'failed'):
+                    if job['status'] == 'failed':
+                        raise RuntimeError(f"Clip job failed: {job['clips']}")
+                    return job
+                time.sleep(JOB_POLL_INTERVAL)
+            raise RuntimeError(f"Clip job {job_id} timed out")
+
+        self._record('http.generate_clips', fixture, generate, lambda samples, _: {
+            'clipsPerSecond': round(len(clips) / statistics.median(samples), 3)
+        })
+
+        def download(i: int) -> int:
+            response = self.client.get('/api/download-clips')
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/download-clips returned {response.status_code}")
+            size = len(response.get_data())
+            response.close()
+            return size
+
+        self._record('http.download_clips', fixture, download, lambda samples, size: {
+            'bytes': size,
+            'megabytesPerSecond': round(size / 1024 ** 2 / statistics.median(samples), 3)
+        })
+
+    def _cleanup(self, input_path: str) -> None:
+        """Remove the clips and the download copy made for a fixture."""
+        from catalog import catalog
+
+        with self.app.app_context():
+            catalog.remove_clips(catalog.clips_for(self.user_id))
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float) -> List[str]:
+    """List the cases whose median latency grew more than threshold against a baseline run."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {
+        (entry['case'], entry['fixture']): entry['stats']['medianMs']
+        for entry in baseline.get('results', []) if 'stats' in entry
+    }
+    regressions = []
+    for entry in results['results']:
+        key = (entry['case'], entry['fixture'])
+        if 'stats' not in entry or key not in previous or previous[key] <= 0:
+            continue
+        change = entry['stats']['medianMs'] / previous[key] - 1
+        entry['baselineMedianMs'] = previous[key]
+        entry['change'] = round(change, 4)
+        if change > threshold:
+            regressions.append(
+                f"{entry['case']} on {entry['fixture']}: {previous[key]:.1f}ms -> {entry['stats']['medianMs']:.1f}ms "
+                f"(+{change:.0%})"
+            )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command line options."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--durations', type=int, nargs='+', default=[60, 300], help='Fixture durations in seconds')
+    parser.add_argument('--resolutions', nargs='+', default=['640x360', '1280x720', '1920x1080'],
+                        help='Fixture resolutions as WIDTHxHEIGHT')
+    parser.add_argument('--gops', type=int, nargs='+', default=[48, 240], help='Fixture GOP sizes in frames')
+    parser.add_argument('--quick', action='store_true', help='Single small fixture, for a fast smoke run')
+    parser.add_argument('--iterations', type=int, default=5, help='Timed iterations per case')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed iterations per case')
+    parser.add_argument('--fixtures-dir', default=os.path.join(BENCH_DIR, '.fixtures'),
+                        help='Where generated fixtures are kept between runs')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<time>_<commit>.json)')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Median slowdown reported as a regression')
+    parser.add_argument('--verbose', action='store_true', help='Log each case as it finishes')
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.durations, args.resolutions, args.gops = [30], ['640x360'], [48]
+        args.iterations = min(args.iterations, 3)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the suite and write the results file."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    fixtures = fixture_matrix(args.durations, args.resolutions, args.gops)
+
+    work_dir = tempfile.mkdtemp(prefix='cutter-bench-')
+    started = time.monotonic()
+    try:
+        runner = BenchmarkRunner(args, work_dir)
+        runner.run(fixtures)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    results: Dict[str, Any] = {
+        'schema': 1,
+        'commit': commit,
+        'createdAt': datetime.now(timezone.utc).isoformat(),
+        'seconds': round(time.monotonic() - started, 3),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpuCount': os.cpu_count(),
+            'ffmpeg': ffmpeg_version()
+        },
+        'settings': {'iterations': args.iterations, 'warmup': args.warmup},
+        'fixtures': [fixture.to_dict() for fixture in fixtures],
+        'results': runner.results
+    }
+    regressions = compare(results, args.baseline, args.threshold) if args.baseline else []
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{(commit or 'unknown')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'case':<24} {'fixture':<32} {'median ms':>10} {'p95 ms':>10}")
+    for entry in runner.results:
+        stats = entry.get('stats')
+        line = f"{stats['medianMs']:>10.1f} {stats['p95Ms']:>10.1f}" if stats else f"{'failed':>10}"
+        print(f"{entry['case']:<24} {entry['fixture']:<32} {line}")
+    print(f"Results written to {output}")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# Standard library imports
+import os
+import sys
+
+# Os módulos da aplicação se importam pelo nome, como quando app.py roda de dentro de app/
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path.insert(0, APP_DIR)
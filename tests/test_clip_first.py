@@ -0,0 +1,181 @@
+"""Clip-first ingestion against a local HTTP server serving a progressive MP4 with Range support."""
+# Standard library imports
+import os
+import re
+import shutil
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Tuple
+
+# Third-party imports
+import pytest
+from flask import Flask
+
+# Local imports
+from clips import SNAP_NONE, validate_clips
+from locks import locks
+from models import db
+from source_cache import SourceCache
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+
+FIXTURE_DURATION = 40
+MARGIN = 2.0
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler that honours single byte ranges and records where they start."""
+
+    range_starts: List[int] = []
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Keep the test output quiet."""
+
+    def send_head(self):  # type: ignore[no-untyped-def]
+        """Answer 'Range: bytes=a-b' with 206 and the slice of the file."""
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if match is None or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        if start >= size:
+            self.send_error(416)
+            return None
+        RangeRequestHandler.range_starts.append(start)
+        handle = open(path, 'rb')
+        handle.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        return handle
+
+    def copyfile(self, source, outputfile):  # type: ignore[no-untyped-def]
+        """Send at most the requested range."""
+        remaining = getattr(self, '_remaining', None)
+        while remaining is None or remaining > 0:
+            chunk = source.read(65536 if remaining is None else min(65536, remaining))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+@pytest.fixture(scope='module')
+def fixture_video(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """A 40s test pattern whose hue drifts over time, with a keyframe every second."""
+    path = str(tmp_path_factory.mktemp('served') / 'long.mp4')
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size=320x180:rate=24:duration={FIXTURE_DURATION},hue=h=9*t',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={FIXTURE_DURATION}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-g', '24', '-sc_threshold', '0',
+        '-c:a', 'aac', '-shortest', '-movflags', '+faststart', path
+    ], capture_output=True, check=True)
+    return path
+
+
+@pytest.fixture
+def server(fixture_video: str) -> Iterator[str]:
+    """Base URL of a local server publishing the fixture's directory."""
+    directory = os.path.dirname(fixture_video)
+
+    def handler(*args, **kwargs):  # type: ignore[no-untyped-def]
+        return RangeRequestHandler(*args, directory=directory, **kwargs)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    RangeRequestHandler.range_starts = []
+    try:
+        yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path: pytest.TempPathFactory) -> Iterator[Tuple[Flask, SourceCache]]:
+    """A source cache bound to a scratch application and database."""
+    app = Flask(__name__, root_path=str(tmp_path), instance_path=str(tmp_path / 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    locks.init_app(app)
+    source_cache = SourceCache(app)
+    with app.app_context():
+        db.create_all()
+        yield app, source_cache
+        db.session.remove()
+
+
+def grab_frame(path: str, seconds: float) -> bytes:
+    """Decode the frame shown at a time as small RGB pixels."""
+    return subprocess.run([
+        'ffmpeg', '-v', 'error', '-ss', f'{seconds:.3f}', '-i', path, '-frames:v', '1',
+        '-vf', 'scale=64:36', '-pix_fmt', 'rgb24', '-f', 'rawvideo', '-'
+    ], capture_output=True, check=True).stdout
+
+
+def frame_difference(first: bytes, second: bytes) -> float:
+    """Mean absolute difference of two RGB frames."""
+    assert first and len(first) == len(second)
+    return sum(abs(a - b) for a, b in zip(first, second)) / len(first)
+
+
+def test_section_download_fetches_only_the_window(cache, server, fixture_video):
+    _, source_cache = cache
+    source = source_cache.fetch(f'{server}/long.mp4', 'best', {'quiet': True, 'noprogress': True},
+                                section=(20.0, 24.0), margin=MARGIN)
+
+    assert source.section_start == pytest.approx(20.0 - MARGIN)
+    assert source.title.endswith('[20-24]')
+    path = source_cache.source_path(source)
+    assert source.size == os.path.getsize(path)
+    # O FFmpeg pulou direto para a janela com um Range no meio do arquivo, e só ela foi gravada
+    assert any(start > 0 for start in RangeRequestHandler.range_starts)
+    assert source.size < os.path.getsize(fixture_video) / 2
+
+    duration = float(subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path
+    ], capture_output=True, text=True, check=True).stdout)
+    assert duration == pytest.approx(4.0 + 2 * MARGIN, abs=1.0)
+
+
+def test_section_times_map_to_the_original_video(cache, server, fixture_video):
+    _, source_cache = cache
+    source = source_cache.fetch(f'{server}/long.mp4', 'best', {'quiet': True, 'noprogress': True},
+                                section=(20.0, 24.0), margin=MARGIN)
+    path = source_cache.source_path(source)
+
+    # O quadro do segundo 21 do original está em 21 - section_start no arquivo baixado
+    in_file = grab_frame(path, 21.0 - source.section_start)
+    assert frame_difference(in_file, grab_frame(fixture_video, 21.0)) < 2
+    assert frame_difference(in_file, grab_frame(fixture_video, 21.0 - source.section_start)) > 10
+
+
+def test_full_download_serves_sections_from_time_zero(cache, server):
+    _, source_cache = cache
+    full = source_cache.fetch(f'{server}/long.mp4', 'best', {'quiet': True, 'noprogress': True})
+    section = source_cache.fetch(f'{server}/long.mp4', 'best', {'quiet': True, 'noprogress': True},
+                                 section=(20.0, 24.0), margin=MARGIN)
+
+    assert section.id == full.id
+    assert section.section_start == 0.0
+
+
+def test_clip_times_are_translated_into_the_section():
+    clips = [{'name': 'goal', 'startTime': '30:00', 'endTime': '30:10.5'}]
+
+    assert validate_clips(clips, None, SNAP_NONE, offset=1795.0) == [('goal', 5.0, 15.5)]
+    with pytest.raises(ValueError, match='before the downloaded section'):
+        validate_clips(clips, None, SNAP_NONE, offset=1801.0)
@@ -0,0 +1,73 @@
+"""Timecode grammar of clip requests."""
+# Third-party imports
+import pytest
+
+# Local imports
+from clips import SNAP_FRAME, SNAP_KEYFRAME, SNAP_NONE, format_clip_time, parse_clip_time, snap_clip_time
+from cutting import SourceIndex
+
+
+@pytest.mark.parametrize('value, frame_rate, expected', [
+    (12, None, 12.0),
+    (12.5, None, 12.5),
+    ('12.5', None, 12.5),
+    ('  7 ', None, 7.0),
+    ('01:05', None, 65.0),
+    ('1:05.250', None, 65.25),
+    ('01:02:03.250', None, 3723.25),
+    ('00:00', None, 0.0),
+    ('1500f', 25.0, 60.0),
+    ('48F', 24.0, 2.0),
+])
+def test_parse_clip_time(value, frame_rate, expected):
+    assert parse_clip_time(value, frame_rate) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('value, frame_rate, message', [
+    ('', None, 'cannot be empty'),
+    (None, None, 'cannot be empty'),
+    (True, None, 'Invalid time'),
+    ('abc', None, 'Invalid time'),
+    ('1:2:3:4', None, 'Invalid time'),
+    ('1.5:30', None, 'Invalid time'),
+    ('01::05', None, 'Invalid time'),
+    ('-5', None, 'Invalid time'),
+    (-5, None, 'cannot be negative'),
+    (float('nan'), None, 'cannot be negative'),
+    ('100f', None, 'frame rate'),
+    ('-1f', 25.0, 'cannot be negative'),
+])
+def test_parse_clip_time_rejects(value, frame_rate, message):
+    with pytest.raises(ValueError, match=message):
+        parse_clip_time(value, frame_rate)
+
+
+@pytest.mark.parametrize('seconds, timecode', [
+    (0.0, '00:00'),
+    (5.5, '00:05.500'),
+    (65.0, '01:05'),
+    (599.999, '09:59.999'),
+    (3723.25, '01:02:03.250'),
+    (36000.001, '10:00:00.001'),
+])
+def test_format_clip_time_round_trips(seconds, timecode):
+    assert format_clip_time(seconds) == timecode
+    assert parse_clip_time(timecode) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize('seconds, snap, expected', [
+    (10.0000004, SNAP_NONE, 10.0),
+    (10.01, SNAP_FRAME, 10.0),
+    (10.03, SNAP_FRAME, 10.04),
+    (3.9, SNAP_KEYFRAME, 4.0),
+    (1.9, SNAP_KEYFRAME, 2.0),
+    (9.5, SNAP_KEYFRAME, 8.0),
+])
+def test_snap_clip_time(seconds, snap, expected):
+    index = SourceIndex(keyframes=[0.0, 2.0, 4.0, 8.0], frame_rate=25.0)
+    assert snap_clip_time(seconds, snap, index) == expected
+
+
+def test_snap_clip_time_without_source_data():
+    assert snap_clip_time(10.01, SNAP_FRAME, SourceIndex()) == 10.01
+    assert snap_clip_time(10.01, SNAP_KEYFRAME, None) == 10.01
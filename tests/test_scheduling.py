@@ -0,0 +1,119 @@
+"""Weighted fair queuing of the worker pools and admission of synchronous renders."""
+# Standard library imports
+import threading
+from types import SimpleNamespace
+from typing import List, Tuple
+
+# Third-party imports
+import pytest
+from flask import Flask
+
+# Local imports
+from scheduling import AdmissionController, FairExecutor, Overloaded, parse_role_weights
+
+TIMEOUT = 10
+
+
+def run_blocked(executor: FairExecutor, submissions: List[Tuple[int, float, str]]) -> List[str]:
+    """Submit tasks while a blocker holds the executor's only worker and return the order they ran in."""
+    release = threading.Event()
+    finished = threading.Semaphore(0)
+    order: List[str] = []
+
+    def record(name: str) -> None:
+        order.append(name)
+        finished.release()
+
+    executor.submit(0, 1.0, release.wait)
+    for user_id, weight, name in submissions:
+        executor.submit(user_id, weight, record, name)
+    release.set()
+    for _ in submissions:
+        assert finished.acquire(timeout=TIMEOUT)
+    return order
+
+
+@pytest.mark.parametrize('submissions, expected', [
+    # Um usuário com fila longa não atrasa o primeiro pedido de outro
+    ([(1, 1.0, 'a1'), (1, 1.0, 'a2'), (1, 1.0, 'a3'), (2, 1.0, 'b1')], ['a1', 'b1', 'a2', 'a3']),
+    # Pesos iguais alternam entre os usuários
+    ([(1, 1.0, 'a1'), (1, 1.0, 'a2'), (2, 1.0, 'b1'), (2, 1.0, 'b2')], ['a1', 'b1', 'a2', 'b2']),
+    # Peso 2 recebe o dobro da vez
+    ([(1, 2.0, 'a1'), (1, 2.0, 'a2'), (1, 2.0, 'a3'), (1, 2.0, 'a4'), (2, 1.0, 'b1'), (2, 1.0, 'b2')],
+     ['a1', 'b1', 'a2', 'a3', 'b2', 'a4']),
+])
+def test_fair_executor_order(submissions, expected):
+    executor = FairExecutor(max_workers=1, user_limit=1, thread_name_prefix='test-fair')
+    assert run_blocked(executor, submissions) == expected
+
+
+@pytest.mark.parametrize('max_workers, user_limit, expected', [
+    (4, 2, (4, 2)),
+    (2, 5, (2, 2)),
+    (0, 0, (1, 1)),
+])
+def test_fair_executor_limits(max_workers, user_limit, expected):
+    executor = FairExecutor(max_workers, user_limit, thread_name_prefix='test-fair')
+    assert (executor.max_workers, executor.user_limit) == expected
+
+
+def test_fair_executor_user_limit():
+    executor = FairExecutor(max_workers=3, user_limit=1, thread_name_prefix='test-fair')
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def task() -> None:
+        started.release()
+        release.wait(TIMEOUT)
+
+    for user_id in (1, 1, 1, 2):
+        executor.submit(user_id, 1.0, task)
+    assert started.acquire(timeout=TIMEOUT) and started.acquire(timeout=TIMEOUT)
+
+    # Um worker continua livre, mas o usuário 1 já roda o seu limite
+    stats = executor.stats()
+    assert stats['active'] == 2
+    assert stats['users'] == {'1': {'running': 1, 'waiting': 2}, '2': {'running': 1, 'waiting': 0}}
+    release.set()
+    for _ in range(2):
+        assert started.acquire(timeout=TIMEOUT)
+
+
+def test_parse_role_weights():
+    assert parse_role_weights('admin:4, user:1,') == {'admin': 4.0, 'user': 1.0}
+
+
+@pytest.fixture
+def admission() -> AdmissionController:
+    """An admission controller allowing two renders per user and three in total."""
+    app = Flask(__name__)
+    app.config.update(ADMISSION_USER_MAX_RENDERS=2, ADMISSION_MAX_RENDERS=3,
+                      ADMISSION_RETRY_AFTER=7, SCHEDULER_ROLE_WEIGHTS='admin:2,user:1')
+    return AdmissionController(app)
+
+
+@pytest.mark.parametrize('held, user, admitted', [
+    ([], (1, 'user'), True),
+    ([(1, 'user')], (1, 'user'), True),
+    ([(1, 'user'), (1, 'user')], (1, 'user'), False),
+    ([(1, 'admin'), (1, 'admin')], (1, 'admin'), True),
+    ([(1, 'user'), (1, 'user')], (2, 'user'), True),
+    ([(1, 'user'), (1, 'user'), (2, 'user')], (3, 'user'), False),
+])
+def test_render_admission(admission, held, user, admitted):
+    contexts = [admission.render(SimpleNamespace(id=user_id, role=role)) for user_id, role in held]
+    for context in contexts:
+        context.__enter__()
+    try:
+        if admitted:
+            with admission.render(SimpleNamespace(id=user[0], role=user[1])):
+                assert admission.stats()['renders'] == len(held) + 1
+        else:
+            with pytest.raises(Overloaded) as refused:
+                with admission.render(SimpleNamespace(id=user[0], role=user[1])):
+                    pass
+            assert refused.value.retry_after == 7
+    finally:
+        for context in contexts:
+            context.__exit__(None, None, None)
+    assert admission.stats() == {'renders': 0, 'rendersByUser': {}}